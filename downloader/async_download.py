@@ -0,0 +1,563 @@
+"""
+异步下载：基于 aiohttp 的原生协程 HTTP 下载，供无头浏览器模式在事件循环中直接 await
+
+MP4 等单文件（含多连接分段与断点续传）在事件循环中读取网络数据，与页面交互、Playwright 事件并行；
+写盘、内容哈希与续传日志按批交给线程池，大文件下载时事件循环也不会被磁盘 I/O 卡住；
+m3u8 / mpd 仍交给线程池中的同步引擎（分片拉取后需 ffmpeg 封装），同样不阻塞事件循环。
+"""
+import asyncio
+import functools
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+from .http_session import DEFAULT_POOL_SIZE, SessionPool
+from .dedup_store import (
+    PREFIX_BYTES,
+    ContentHasher,
+    DedupStore,
+    checked_prefix_digest,
+    is_intermediate,
+    probe_total_size,
+    tail_range,
+)
+from .hls import DEFAULT_QUALITY
+from .dash import DEFAULT_CODEC_PREFERENCE
+from .segmented_download import (
+    DEFAULT_CONNECTIONS,
+    JOURNAL_FLUSH_BYTES,
+    MIN_SEGMENTED_SIZE,
+    SEGMENT_READ_SIZE,
+    SEGMENT_RETRIES,
+    RangeJournal,
+    open_journal,
+    parse_probe_response,
+    plan_ranges,
+    set_range_header,
+)
+from .utils import download_video, get_video_filename
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+try:
+    from tqdm import tqdm
+    TQDM_AVAILABLE = True
+except ImportError:
+    TQDM_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 连接建立 / 两次读取之间的超时（秒）
+REQUEST_TIMEOUT = 30
+# 攒够该字节数后交给线程池写盘一次
+WRITE_BATCH_BYTES = 1024 * 1024
+
+if AIOHTTP_AVAILABLE:
+    _NETWORK_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, IOError)
+else:
+    _NETWORK_ERRORS = (asyncio.TimeoutError, IOError)
+
+
+def create_client_session(
+    pool_size: int = DEFAULT_POOL_SIZE,
+    keep_alive: bool = True,
+) -> 'aiohttp.ClientSession':
+    """
+    创建下载用的 aiohttp 会话（需在事件循环中调用）
+
+    Args:
+        pool_size: 每个 host 的最大连接数
+        keep_alive: 是否复用连接
+
+    Returns:
+        aiohttp.ClientSession: 会话，调用方负责关闭
+    """
+    if not AIOHTTP_AVAILABLE:
+        raise RuntimeError("aiohttp 未安装，请执行: pip install aiohttp")
+    connector = aiohttp.TCPConnector(
+        limit=0,
+        limit_per_host=max(1, pool_size),
+        force_close=not keep_alive,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        # 请求头来自浏览器抓包，Cookie 已在其中；分段写入需要原始字节
+        cookie_jar=aiohttp.DummyCookieJar(),
+        auto_decompress=False,
+        timeout=aiohttp.ClientTimeout(total=None, sock_connect=REQUEST_TIMEOUT, sock_read=REQUEST_TIMEOUT),
+    )
+
+
+async def probe_range_support_async(
+    client: 'aiohttp.ClientSession',
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+) -> Optional[Dict[str, object]]:
+    """
+    探测服务器是否支持 Range 请求（probe_range_support 的异步版本）
+
+    Args:
+        client: aiohttp 会话
+        url: 视频URL
+        headers: HTTP 请求头
+
+    Returns:
+        Optional[Dict[str, object]]: 同 probe_range_support
+    """
+    probe_headers = dict(headers or {})
+    set_range_header(probe_headers, 'bytes=0-0')
+    try:
+        async with client.get(url, headers=probe_headers) as response:
+            return parse_probe_response(response.status, response.headers)
+    except _NETWORK_ERRORS as err:
+        logger.debug(f"探测 Range 支持失败: {err}")
+        return None
+
+
+async def probe_prefix_async(
+    client: 'aiohttp.ClientSession',
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+) -> Tuple[Optional[Dict[str, object]], Optional[str]]:
+    """
+    请求文件前 PREFIX_BYTES 字节并完成 Range 探测（dedup_store.probe_prefix 的异步版本）
+
+    Args:
+        client: aiohttp 会话
+        url: 视频URL
+        headers: HTTP 请求头
+
+    Returns:
+        Tuple[Optional[Dict[str, object]], Optional[str]]: (远端文件信息, 前缀哈希)
+    """
+    probe_headers = dict(headers or {})
+    set_range_header(probe_headers, f'bytes=0-{PREFIX_BYTES - 1}')
+    try:
+        async with client.get(url, headers=probe_headers) as response:
+            remote = parse_probe_response(response.status, response.headers)
+            total_size = probe_total_size(response.status, response.headers, remote)
+            if total_size is None:
+                return remote, None
+            prefix = bytearray()
+            async for chunk in response.content.iter_chunked(PREFIX_BYTES):
+                prefix += chunk
+                if len(prefix) >= PREFIX_BYTES:
+                    break
+            return remote, checked_prefix_digest(bytes(prefix), total_size)
+    except _NETWORK_ERRORS as err:
+        logger.debug(f"前缀探测失败: {err}")
+        return None, None
+
+
+async def fetch_tail_async(
+    client: 'aiohttp.ClientSession',
+    url: str,
+    total_size: int,
+    headers: Optional[Dict[str, str]] = None,
+) -> Optional[bytes]:
+    """
+    请求远端文件的末尾区间（dedup_store.fetch_tail 的异步版本）
+
+    Args:
+        client: aiohttp 会话
+        url: 视频URL
+        total_size: 文件总大小
+        headers: HTTP 请求头
+
+    Returns:
+        Optional[bytes]: 末尾数据（文件不超过 PREFIX_BYTES 时为 b''）；服务器未按 Range 返回或连接中断时为 None
+    """
+    span = tail_range(total_size)
+    if span is None:
+        return b''
+    tail_headers = dict(headers or {})
+    set_range_header(tail_headers, f'bytes={span[0]}-{span[1]}')
+    try:
+        async with client.get(url, headers=tail_headers) as response:
+            if response.status != 206:
+                return None
+            data = await response.read()
+    except _NETWORK_ERRORS as err:
+        logger.debug(f"末尾区间请求失败: {err}")
+        return None
+    return data if len(data) == span[1] - span[0] + 1 else None
+
+
+async def download_mp4_async(
+    client: 'aiohttp.ClientSession',
+    url: str,
+    output_path: str,
+    headers: Optional[Dict[str, str]] = None,
+    connections: int = DEFAULT_CONNECTIONS,
+    chunk_size: int = SEGMENT_READ_SIZE,
+    remote: Optional[Dict[str, object]] = None,
+    hasher: Optional[ContentHasher] = None,
+) -> bool:
+    """
+    异步下载 MP4 视频文件（download_mp4 的异步版本）
+
+    服务器支持 Range 且文件足够大时多连接分段下载（与同步版本共用续传日志格式），
+    否则单连接流式下载。
+
+    Args:
+        client: aiohttp 会话
+        url: 视频URL
+        output_path: 输出文件路径
+        headers: HTTP 请求头
+        connections: 分段下载的并发连接数（1 表示单连接）
+        chunk_size: 下载块大小
+        remote: 已探测到的远端文件信息（可选，传入时不再发送探测请求）
+        hasher: 内容哈希器（可选，下载时同时计算内容哈希）
+
+    Returns:
+        bool: 是否下载成功
+    """
+    filename = os.path.basename(output_path)
+    logger.info(f"开始下载 MP4: {filename}")
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    try:
+        if remote is None:
+            remote = await probe_range_support_async(client, url, headers)
+        if remote:
+            # 大文件或存在未完成的续传日志时走分段下载（带断点续传）
+            if remote['total_size'] >= MIN_SEGMENTED_SIZE or RangeJournal.exists(output_path):
+                return await _download_segmented_async(
+                    client, url, output_path, remote, headers, max(1, connections), chunk_size, hasher
+                )
+        else:
+            # 服务器不支持 Range，旧的续传日志无法使用
+            RangeJournal.discard(output_path)
+        return await _download_single_async(client, url, output_path, headers, chunk_size, hasher)
+    except _NETWORK_ERRORS as err:
+        logger.error(f"下载失败 {url}: {err}")
+        return False
+
+
+async def download_video_async(
+    client: 'aiohttp.ClientSession',
+    url: str,
+    output_dir: str,
+    filename: Optional[str] = None,
+    index: Optional[int] = None,
+    headers: Optional[Dict[str, str]] = None,
+    connections: int = DEFAULT_CONNECTIONS,
+    session_pool: Optional[SessionPool] = None,
+    quality: str = DEFAULT_QUALITY,
+    codec_preference: str = DEFAULT_CODEC_PREFERENCE,
+    dedup_store: Optional[DedupStore] = None,
+    playlists: Optional[Dict[str, Dict[str, object]]] = None,
+) -> Optional[str]:
+    """
+    通用视频下载协程（download_video 的异步版本）
+
+    m3u8 / mpd 在线程池中交给同步引擎处理，其他格式使用 aiohttp 直接下载。
+
+    Args:
+        client: aiohttp 会话
+        url: 视频URL
+        output_dir: 输出目录
+        filename: 指定文件名（可选）
+        index: 视频索引（用于多个视频时）
+        headers: HTTP 请求头
+        connections: 单个文件的并发连接数（MP4 分段 / HLS、DASH 分片）
+        session_pool: 同步引擎使用的 HTTP 会话池（可选）
+        quality: m3u8 主播放列表 / DASH 的画质选择策略
+        codec_preference: DASH 视频编码偏好
+        dedup_store: 内容去重存储（可选，只用于直接下载的单个文件）
+        playlists: 已下载的播放列表缓存（可选，m3u8 命中时不再重复请求）
+
+    Returns:
+        Optional[str]: 下载成功返回文件路径（去重时可能是已有文件），失败返回 None
+    """
+    parsed_path = urlparse(url).path.lower()
+    if parsed_path.endswith('.mpd') or '.m3u8' in url.lower():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None,
+            functools.partial(
+                download_video,
+                url,
+                output_dir,
+                filename=filename,
+                index=index,
+                headers=headers,
+                connections=connections,
+                session_pool=session_pool,
+                quality=quality,
+                codec_preference=codec_preference,
+                playlists=playlists,
+            ),
+        )
+
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        output_path = os.path.join(output_dir, filename or get_video_filename(url, index))
+        if dedup_store is not None and not is_intermediate(output_path):
+            return await _download_deduplicated_async(client, url, output_path, headers, connections, dedup_store)
+        success = await download_mp4_async(client, url, output_path, headers=headers, connections=connections)
+        if success and os.path.exists(output_path):
+            return output_path
+        return None
+    except OSError as err:
+        logger.error(f"下载视频失败 {url}: {err}")
+        return None
+
+
+async def _download_deduplicated_async(
+    client: 'aiohttp.ClientSession',
+    url: str,
+    output_path: str,
+    headers: Optional[Dict[str, str]],
+    connections: int,
+    dedup_store: DedupStore,
+) -> Optional[str]:
+    """先按 URL、前缀哈希（+ 末尾区间）查找已有内容，未命中时边下载边计算哈希并登记（_download_deduplicated 的异步版本）"""
+    loop = asyncio.get_running_loop()
+    existing = await loop.run_in_executor(None, dedup_store.find_by_url, url)
+    if existing is None:
+        remote, prefix = await probe_prefix_async(client, url, headers)
+        # 前缀哈希相同只是候选，再比较末尾区间确认
+        if (
+            prefix is not None and remote is not None
+            and await loop.run_in_executor(None, dedup_store.has_prefix, prefix)
+        ):
+            tail = await fetch_tail_async(client, url, int(remote['total_size']), headers)
+            if tail is not None:
+                existing = await loop.run_in_executor(None, dedup_store.find_by_prefix, url, prefix, tail)
+    if existing is not None:
+        return await loop.run_in_executor(None, dedup_store.materialize, existing, output_path)
+    hasher = ContentHasher()
+    success = await download_mp4_async(
+        client, url, output_path, headers=headers, connections=connections, remote=remote, hasher=hasher
+    )
+    if not success or not os.path.exists(output_path):
+        return None
+    return await loop.run_in_executor(None, dedup_store.add_file, url, output_path, hasher)
+
+
+async def _download_single_async(
+    client: 'aiohttp.ClientSession',
+    url: str,
+    output_path: str,
+    headers: Optional[Dict[str, str]],
+    chunk_size: int,
+    hasher: Optional[ContentHasher] = None,
+) -> bool:
+    """单连接流式下载"""
+    filename = os.path.basename(output_path)
+    async with client.get(url, headers=headers) as response:
+        response.raise_for_status()
+        total_size = int(response.headers.get('content-length', 0))
+        pbar = None
+        if TQDM_AVAILABLE:
+            pbar = tqdm(
+                total=total_size or None,
+                unit='B',
+                unit_scale=True,
+                unit_divisor=1024,
+                desc=f"下载 {filename[:30]}",
+                ncols=100,
+            )
+        downloaded = 0
+        loop = asyncio.get_running_loop()
+        f = await loop.run_in_executor(None, open, output_path, 'wb')
+        writer = _BatchWriter(f, 0, hasher)
+        try:
+            async for chunk in response.content.iter_chunked(chunk_size):
+                await writer.write(chunk)
+                downloaded += len(chunk)
+                if pbar is not None:
+                    pbar.update(len(chunk))
+            await writer.flush()
+        finally:
+            await loop.run_in_executor(None, f.close)
+            if pbar is not None:
+                pbar.close()
+    if total_size and downloaded < total_size:
+        logger.error(f"连接提前结束: {filename} ({downloaded}/{total_size} bytes)")
+        return False
+    logger.info(f"MP4 下载完成: {filename}")
+    return True
+
+
+async def _download_segmented_async(
+    client: 'aiohttp.ClientSession',
+    url: str,
+    output_path: str,
+    remote: Dict[str, object],
+    headers: Optional[Dict[str, str]],
+    connections: int,
+    read_size: int,
+    hasher: Optional[ContentHasher] = None,
+) -> bool:
+    """多连接分段下载到预分配文件，支持断点续传（download_segmented 的异步版本）"""
+    filename = os.path.basename(output_path)
+    total_size = int(remote['total_size'])
+    loop = asyncio.get_running_loop()
+    # 预分配文件与写日志都是磁盘操作，放到线程池
+    journal = await loop.run_in_executor(None, open_journal, output_path, remote)
+    ranges = plan_ranges(journal, connections, align=hasher.block_size if hasher is not None else 1)
+    logger.info(f"分段下载 {filename}: {total_size} bytes，{len(ranges)} 个分段，{connections} 个连接")
+
+    pbar = None
+    if TQDM_AVAILABLE:
+        pbar = tqdm(
+            total=total_size,
+            initial=journal.completed_bytes(),
+            unit='B',
+            unit_scale=True,
+            unit_divisor=1024,
+            desc=f"下载 {filename[:30]}",
+            ncols=100,
+        )
+
+    def on_progress(n: int) -> None:
+        if pbar is not None:
+            pbar.update(n)
+
+    slots = asyncio.Semaphore(connections)
+
+    async def fetch(start: int, end: int) -> None:
+        async with slots:
+            await _download_range_async(
+                client, url, output_path, start, end, headers, read_size, on_progress, journal, hasher
+            )
+
+    try:
+        results = await asyncio.gather(*(fetch(start, end) for start, end in ranges), return_exceptions=True)
+    finally:
+        if pbar is not None:
+            pbar.close()
+
+    failed = False
+    for (start, end), result in zip(ranges, results):
+        if isinstance(result, asyncio.CancelledError):
+            raise result
+        if isinstance(result, Exception):
+            logger.error(f"分段 {start}-{end} 下载失败: {result}")
+            failed = True
+    if failed or journal.missing_ranges():
+        logger.warning(f"下载未完成，进度已保存到 {journal.path}，重新运行即可续传")
+        return False
+    await loop.run_in_executor(None, journal.remove)
+    logger.info(f"MP4 下载完成: {filename}")
+    return True
+
+
+class _BatchWriter:
+    """
+    把网络读取的数据攒批后交给线程池写入文件
+
+    每批的写入、内容哈希与续传日志登记在同一次 run_in_executor 中完成，事件循环中只做网络读取。
+    """
+
+    def __init__(
+        self,
+        f,
+        offset: int,
+        hasher: Optional[ContentHasher] = None,
+        journal: Optional[RangeJournal] = None,
+    ):
+        """
+        Args:
+            f: 以二进制写方式打开的文件
+            offset: 第一批数据在文件中的偏移
+            hasher: 内容哈希器（可选）
+            journal: 续传日志（可选，写入超过 JOURNAL_FLUSH_BYTES 时登记已完成区间）
+        """
+        self.f = f
+        self.offset = offset
+        self.hasher = hasher
+        self.journal = journal
+        self.recorded = offset
+        self._buffer: List[bytes] = []
+        self._buffered = 0
+
+    async def write(self, chunk: bytes) -> None:
+        self._buffer.append(chunk)
+        self._buffered += len(chunk)
+        if self._buffered >= WRITE_BATCH_BYTES:
+            await self.flush(record=False)
+
+    async def flush(self, record: bool = True) -> None:
+        """
+        写出缓冲的数据
+
+        Args:
+            record: 是否把已写入的数据全部登记到续传日志（分段结束 / 连接中断时）
+        """
+        data = b''.join(self._buffer)
+        self._buffer.clear()
+        self._buffered = 0
+        if data or (record and self.journal is not None and self.offset > self.recorded):
+            await asyncio.get_running_loop().run_in_executor(None, self._write, data, record)
+
+    def _write(self, data: bytes, record: bool) -> None:
+        if data:
+            self.f.seek(self.offset)
+            self.f.write(data)
+            if self.hasher is not None:
+                self.hasher.update(self.offset, data)
+            self.offset += len(data)
+        if self.journal is None or self.offset == self.recorded:
+            return
+        if record or self.offset - self.recorded >= JOURNAL_FLUSH_BYTES:
+            self.f.flush()
+            self.journal.mark_completed(self.recorded, self.offset - 1)
+            self.recorded = self.offset
+
+
+async def _download_range_async(
+    client: 'aiohttp.ClientSession',
+    url: str,
+    output_path: str,
+    start: int,
+    end: int,
+    headers: Optional[Dict[str, str]],
+    read_size: int,
+    on_progress,
+    journal: RangeJournal,
+    hasher: Optional[ContentHasher] = None,
+) -> None:
+    """
+    下载单个字节区间并写入文件对应偏移；连接中断时从已写位置续传
+    """
+    position = start
+    last_error: Optional[BaseException] = None
+    loop = asyncio.get_running_loop()
+    # 每个分段使用独立文件句柄，按偏移写入，互不干扰
+    f = await loop.run_in_executor(None, open, output_path, 'r+b')
+    writer = _BatchWriter(f, start, hasher, journal)
+    try:
+        for attempt in range(SEGMENT_RETRIES + 1):
+            if position > end:
+                return
+            range_headers = dict(headers or {})
+            set_range_header(range_headers, f'bytes={position}-{end}')
+            try:
+                async with client.get(url, headers=range_headers) as response:
+                    if response.status != 206:
+                        raise IOError(f"期望 206 分段响应，实际为 {response.status}")
+                    async for chunk in response.content.iter_chunked(read_size):
+                        remaining = end - position + 1
+                        if len(chunk) > remaining:
+                            chunk = chunk[:remaining]
+                        await writer.write(chunk)
+                        position += len(chunk)
+                        on_progress(len(chunk))
+                        if position > end:
+                            break
+                await writer.flush()
+                if position > end:
+                    return
+                last_error = IOError(f"连接提前结束，已下载到 {position}")
+            except _NETWORK_ERRORS as err:
+                last_error = err
+                # 中断前已收到的数据照常写入并登记，重试从 position 继续
+                await writer.flush()
+            logger.debug(f"分段 {start}-{end} 第 {attempt + 1} 次尝试中断: {last_error}")
+        raise last_error or IOError("分段下载失败")
+    finally:
+        await loop.run_in_executor(None, f.close)
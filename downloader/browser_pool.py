@@ -0,0 +1,170 @@
+"""
+浏览器池：一个长期运行的浏览器 + 多个可复用的 BrowserContext
+
+多 URL 运行时各页面从池中借用上下文，避免每个 URL 都启动 Playwright 驱动与浏览器；
+上下文在服务一定数量的页面后关闭重建，浏览器在服务一定数量的页面后整体重启，以限制内存泄漏。
+"""
+import asyncio
+import logging
+from typing import Dict, List, Optional
+from playwright.async_api import async_playwright, Browser, BrowserContext
+
+logger = logging.getLogger(__name__)
+
+# 池中同时借出的上下文数量
+DEFAULT_BROWSER_POOL_SIZE = 2
+# 每个上下文服务多少个页面后重建
+DEFAULT_CONTEXT_RECYCLE = 20
+# 浏览器服务多少个页面后重启（0 表示不重启）
+DEFAULT_BROWSER_RECYCLE = 200
+
+
+class BrowserPool:
+    """
+    可复用 BrowserContext 的浏览器池
+
+    用法：`await start()` → `context = await acquire()` → 使用后 `await release(context)` →
+    结束时 `await close()`（或使用 `async with`）。
+    """
+
+    def __init__(
+        self,
+        browser_type: str = "firefox",
+        size: int = DEFAULT_BROWSER_POOL_SIZE,
+        context_recycle: int = DEFAULT_CONTEXT_RECYCLE,
+        browser_recycle: int = DEFAULT_BROWSER_RECYCLE,
+        launch_kwargs: Optional[Dict[str, object]] = None,
+        context_kwargs: Optional[Dict[str, object]] = None,
+        init_script: Optional[str] = None,
+    ):
+        """
+        初始化浏览器池
+
+        Args:
+            browser_type: 浏览器类型 ("chromium", "firefox", "webkit")
+            size: 同时借出的上下文数量上限
+            context_recycle: 每个上下文服务的页面数上限，达到后关闭重建
+            browser_recycle: 浏览器服务的页面数上限，达到后等待所有上下文归还再重启（0 表示不重启）
+            launch_kwargs: 传给 `browser_type.launch` 的参数
+            context_kwargs: 传给 `browser.new_context` 的参数
+            init_script: 每个新上下文注入的初始化脚本（例如 stealth 补丁）
+        """
+        if browser_type not in ("chromium", "firefox", "webkit"):
+            raise ValueError(f"不支持的浏览器类型: {browser_type}")
+        self.browser_type = browser_type
+        self.size = max(1, size)
+        self.context_recycle = max(1, context_recycle)
+        self.browser_recycle = max(0, browser_recycle)
+        self.launch_kwargs = dict(launch_kwargs or {})
+        self.context_kwargs = dict(context_kwargs or {})
+        self.init_script = init_script
+        self._playwright = None
+        self._browser: Optional[Browser] = None
+        self._idle: List[BrowserContext] = []
+        self._uses: Dict[BrowserContext, int] = {}
+        self._active = 0
+        self._served = 0
+        self._draining = False
+        self._condition: Optional[asyncio.Condition] = None
+
+    async def start(self) -> None:
+        """启动 Playwright 驱动与浏览器"""
+        self._condition = asyncio.Condition()
+        self._playwright = await async_playwright().start()
+        await self._launch()
+
+    async def acquire(self) -> BrowserContext:
+        """
+        借用一个上下文（池满或浏览器等待重启时阻塞）
+
+        Returns:
+            BrowserContext: 可直接 `new_page()` 的上下文
+        """
+        async with self._condition:
+            while self._active >= self.size or (self._draining and self._active > 0):
+                await self._condition.wait()
+            if self._draining or self._browser is None or not self._browser.is_connected():
+                await self._relaunch()
+            context = self._idle.pop() if self._idle else None
+            if context is None:
+                context = await self._new_context()
+            self._active += 1
+            return context
+
+    async def release(self, context: BrowserContext, discard: bool = False) -> None:
+        """
+        归还上下文
+
+        Args:
+            context: acquire 得到的上下文
+            discard: 是否丢弃（页面异常等情况下不再复用）
+        """
+        async with self._condition:
+            self._active -= 1
+            self._served += 1
+            uses = self._uses.pop(context, 0) + 1
+            if discard or self._draining or uses >= self.context_recycle:
+                logger.debug(f"回收浏览器上下文（已服务 {uses} 个页面）")
+                await _close_quietly(context)
+            else:
+                self._uses[context] = uses
+                self._idle.append(context)
+            if self.browser_recycle and self._served >= self.browser_recycle:
+                # 等待借出的上下文全部归还后重启浏览器
+                self._draining = True
+            self._condition.notify_all()
+
+    async def close(self) -> None:
+        """关闭所有上下文、浏览器与 Playwright 驱动"""
+        await self._close_browser()
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+            except Exception:
+                pass
+            self._playwright = None
+
+    async def __aenter__(self) -> 'BrowserPool':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    async def _launch(self) -> None:
+        launcher = getattr(self._playwright, self.browser_type)
+        self._browser = await launcher.launch(**self.launch_kwargs)
+        self._served = 0
+        self._draining = False
+        logger.info(f"浏览器池启动浏览器: {self.browser_type}（{self.size} 个上下文）")
+
+    async def _relaunch(self) -> None:
+        logger.info(f"浏览器已服务 {self._served} 个页面，重启以释放内存")
+        await self._close_browser()
+        await self._launch()
+
+    async def _close_browser(self) -> None:
+        for context in self._idle:
+            await _close_quietly(context)
+        self._idle.clear()
+        self._uses.clear()
+        if self._browser is not None:
+            await _close_quietly(self._browser)
+            self._browser = None
+
+    async def _new_context(self) -> BrowserContext:
+        context = await self._browser.new_context(**self.context_kwargs)
+        if self.init_script:
+            try:
+                await context.add_init_script(self.init_script)
+            except Exception as err:
+                logger.debug(f"注入初始化脚本失败: {err}")
+        self._uses[context] = 0
+        return context
+
+
+async def _close_quietly(resource) -> None:
+    try:
+        await resource.close()
+    except Exception:
+        pass
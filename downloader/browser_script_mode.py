@@ -5,8 +5,15 @@
 import json
 import logging
 import sys
-from typing import List
+from typing import List, Optional
 from .utils import download_videos, auto_mux_downloads
+from .segmented_download import DEFAULT_CONNECTIONS
+from .http_session import SessionPool
+from .hls import DEFAULT_QUALITY
+from .dash import DEFAULT_CODEC_PREFERENCE
+from .scheduler import DEFAULT_MAX_DOWNLOADS, DEFAULT_PER_HOST
+from .postprocess import DEFAULT_POSTPROCESS_JOBS
+from .dedup_store import DedupStore
 
 logger = logging.getLogger(__name__)
 
@@ -81,32 +88,83 @@ def read_user_input() -> str:
     return '\n'.join(lines)
 
 
-def download_videos_from_urls(video_urls: List[str], output_dir: str) -> None:
+def download_videos_from_urls(
+    video_urls: List[str],
+    output_dir: str,
+    connections: int = DEFAULT_CONNECTIONS,
+    session_pool: Optional[SessionPool] = None,
+    quality: str = DEFAULT_QUALITY,
+    codec_preference: str = DEFAULT_CODEC_PREFERENCE,
+    max_downloads: int = DEFAULT_MAX_DOWNLOADS,
+    per_host: int = DEFAULT_PER_HOST,
+    dedup_store: Optional[DedupStore] = None,
+    postprocess_jobs: int = DEFAULT_POSTPROCESS_JOBS,
+    postprocess_per_disk: Optional[int] = None,
+) -> None:
     """
     复用方案 A 的下载工具下载视频
     
     Args:
         video_urls: 视频URL列表
         output_dir: 输出目录
+        connections: 单个文件的并发连接数（MP4 分段 / HLS、DASH 分片）
+        session_pool: HTTP 会话池（可选）
+        quality: m3u8 主播放列表 / DASH 的画质选择策略
+        codec_preference: DASH 视频编码偏好
+        max_downloads: 同时下载的文件数上限
+        per_host: 同一 host 同时下载的文件数上限
+        dedup_store: 内容去重存储（可选）
+        postprocess_jobs: 同时运行的音视频合并任务数上限
+        postprocess_per_disk: 同一磁盘上同时运行的合并任务数上限（None 表示按磁盘类型决定）
     """
     if not video_urls:
         logger.warning("没有视频URL可下载")
         return
     
     logger.info(f"开始下载 {len(video_urls)} 个视频到: {output_dir}")
-    downloaded_files = download_videos(video_urls, output_dir)
+    downloaded_files = download_videos(
+        video_urls,
+        output_dir,
+        connections=connections,
+        session_pool=session_pool,
+        quality=quality,
+        codec_preference=codec_preference,
+        max_downloads=max_downloads,
+        per_host=per_host,
+        dedup_store=dedup_store,
+    )
     logger.info(f"成功下载 {len(downloaded_files)} 个视频")
-    muxed_files = auto_mux_downloads(downloaded_files, output_dir)
+    muxed_files = auto_mux_downloads(downloaded_files, output_dir, postprocess_jobs, postprocess_per_disk)
     if muxed_files:
         logger.info(f"已自动合并输出文件: {muxed_files}")
 
 
-def run(output_dir: str) -> None:
+def run(
+    output_dir: str,
+    connections: int = DEFAULT_CONNECTIONS,
+    session_pool: Optional[SessionPool] = None,
+    quality: str = DEFAULT_QUALITY,
+    codec_preference: str = DEFAULT_CODEC_PREFERENCE,
+    max_downloads: int = DEFAULT_MAX_DOWNLOADS,
+    per_host: int = DEFAULT_PER_HOST,
+    dedup_store: Optional[DedupStore] = None,
+    postprocess_jobs: int = DEFAULT_POSTPROCESS_JOBS,
+    postprocess_per_disk: Optional[int] = None,
+) -> None:
     """
     运行浏览器脚本模式
     
     Args:
         output_dir: 输出目录
+        connections: 单个文件的并发连接数（MP4 分段 / HLS、DASH 分片）
+        session_pool: HTTP 会话池（可选）
+        quality: m3u8 主播放列表 / DASH 的画质选择策略
+        codec_preference: DASH 视频编码偏好
+        max_downloads: 同时下载的文件数上限
+        per_host: 同一 host 同时下载的文件数上限
+        dedup_store: 内容去重存储（可选）
+        postprocess_jobs: 同时运行的音视频合并任务数上限
+        postprocess_per_disk: 同一磁盘上同时运行的合并任务数上限（None 表示按磁盘类型决定）
     """
     logger.info("=" * 60)
     logger.info("开始执行浏览器脚本模式")
@@ -143,5 +201,17 @@ def run(output_dir: str) -> None:
         return
     
     # 下载视频
-    download_videos_from_urls(video_urls, output_dir)
+    download_videos_from_urls(
+        video_urls,
+        output_dir,
+        connections=connections,
+        session_pool=session_pool,
+        quality=quality,
+        codec_preference=codec_preference,
+        max_downloads=max_downloads,
+        per_host=per_host,
+        dedup_store=dedup_store,
+        postprocess_jobs=postprocess_jobs,
+        postprocess_per_disk=postprocess_per_disk,
+    )
 
@@ -0,0 +1,192 @@
+"""
+进程内容器识别：不启动 ffprobe，直接解析文件头判断包含的视频 / 音频轨
+
+- ISO-BMFF（mp4 / fMP4 .m4s）：遍历 moov/trak/mdia/hdlr，handler 为 vide / soun 分别计为视频 / 音频轨。
+  按盒子大小跳过 mdat、stbl 等大块数据，mmap 只会读入实际访问到的页。
+- MPEG-TS：在文件开头找到 PAT → PMT，按 stream_type（以及私有流的描述符）分类。
+
+无法识别时返回 None，由调用方回退到 ffprobe。
+"""
+import logging
+import mmap
+import os
+import struct
+from typing import Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# TS 只在文件开头的这段范围内寻找 PAT / PMT
+TS_SNIFF_BYTES = 512 * 1024
+# moov 超过该大小时不解析（交给 ffprobe）
+MAX_MOOV_SIZE = 16 * 1024 * 1024
+
+TS_PACKET_SIZE = 188
+TS_SYNC_BYTE = 0x47
+
+# PMT stream_type → 轨道类型
+_TS_VIDEO_TYPES = {0x01, 0x02, 0x10, 0x1B, 0x24, 0x42, 0xD1, 0xEA}
+_TS_AUDIO_TYPES = {0x03, 0x04, 0x0F, 0x11, 0x1C, 0x81, 0x82, 0x83, 0x84, 0x85, 0x86, 0x87}
+# 私有流（stream_type 0x06）中表示音频的描述符：AC-3、E-AC-3、DTS、AAC
+_TS_AUDIO_DESCRIPTORS = {0x6A, 0x7A, 0x7B, 0x7C}
+
+
+def sniff_stream_counts(path: str) -> Optional[Tuple[int, int]]:
+    """
+    识别文件中的视频 / 音频轨数量
+
+    Args:
+        path: 媒体文件路径
+
+    Returns:
+        Optional[Tuple[int, int]]: (视频轨数, 音频轨数)；不是可识别的 mp4 / TS 或文件头损坏时为 None
+    """
+    try:
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < 8:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if data[4:8] in (b'ftyp', b'styp', b'moov', b'free', b'skip', b'wide'):
+                    return _sniff_bmff(data)
+                if data[0] == TS_SYNC_BYTE:
+                    return _sniff_ts(data)
+    except (OSError, ValueError) as err:
+        logger.debug(f"读取文件头失败 {os.path.basename(path)}: {err}")
+    return None
+
+
+def _iter_boxes(data, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """遍历 [start, end) 内的盒子，产出 (类型, 负载起点, 盒子终点)"""
+    position = start
+    while position + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', data, position)
+        header = 8
+        if size == 1:
+            if position + 16 > end:
+                return
+            size = struct.unpack_from('>Q', data, position + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - position
+        if size < header or position + size > end:
+            # 截断的盒子（文件未下载完整）：只处理已有部分
+            size = end - position
+            if size < header:
+                return
+        yield box_type, position + header, position + size
+        position += size
+
+
+def _sniff_bmff(data) -> Optional[Tuple[int, int]]:
+    for box_type, payload, box_end in _iter_boxes(data, 0, len(data)):
+        if box_type != b'moov':
+            continue
+        if box_end - payload > MAX_MOOV_SIZE:
+            return None
+        video = audio = 0
+        for trak_type, trak_payload, trak_end in _iter_boxes(data, payload, box_end):
+            if trak_type != b'trak':
+                continue
+            handler = _find_handler(data, trak_payload, trak_end)
+            if handler == b'vide':
+                video += 1
+            elif handler == b'soun':
+                audio += 1
+        return video, audio
+    return None
+
+
+def _find_handler(data, start: int, end: int) -> Optional[bytes]:
+    """trak → mdia → hdlr 的 handler_type"""
+    for box_type, payload, box_end in _iter_boxes(data, start, end):
+        if box_type == b'mdia':
+            for child_type, child_payload, child_end in _iter_boxes(data, payload, box_end):
+                # hdlr: version/flags(4) + pre_defined(4) + handler_type(4)
+                if child_type == b'hdlr' and child_end - child_payload >= 12:
+                    return bytes(data[child_payload + 8:child_payload + 12])
+    return None
+
+
+def _ts_payload(packet) -> Optional[Tuple[int, bool, bytes]]:
+    """解析 TS 包头，返回 (PID, 是否为负载起点, 负载)"""
+    if packet[0] != TS_SYNC_BYTE:
+        return None
+    pid = ((packet[1] & 0x1F) << 8) | packet[2]
+    unit_start = bool(packet[1] & 0x40)
+    adaptation = (packet[3] >> 4) & 0x3
+    offset = 4
+    if adaptation in (2, 3):
+        offset += 1 + packet[4]
+    if adaptation == 2 or offset >= TS_PACKET_SIZE:
+        return pid, unit_start, b''
+    return pid, unit_start, bytes(packet[offset:])
+
+
+def _psi_section(payload: bytes) -> Optional[bytes]:
+    """取出负载中完整的 PSI 段（跨包的长段不处理）"""
+    if not payload:
+        return None
+    start = 1 + payload[0]  # pointer_field
+    if start + 3 > len(payload):
+        return None
+    section_length = ((payload[start + 1] & 0x0F) << 8) | payload[start + 2]
+    end = start + 3 + section_length
+    if end > len(payload):
+        return None
+    return payload[start:end]
+
+
+def _sniff_ts(data) -> Optional[Tuple[int, int]]:
+    limit = min(len(data), TS_SNIFF_BYTES) // TS_PACKET_SIZE * TS_PACKET_SIZE
+    pmt_pids = set()
+    for position in range(0, limit, TS_PACKET_SIZE):
+        parsed = _ts_payload(data[position:position + TS_PACKET_SIZE])
+        if parsed is None:
+            # 不是 188 字节对齐的 TS（例如 192 字节的 M2TS），交给 ffprobe
+            return None
+        pid, unit_start, payload = parsed
+        if not unit_start:
+            continue
+        if pid == 0 and not pmt_pids:
+            section = _psi_section(payload)
+            if section is None or section[0] != 0x00:
+                continue
+            # 跳过 8 字节段头，去掉末尾 4 字节 CRC，每个节目 4 字节
+            for entry in range(8, len(section) - 4, 4):
+                program_number = (section[entry] << 8) | section[entry + 1]
+                if program_number != 0:
+                    pmt_pids.add(((section[entry + 2] & 0x1F) << 8) | section[entry + 3])
+        elif pid in pmt_pids:
+            section = _psi_section(payload)
+            # 段头 12 字节 + CRC 4 字节
+            if section is not None and section[0] == 0x02 and len(section) >= 16:
+                return _parse_pmt(section)
+    return None
+
+
+def _parse_pmt(section: bytes) -> Tuple[int, int]:
+    video = audio = 0
+    program_info_length = ((section[10] & 0x0F) << 8) | section[11]
+    position = 12 + program_info_length
+    end = len(section) - 4
+    while position + 5 <= end:
+        stream_type = section[position]
+        es_info_length = ((section[position + 3] & 0x0F) << 8) | section[position + 4]
+        descriptors = section[position + 5:position + 5 + es_info_length]
+        if stream_type in _TS_VIDEO_TYPES:
+            video += 1
+        elif stream_type in _TS_AUDIO_TYPES:
+            audio += 1
+        elif stream_type == 0x06 and _has_audio_descriptor(descriptors):
+            audio += 1
+        position += 5 + es_info_length
+    return video, audio
+
+
+def _has_audio_descriptor(descriptors: bytes) -> bool:
+    position = 0
+    while position + 2 <= len(descriptors):
+        if descriptors[position] in _TS_AUDIO_DESCRIPTORS:
+            return True
+        position += 2 + descriptors[position + 1]
+    return False
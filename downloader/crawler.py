@@ -0,0 +1,485 @@
+"""
+crawler 模式：从种子 URL 出发的异步抓取
+
+- 前沿队列按广度优先展开，每个 host 有并发上限与请求间隔，遵守 robots.txt
+- 已访问集合使用布隆过滤器，百万级 URL 只占约 2 MB 内存（极少数 URL 可能被误判为已访问而跳过）
+- 发现的视频页面交给无头浏览器模式捕获下载，页面中直接出现的媒体链接直接下载
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import re
+import time
+from html.parser import HTMLParser
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Pattern, Set
+from urllib.parse import urldefrag, urljoin, urlparse
+from urllib.robotparser import RobotFileParser
+from .scheduler import AsyncHostLimiter, host_of
+from .request_routing import is_manifest_url, is_media_content_type, is_media_url
+from .extractors import find_extractor
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 默认抓取的页面数上限
+DEFAULT_MAX_PAGES = 200
+# 默认抓取深度（种子为 0）
+DEFAULT_MAX_DEPTH = 2
+# 同时抓取的页面数
+DEFAULT_CRAWL_CONCURRENCY = 8
+# 同一 host 同时抓取的页面数
+DEFAULT_CRAWL_PER_HOST = 2
+# 同一 host 两次请求之间的最小间隔（秒）
+DEFAULT_CRAWL_DELAY = 0.5
+# 布隆过滤器的预期容量与误判率
+DEFAULT_EXPECTED_URLS = 1_000_000
+DEFAULT_FALSE_POSITIVE_RATE = 0.001
+# 单个页面读取的最大字节数
+MAX_PAGE_BYTES = 5 * 1024 * 1024
+# 页面请求超时（秒）
+CRAWL_TIMEOUT = 20
+
+_USER_AGENT = "Mozilla/5.0 (compatible; video_downloader crawler)"
+
+
+class BloomFilter:
+    """布隆过滤器：固定内存的近似集合，只会误判“已存在”，不会漏判"""
+
+    def __init__(self, capacity: int = DEFAULT_EXPECTED_URLS, error_rate: float = DEFAULT_FALSE_POSITIVE_RATE):
+        """
+        Args:
+            capacity: 预期元素数
+            error_rate: 达到预期元素数时的误判率
+        """
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str) -> Iterable[int]:
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str) -> bool:
+        """
+        加入元素
+
+        Returns:
+            bool: 元素此前是否不存在（True 表示新元素）
+        """
+        added = False
+        for position in self._positions(item):
+            byte, bit = divmod(position, 8)
+            if not self._bits[byte] & (1 << bit):
+                self._bits[byte] |= 1 << bit
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[p // 8] & (1 << (p % 8)) for p in self._positions(item))
+
+
+class _LinkParser(HTMLParser):
+    """提取页面中的链接、媒体地址与视频特征"""
+
+    _LINK_ATTRS = {'a': 'href', 'iframe': 'src', 'frame': 'src', 'link': 'href'}
+    _MEDIA_ATTRS = {'video': 'src', 'audio': 'src', 'source': 'src', 'embed': 'src'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.links: List[str] = []
+        self.media: List[str] = []
+        self.has_video = False
+        self.base: Optional[str] = None
+
+    def handle_starttag(self, tag: str, attrs) -> None:
+        attrs = {name: value for name, value in attrs if value}
+        if tag == 'base' and 'href' in attrs and self.base is None:
+            self.base = attrs['href']
+        elif tag in ('video', 'audio'):
+            self.has_video = True
+        elif tag == 'meta':
+            prop = (attrs.get('property') or attrs.get('name') or '').lower()
+            if prop in ('og:video', 'og:video:url', 'og:video:secure_url', 'twitter:player:stream'):
+                self.has_video = True
+                self.media.append(attrs.get('content', ''))
+            elif prop == 'og:type' and attrs.get('content', '').lower().startswith('video'):
+                self.has_video = True
+        if tag == 'link' and (attrs.get('rel') or '').lower() not in ('', 'alternate', 'next', 'prev', 'canonical'):
+            return
+        if tag in self._LINK_ATTRS and self._LINK_ATTRS[tag] in attrs:
+            self.links.append(attrs[self._LINK_ATTRS[tag]])
+        if tag in self._MEDIA_ATTRS and self._MEDIA_ATTRS[tag] in attrs:
+            self.media.append(attrs[self._MEDIA_ATTRS[tag]])
+
+
+def parse_page(url: str, html: str) -> Dict[str, object]:
+    """
+    解析页面 HTML（不访问网络）
+
+    Args:
+        url: 页面 URL（用于解析相对链接）
+        html: 页面 HTML
+
+    Returns:
+        Dict[str, object]: {'links': [...], 'media': [...], 'has_video': bool}；
+        链接已转为绝对 URL 并去掉片段，页面内的媒体 / 清单链接归入 media
+    """
+    parser = _LinkParser()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception as err:
+        logger.debug(f"解析页面失败 {url}: {err}")
+    base = urljoin(url, parser.base) if parser.base else url
+    links: List[str] = []
+    media: List[str] = []
+    for raw, target in [*((raw, links) for raw in parser.links), *((raw, media) for raw in parser.media)]:
+        absolute = normalize_link(base, raw)
+        if not absolute:
+            continue
+        if is_media_url(absolute) or is_manifest_url(absolute):
+            target = media
+        if absolute not in target:
+            target.append(absolute)
+    return {'links': links, 'media': media, 'has_video': parser.has_video or bool(media)}
+
+
+def normalize_link(base: str, link: str) -> Optional[str]:
+    """将链接转为绝对 URL，去掉片段；非 http(s) 链接返回 None"""
+    link = (link or '').strip()
+    if not link or link.startswith(('javascript:', 'mailto:', 'tel:', 'data:', 'blob:')):
+        return None
+    absolute, _ = urldefrag(urljoin(base, link))
+    parsed = urlparse(absolute)
+    if parsed.scheme not in ('http', 'https') or not parsed.netloc:
+        return None
+    return absolute
+
+
+class Crawler:
+    """
+    异步前沿抓取器
+
+    用法：`stats = await Crawler(seeds, ...).run(on_video_page, on_media)`。
+    """
+
+    def __init__(
+        self,
+        seeds: List[str],
+        max_pages: int = DEFAULT_MAX_PAGES,
+        max_depth: int = DEFAULT_MAX_DEPTH,
+        concurrency: int = DEFAULT_CRAWL_CONCURRENCY,
+        per_host: int = DEFAULT_CRAWL_PER_HOST,
+        delay: float = DEFAULT_CRAWL_DELAY,
+        same_host: bool = True,
+        follow: Optional[str] = None,
+        exclude: Optional[str] = None,
+        video_pattern: Optional[str] = None,
+        respect_robots: bool = True,
+        headers: Optional[Dict[str, str]] = None,
+        expected_urls: int = DEFAULT_EXPECTED_URLS,
+    ):
+        """
+        初始化抓取器
+
+        Args:
+            seeds: 种子 URL
+            max_pages: 抓取的页面数上限
+            max_depth: 抓取深度上限（种子为 0）
+            concurrency: 同时抓取的页面数
+            per_host: 同一 host 同时抓取的页面数
+            delay: 同一 host 两次请求之间的最小间隔（秒）
+            same_host: 是否只跟随种子所在 host 的链接
+            follow: 只跟随匹配该正则的链接（可选）
+            exclude: 不跟随匹配该正则的链接（可选）
+            video_pattern: 匹配该正则的 URL 视为视频页面（可选；另外有站点提取器或页面含 <video> / og:video 时也视为视频页面）
+            respect_robots: 是否遵守 robots.txt
+            headers: 请求页面使用的额外请求头
+            expected_urls: 布隆过滤器的预期 URL 数
+
+        Raises:
+            ValueError: 正则无效
+        """
+        self.seeds = [seed for seed in (normalize_link(seed, seed) for seed in seeds) if seed]
+        self.max_pages = max(1, max_pages)
+        self.max_depth = max(0, max_depth)
+        self.concurrency = max(1, concurrency)
+        self.per_host = max(1, per_host)
+        self.delay = max(0.0, delay)
+        self.same_host = same_host
+        self.follow = _compile(follow)
+        self.exclude = _compile(exclude)
+        self.video_pattern = _compile(video_pattern)
+        self.respect_robots = respect_robots
+        self.headers = {'User-Agent': _USER_AGENT, **(headers or {})}
+        self.visited = BloomFilter(expected_urls)
+        self.allowed_hosts: Set[str] = {host_of(seed) for seed in self.seeds}
+        self._robots: Dict[str, Optional[RobotFileParser]] = {}
+        self._robots_locks: Dict[str, asyncio.Lock] = {}
+        self._next_request: Dict[str, float] = {}
+        self._host_locks: Dict[str, asyncio.Lock] = {}
+        self._fetched = 0
+        self._stats: Dict[str, int] = {'pages': 0, 'video_pages': 0, 'media': 0, 'errors': 0, 'robots_blocked': 0}
+
+    async def run(
+        self,
+        on_video_page: Callable[[str], Awaitable[None]],
+        on_media: Optional[Callable[[List[str], Optional[str]], Awaitable[None]]] = None,
+    ) -> Dict[str, int]:
+        """
+        执行抓取
+
+        Args:
+            on_video_page: 发现视频页面时调用（参数为页面 URL）
+            on_media: 发现媒体直链时调用，每个页面调用一次（参数为新发现的媒体 URL 列表与所在页面 URL）
+
+        Returns:
+            Dict[str, int]: 统计（抓取页面数、视频页面数、媒体直链数、错误数）
+        """
+        if not AIOHTTP_AVAILABLE:
+            raise RuntimeError("crawler 模式需要 aiohttp，请执行: pip install aiohttp")
+        frontier: asyncio.Queue = asyncio.Queue()
+        for seed in self.seeds:
+            if self.visited.add(seed):
+                frontier.put_nowait((seed, 0, None))
+        limiter = AsyncHostLimiter(self.concurrency, self.per_host)
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=CRAWL_TIMEOUT, sock_read=CRAWL_TIMEOUT)
+        async with aiohttp.ClientSession(timeout=timeout, headers=self.headers) as client:
+
+            async def worker() -> None:
+                while True:
+                    url, depth, parent = await frontier.get()
+                    try:
+                        if self._fetched < self.max_pages:
+                            # 先认领页面名额再请求，并发抓取不会超过上限
+                            self._fetched += 1
+                            await self._visit(client, limiter, frontier, url, depth, parent, on_video_page, on_media)
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as err:
+                        self._stats['errors'] += 1
+                        logger.debug(f"抓取失败 {url}: {err}")
+                    finally:
+                        frontier.task_done()
+
+            workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+            try:
+                await frontier.join()
+            finally:
+                for task in workers:
+                    task.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+        logger.info(
+            f"抓取完成: {self._stats['pages']} 个页面，{self._stats['video_pages']} 个视频页面，"
+            f"{self._stats['media']} 个媒体直链，{self._stats['errors']} 个错误"
+        )
+        return dict(self._stats)
+
+    async def _visit(self, client, limiter, frontier, url, depth, parent, on_video_page, on_media) -> None:
+        host = host_of(url)
+        if self.respect_robots and not await self._robots_allowed(client, url):
+            self._stats['robots_blocked'] += 1
+            logger.debug(f"robots.txt 禁止抓取: {url}")
+            return
+        async with limiter.slot(host):
+            await self._wait_politely(host)
+            async with client.get(url, allow_redirects=True) as response:
+                content_type = response.headers.get('Content-Type', '').lower()
+                final_url = str(response.url)
+                if response.status >= 400:
+                    self._stats['errors'] += 1
+                    logger.debug(f"页面返回 {response.status}: {url}")
+                    return
+                if is_media_content_type(content_type) or (not content_type and is_media_url(final_url)):
+                    # 链接本身就是媒体：不读取正文
+                    await self._emit_media(on_media, [final_url], parent)
+                    return
+                if content_type and 'html' not in content_type:
+                    return
+                body = await response.content.read(MAX_PAGE_BYTES)
+                html = body.decode(_encoding_of(response), errors='replace')
+        self._stats['pages'] += 1
+        page = parse_page(final_url, html)
+        logger.debug(f"已抓取 [{depth}] {final_url}: {len(page['links'])} 个链接")
+
+        await self._emit_media(on_media, page['media'], final_url)
+        if self._is_video_page(final_url, page):
+            self._stats['video_pages'] += 1
+            logger.info(f"发现视频页面: {final_url}")
+            await on_video_page(final_url)
+
+        if depth >= self.max_depth:
+            return
+        for link in page['links']:
+            if self._should_follow(link) and self.visited.add(link):
+                frontier.put_nowait((link, depth + 1, final_url))
+
+    async def _emit_media(self, on_media, media_urls: List[str], page_url: Optional[str]) -> None:
+        if on_media is None:
+            return
+        new_urls = [media_url for media_url in media_urls if self.visited.add(media_url)]
+        if not new_urls:
+            return
+        self._stats['media'] += len(new_urls)
+        for media_url in new_urls:
+            logger.info(f"发现媒体直链: {media_url}")
+        await on_media(new_urls, page_url)
+
+    def _is_video_page(self, url: str, page: Dict[str, object]) -> bool:
+        if self.video_pattern is not None and self.video_pattern.search(url):
+            return True
+        if find_extractor(url) is not None:
+            return True
+        # 页面含 <video> 或 og:video，但所有媒体都已作为直链下载时不必再打开浏览器
+        return bool(page['has_video']) and not page['media']
+
+    def _should_follow(self, url: str) -> bool:
+        if self.same_host and host_of(url) not in self.allowed_hosts:
+            return False
+        if self.exclude is not None and self.exclude.search(url):
+            return False
+        if self.follow is not None and not self.follow.search(url):
+            # 不匹配 follow 的视频页面仍然入队（只处理不展开由 video_pattern 决定）
+            return self.video_pattern is not None and bool(self.video_pattern.search(url))
+        return True
+
+    async def _wait_politely(self, host: str) -> None:
+        """同一 host 的请求之间至少间隔 delay 秒"""
+        if not self.delay:
+            return
+        lock = self._host_locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            now = time.monotonic()
+            wait = self._next_request.get(host, 0) - now
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._next_request[host] = max(now, self._next_request.get(host, 0)) + self.delay
+
+    async def _robots_allowed(self, client, url: str) -> bool:
+        parsed = urlparse(url)
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+        lock = self._robots_locks.setdefault(origin, asyncio.Lock())
+        async with lock:
+            if origin not in self._robots:
+                self._robots[origin] = await self._fetch_robots(client, origin)
+        robots = self._robots[origin]
+        return robots is None or robots.can_fetch(self.headers['User-Agent'], url)
+
+    async def _fetch_robots(self, client, origin: str) -> Optional[RobotFileParser]:
+        try:
+            async with client.get(f"{origin}/robots.txt") as response:
+                if response.status >= 400:
+                    return None
+                text = (await response.content.read(512 * 1024)).decode('utf-8', errors='replace')
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            logger.debug(f"读取 robots.txt 失败 {origin}: {err}")
+            return None
+        robots = RobotFileParser()
+        robots.parse(text.splitlines())
+        return robots
+
+
+def _encoding_of(response) -> str:
+    try:
+        return response.get_encoding()
+    except (RuntimeError, LookupError):
+        return 'utf-8'
+
+
+def _compile(pattern: Optional[str]) -> Optional[Pattern[str]]:
+    if not pattern:
+        return None
+    try:
+        return re.compile(pattern)
+    except re.error as err:
+        raise ValueError(f"无效的正则表达式 {pattern!r}: {err}")
+
+
+async def run_crawler_async(
+    crawler: Crawler,
+    downloader,
+    output_dir: str,
+    pool_size: int,
+    context_recycle: int,
+    browser_recycle: int,
+    timeout: int = 90000,
+) -> Dict[str, int]:
+    """
+    抓取并下载：视频页面交给无头浏览器模式（浏览器池并行），媒体直链直接下载
+
+    Args:
+        crawler: 抓取器
+        downloader: 作为配置模板的 HeadlessBrowserDownloader
+        output_dir: 输出目录
+        pool_size: 同时捕获的视频页面数
+        context_recycle: 每个浏览器上下文服务的页面数上限
+        browser_recycle: 浏览器服务的页面数上限（0 表示不重启）
+        timeout: 视频页面的超时时间（毫秒）
+
+    Returns:
+        Dict[str, int]: 抓取统计
+    """
+    pool = downloader.create_browser_pool(pool_size, context_recycle, browser_recycle)
+    pool_started = False
+    pool_lock = asyncio.Lock()
+    # 同时处理的视频页面数与浏览器池一致，未轮到的页面不提前创建下载流水线
+    capture_slots = asyncio.Semaphore(pool.size)
+    # 所有页面的下载共用一个并发限制：max_downloads / per_host 对整个抓取生效，而不是每条流水线各自计算
+    limiter = AsyncHostLimiter(downloader.max_downloads, downloader.per_host)
+    # 同时存在的媒体直链下载流水线数不超过 max_downloads（多出的页面排队，不提前创建会话）
+    media_slots = asyncio.Semaphore(max(1, downloader.max_downloads))
+    tasks: List[asyncio.Task] = []
+
+    async def capture(page_url: str) -> None:
+        nonlocal pool_started
+        async with capture_slots:
+            async with pool_lock:
+                # 发现第一个视频页面时才启动浏览器
+                if not pool_started:
+                    await pool.start()
+                    pool_started = True
+            worker = downloader.with_browser_pool(pool, download_limiter=limiter)
+            await worker.run_async(page_url, output_dir, timeout=timeout)
+
+    async def on_video_page(page_url: str) -> None:
+        tasks.append(asyncio.create_task(capture(page_url)))
+
+    async def download_media(media_urls: List[str], page_url: Optional[str]) -> None:
+        async with media_slots:
+            worker = downloader.with_browser_pool(pool, download_limiter=limiter)
+            await worker.download_videos(media_urls, output_dir, page_url=page_url)
+
+    async def on_media(media_urls: List[str], page_url: Optional[str]) -> None:
+        # 媒体直链不需要浏览器，边抓取边下载
+        tasks.append(asyncio.create_task(download_media(media_urls, page_url)))
+
+    try:
+        stats = await crawler.run(on_video_page, on_media)
+        if tasks:
+            logger.info(f"抓取结束，等待 {len(tasks)} 个下载任务完成...")
+            await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        if pool_started:
+            await pool.close()
+    return stats
+
+
+def run_crawler(crawler: Crawler, downloader, output_dir: str, **kwargs) -> Dict[str, int]:
+    """
+    同步执行抓取并下载（见 run_crawler_async）
+    """
+    return asyncio.run(run_crawler_async(crawler, downloader, output_dir, **kwargs))
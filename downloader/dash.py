@@ -0,0 +1,431 @@
+"""
+DASH 解析：MPD 清单 / Bilibili `__playinfo__` → 统一的表示（Representation）列表 → 按策略选出一路视频 + 一路音频
+
+只下载选中的两路，SegmentTemplate/SegmentList 分片由 hls.fetch_segments_ordered 并发拉取。
+"""
+import logging
+import math
+import os
+import re
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import urljoin
+from .http_session import SessionPool, get_session
+from .hls import DEFAULT_HLS_WORKERS, DEFAULT_QUALITY, fetch_segments_ordered, parse_quality, url_key
+try:
+    from tqdm import tqdm
+    TQDM_AVAILABLE = True
+except ImportError:
+    TQDM_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 默认视频编码偏好（越靠前越优先，兼容性 AVC > HEVC > AV1）
+DEFAULT_CODEC_PREFERENCE = 'avc,hevc,av1'
+
+_CODEC_FAMILIES = {
+    'avc1': 'avc', 'avc3': 'avc',
+    'hev1': 'hevc', 'hvc1': 'hevc',
+    'av01': 'av1',
+    'vp09': 'vp9', 'vp9': 'vp9',
+    'mp4a': 'aac',
+    'ec-3': 'eac3', 'ac-3': 'ac3',
+    'flac': 'flac', 'opus': 'opus',
+}
+_DURATION_RE = re.compile(
+    r'^P(?:(?P<days>\d+(?:\.\d+)?)D)?'
+    r'(?:T(?:(?P<hours>\d+(?:\.\d+)?)H)?(?:(?P<minutes>\d+(?:\.\d+)?)M)?(?:(?P<seconds>\d+(?:\.\d+)?)S)?)?$'
+)
+_TEMPLATE_RE = re.compile(r'\$(RepresentationID|Number|Time|Bandwidth)(%0(\d+)d)?\$')
+
+
+def parse_iso_duration(value: Optional[str]) -> float:
+    """
+    解析 ISO 8601 时长（如 `PT1H2M3.5S`）
+
+    Args:
+        value: 时长字符串
+
+    Returns:
+        float: 秒数，无法解析时返回 0
+    """
+    match = _DURATION_RE.match((value or '').strip())
+    if not match:
+        return 0.0
+    parts = {k: float(v) if v else 0.0 for k, v in match.groupdict().items()}
+    return parts['days'] * 86400 + parts['hours'] * 3600 + parts['minutes'] * 60 + parts['seconds']
+
+
+def codec_family(codecs: Optional[str]) -> str:
+    """将 codecs 字符串（如 `avc1.640032`）归类为 avc/hevc/av1/aac 等"""
+    prefix = (codecs or '').split(',')[0].strip().split('.')[0].lower()
+    return _CODEC_FAMILIES.get(prefix, prefix)
+
+
+def parse_mpd(text: str, base_url: str) -> Dict[str, object]:
+    """
+    解析 MPD 清单（仅第一个 Period）
+
+    Args:
+        text: MPD XML 内容
+        base_url: MPD URL（用于解析相对路径）
+
+    Returns:
+        Dict[str, object]: {"duration": float, "representations": [表示字典]}，
+            表示字典包含 id、content_type、bandwidth、width、height、codecs、
+            base_url、backup_urls、init、segments
+
+    Raises:
+        ValueError: 不是有效的 MPD 或为直播清单
+    """
+    root = ET.fromstring(text)
+    if _local(root.tag) != 'MPD':
+        raise ValueError("不是有效的 MPD 清单")
+    if root.get('type') == 'dynamic':
+        raise ValueError("不支持直播（dynamic）MPD")
+
+    mpd_base = _resolve_base(root, base_url)
+    periods = _children(root, 'Period')
+    if not periods:
+        raise ValueError("MPD 中没有 Period")
+    if len(periods) > 1:
+        logger.info(f"MPD 包含 {len(periods)} 个 Period，仅处理第一个")
+    period = periods[0]
+    duration = parse_iso_duration(period.get('duration') or root.get('mediaPresentationDuration'))
+    period_base = _resolve_base(period, mpd_base)
+
+    representations: List[Dict[str, object]] = []
+    for adaptation in _children(period, 'AdaptationSet'):
+        adaptation_base = _resolve_base(adaptation, period_base)
+        for rep in _children(adaptation, 'Representation'):
+            mime_type = rep.get('mimeType') or adaptation.get('mimeType') or ''
+            content_type = adaptation.get('contentType') or mime_type.split('/')[0]
+            if content_type not in ('video', 'audio'):
+                continue
+            rep_base = _resolve_base(rep, adaptation_base)
+            info: Dict[str, object] = {
+                'id': rep.get('id'),
+                'content_type': content_type,
+                'bandwidth': int(rep.get('bandwidth') or 0),
+                'width': int(rep.get('width') or adaptation.get('width') or 0),
+                'height': int(rep.get('height') or adaptation.get('height') or 0),
+                'codecs': rep.get('codecs') or adaptation.get('codecs'),
+                'mime_type': mime_type,
+                'base_url': rep_base,
+                'backup_urls': [],
+                'init': None,
+                'segments': [],
+            }
+            template = _merge_elements(
+                _first(adaptation, 'SegmentTemplate'), _first(rep, 'SegmentTemplate')
+            )
+            segment_list = _first(rep, 'SegmentList') or _first(adaptation, 'SegmentList')
+            if template is not None:
+                _expand_template(info, template, rep_base, duration)
+            elif segment_list is not None:
+                _expand_segment_list(info, segment_list, rep_base)
+            representations.append(info)
+
+    return {'duration': duration, 'representations': representations}
+
+
+def parse_playinfo(playinfo: Dict[str, object]) -> Dict[str, object]:
+    """
+    解析 Bilibili 页面中的 `window.__playinfo__`（dash 部分）
+
+    Args:
+        playinfo: `__playinfo__` 对象（或其 data/result 字段）
+
+    Returns:
+        Dict[str, object]: 与 parse_mpd 相同结构；每路表示为完整文件（无分片列表）
+
+    Raises:
+        ValueError: 不包含 dash 信息
+    """
+    data = playinfo.get('data') or playinfo.get('result') or playinfo
+    dash = data.get('dash') if isinstance(data, dict) else None
+    if not dash:
+        raise ValueError("__playinfo__ 中没有 dash 信息")
+
+    audio_items = list(dash.get('audio') or [])
+    for extra in ((dash.get('dolby') or {}).get('audio') or [], [(dash.get('flac') or {}).get('audio')]):
+        audio_items.extend(item for item in extra if item)
+
+    representations: List[Dict[str, object]] = []
+    for content_type, items in (('video', dash.get('video') or []), ('audio', audio_items)):
+        for item in items:
+            url = item.get('baseUrl') or item.get('base_url')
+            if not url:
+                continue
+            representations.append({
+                'id': str(item.get('id')),
+                'content_type': content_type,
+                'bandwidth': int(item.get('bandwidth') or 0),
+                'width': int(item.get('width') or 0),
+                'height': int(item.get('height') or 0),
+                'codecs': item.get('codecs'),
+                'mime_type': item.get('mimeType') or item.get('mime_type'),
+                'base_url': url,
+                'backup_urls': list(item.get('backupUrl') or item.get('backup_url') or []),
+                'init': None,
+                'segments': [],
+            })
+
+    return {'duration': float(dash.get('duration') or 0), 'representations': representations}
+
+
+def fetch_mpd(
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    session_pool: Optional[SessionPool] = None,
+) -> Dict[str, object]:
+    """
+    下载并解析 MPD 清单
+
+    Args:
+        url: MPD URL
+        headers: HTTP 请求头
+        session_pool: HTTP 会话池（可选）
+
+    Returns:
+        Dict[str, object]: parse_mpd 的解析结果
+    """
+    request_headers = {k: v for k, v in (headers or {}).items() if k.lower() != 'range'}
+    response = get_session(url, session_pool).get(url, headers=request_headers, timeout=30)
+    response.raise_for_status()
+    return parse_mpd(response.text, response.url or url)
+
+
+def select_representations(
+    representations: List[Dict[str, object]],
+    quality: str = DEFAULT_QUALITY,
+    codec_preference: str = DEFAULT_CODEC_PREFERENCE,
+) -> Tuple[Optional[Dict[str, object]], Optional[Dict[str, object]]]:
+    """
+    选出一路视频与一路音频
+
+    视频：先按 quality 策略（best / worst / <=1080p / max-bitrate=...）确定分辨率，
+    同分辨率下按编码偏好，再按码率。音频：取码率最高（worst 时取最低）。
+
+    Args:
+        representations: 表示列表
+        quality: 画质策略
+        codec_preference: 视频编码偏好（逗号分隔，如 "avc,hevc,av1"）
+
+    Returns:
+        Tuple[Optional[Dict], Optional[Dict]]: (视频表示, 音频表示)
+    """
+    policy = parse_quality(quality)
+    order = [c.strip().lower() for c in codec_preference.split(',') if c.strip()]
+    videos = [r for r in representations if r['content_type'] == 'video']
+    audios = [r for r in representations if r['content_type'] == 'audio']
+
+    video = None
+    if videos:
+        if policy['mode'] == 'max_height':
+            eligible = [v for v in videos if v['height'] <= policy['limit']]
+        elif policy['mode'] == 'max_bitrate':
+            eligible = [v for v in videos if v['bandwidth'] <= policy['limit']]
+        else:
+            eligible = videos
+        if not eligible:
+            eligible = [min(videos, key=lambda v: (v['height'], v['bandwidth']))]
+        worst = policy['mode'] == 'worst'
+        target_height = (min if worst else max)(v['height'] for v in eligible)
+        candidates = [v for v in eligible if v['height'] == target_height]
+
+        def codec_rank(rep: Dict[str, object]) -> int:
+            family = codec_family(rep['codecs'])
+            return order.index(family) if family in order else len(order)
+
+        best_codec = min(codec_rank(v) for v in candidates)
+        candidates = [v for v in candidates if codec_rank(v) == best_codec]
+        video = (min if worst else max)(candidates, key=lambda v: v['bandwidth'])
+
+    audio = None
+    if audios:
+        audio = (min if policy['mode'] == 'worst' else max)(audios, key=lambda a: a['bandwidth'])
+
+    if video:
+        logger.info(
+            f"DASH 选择视频: {video['width']}x{video['height']} {video['codecs']} ({video['bandwidth']} bps)"
+        )
+    if audio:
+        logger.info(f"DASH 选择音频: {audio['codecs']} ({audio['bandwidth']} bps)")
+    return video, audio
+
+
+def manifest_media_keys(manifest: Dict[str, object]) -> Set[str]:
+    """
+    清单中所有媒体 URL 的比较键（忽略查询参数），用于从捕获列表中剔除已由清单覆盖的 .m4s
+
+    Args:
+        manifest: parse_mpd / parse_playinfo 的结果
+
+    Returns:
+        Set[str]: URL 比较键集合
+    """
+    keys: Set[str] = set()
+    for rep in manifest['representations']:
+        for url in [rep['base_url'], *rep['backup_urls']]:
+            if url:
+                keys.add(url_key(url))
+        if rep['init']:
+            keys.add(url_key(rep['init']['uri']))
+        for segment in rep['segments']:
+            keys.add(url_key(segment['uri']))
+    return keys
+
+
+def download_representation_segments(
+    rep: Dict[str, object],
+    output_path: str,
+    headers: Optional[Dict[str, str]] = None,
+    session_pool: Optional[SessionPool] = None,
+    workers: int = DEFAULT_HLS_WORKERS,
+) -> None:
+    """
+    并发下载分片式表示（SegmentTemplate/SegmentList），初始化分片 + 媒体分片按顺序写入
+
+    Args:
+        rep: 表示字典（segments 非空）
+        output_path: 输出文件路径
+        headers: HTTP 请求头
+        session_pool: HTTP 会话池（可选）
+        workers: 并发线程数
+    """
+    segments = [
+        {'uri': seg['uri'], 'byterange': seg.get('byterange'), 'map': rep['init']}
+        for seg in rep['segments']
+    ]
+    filename = os.path.basename(output_path)
+    logger.info(f"开始并发下载 {len(segments)} 个 DASH 分片 ({workers} 线程): {filename}")
+    pbar = None
+    if TQDM_AVAILABLE:
+        pbar = tqdm(total=len(segments), desc=f"下载 DASH {filename[:30]}", unit='片段', ncols=100)
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    try:
+        with open(output_path, 'wb') as out:
+            fetch_segments_ordered(
+                segments,
+                out,
+                headers=headers,
+                session_pool=session_pool,
+                workers=workers,
+                on_segment=(lambda: pbar.update(1)) if pbar is not None else None,
+            )
+    finally:
+        if pbar is not None:
+            pbar.close()
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def _children(element, name: str) -> List[ET.Element]:
+    return [child for child in element if _local(child.tag) == name]
+
+
+def _first(element, name: str) -> Optional[ET.Element]:
+    children = _children(element, name)
+    return children[0] if children else None
+
+
+def _resolve_base(element, parent_base: str) -> str:
+    base = _first(element, 'BaseURL')
+    if base is not None and base.text and base.text.strip():
+        return urljoin(parent_base, base.text.strip())
+    return parent_base
+
+
+def _merge_elements(parent: Optional[ET.Element], child: Optional[ET.Element]) -> Optional[ET.Element]:
+    """合并 AdaptationSet 与 Representation 两级的 SegmentTemplate（子级属性优先）"""
+    if parent is None:
+        return child
+    if child is None:
+        return parent
+    merged = ET.Element(child.tag, {**parent.attrib, **child.attrib})
+    timeline = _first(child, 'SegmentTimeline')
+    if timeline is None:
+        timeline = _first(parent, 'SegmentTimeline')
+    if timeline is not None:
+        merged.append(timeline)
+    return merged
+
+
+def _fill_template(template: str, rep: Dict[str, object], number: Optional[int] = None, time: Optional[int] = None) -> str:
+    values = {
+        'RepresentationID': rep.get('id') or '',
+        'Number': number,
+        'Time': time,
+        'Bandwidth': rep.get('bandwidth'),
+    }
+
+    def replace(match) -> str:
+        value = values[match.group(1)]
+        if match.group(3) and isinstance(value, int):
+            return str(value).zfill(int(match.group(3)))
+        return str(value)
+
+    return _TEMPLATE_RE.sub(replace, template).replace('$$', '$')
+
+
+def _expand_template(rep: Dict[str, object], template: ET.Element, base: str, period_duration: float) -> None:
+    media = template.get('media')
+    if not media:
+        return
+    initialization = template.get('initialization')
+    if initialization:
+        rep['init'] = {'uri': urljoin(base, _fill_template(initialization, rep))}
+    start_number = int(template.get('startNumber') or 1)
+    timescale = int(template.get('timescale') or 1)
+
+    timeline = _first(template, 'SegmentTimeline')
+    segments = []
+    if timeline is not None:
+        number = start_number
+        current = 0
+        period_end = period_duration * timescale
+        for entry in _children(timeline, 'S'):
+            if entry.get('t') is not None:
+                current = int(entry.get('t'))
+            duration = int(entry.get('d'))
+            repeat = int(entry.get('r') or 0)
+            if repeat < 0:
+                repeat = max(0, math.ceil((period_end - current) / duration) - 1) if period_end else 0
+            for _ in range(repeat + 1):
+                segments.append({'uri': urljoin(base, _fill_template(media, rep, number, current))})
+                number += 1
+                current += duration
+    elif template.get('duration'):
+        segment_duration = int(template.get('duration')) / timescale
+        count = math.ceil(period_duration / segment_duration) if period_duration else 0
+        for index in range(count):
+            number = start_number + index
+            time = int(index * segment_duration * timescale)
+            segments.append({'uri': urljoin(base, _fill_template(media, rep, number, time))})
+    rep['segments'] = segments
+
+
+def _expand_segment_list(rep: Dict[str, object], segment_list: ET.Element, base: str) -> None:
+    init = _first(segment_list, 'Initialization')
+    if init is not None:
+        rep['init'] = {
+            'uri': urljoin(base, init.get('sourceURL') or ''),
+            'range': _parse_media_range(init.get('range')),
+        }
+    segments = []
+    for item in _children(segment_list, 'SegmentURL'):
+        segments.append({
+            'uri': urljoin(base, item.get('media') or ''),
+            'byterange': _parse_media_range(item.get('mediaRange')),
+        })
+    rep['segments'] = segments
+
+
+def _parse_media_range(value: Optional[str]):
+    if not value or '-' not in value:
+        return None
+    start, end = value.split('-', 1)
+    return int(start), int(end)
@@ -0,0 +1,494 @@
+"""
+内容寻址去重存储：按内容哈希索引已下载的媒体文件（SQLite）
+
+- 下载时边写边计算内容哈希，不需要下载完成后再整文件读一遍。内容哈希为分块哈希：
+  每 4 MiB 一块分别计算 SHA-256，再对全部块摘要计算 SHA-256。分段下载的各连接按块边界切分，
+  各自计算负责的块；只有续传前已写入磁盘的块需要在结束时从文件补算。
+- 索引 URL → 内容哈希、内容哈希 → 文件路径。同一媒体再次出现（重试、批量任务中重复的页面、
+  签名参数不同的同一文件）时按 link / skip 方式复用已有文件。
+- 每个文件额外记录前缀哈希（文件大小 + 前 64 KiB）。下载前用一个请求取回前 64 KiB
+  （同时完成 Range 探测）；前缀哈希相同的已有文件只是候选，再取回末尾 64 KiB 与候选文件比较，
+  一致才视为重复，不再下载其余部分。
+- 下载后会被合并并删除的中间文件（.m4s 分轨、.ts 分片）不登记，避免索引指向已删除的文件。
+"""
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import requests
+from .http_session import SessionPool, get_session
+from .segmented_download import RangeJournal, parse_probe_response, set_range_header
+
+logger = logging.getLogger(__name__)
+
+# 内容哈希的分块大小（与续传日志的刷新间隔一致，续传的区间多为整块）
+BLOCK_SIZE = 4 * 1024 * 1024
+# 前缀哈希覆盖的字节数
+PREFIX_BYTES = 64 * 1024
+# 前缀哈希命中后再比较的文件末尾字节数
+TAIL_BYTES = 64 * 1024
+# 下载后即被合并并删除的中间文件，不参与去重
+INTERMEDIATE_EXTENSIONS: Tuple[str, ...] = ('.m4s', '.ts')
+
+# 已有相同内容时的处理方式
+# link：在输出目录创建指向已有文件的硬链接（跨文件系统等无法链接时复制）；
+# skip：直接使用已有文件（后处理不会删除输出目录之外的文件）
+DEDUP_MODES: Tuple[str, ...] = ('link', 'skip')
+DEFAULT_DEDUP_MODE = 'link'
+
+# URL 索引键忽略的查询参数：签名、过期时间与临时凭证（不决定返回的内容）
+_SIGNATURE_PARAMS = frozenset({
+    'sign', 'signature', 'sig', 'token', 'auth_key', 'deadline', 'expires', 'expire', 'x-expires',
+    'wstime', 'wssecret', 'txtime', 'txsecret', 'policy', 'key-pair-id', 'hdnts', 'hdnea',
+    'x-amz-algorithm', 'x-amz-credential', 'x-amz-date', 'x-amz-expires', 'x-amz-security-token',
+    'x-amz-signature', 'x-amz-signedheaders',
+})
+
+
+def media_key(url: str) -> str:
+    """
+    URL 索引键：完整 URL 去掉片段标识与已知的签名 / 过期参数
+
+    其他查询参数（如 ?vid=1）可能决定返回哪个视频，必须保留；路径大小写不变。
+    CDN 镜像、重新签名等 URL 不同但内容相同的情况由前缀哈希匹配。
+
+    Args:
+        url: 媒体 URL
+
+    Returns:
+        str: 索引键
+    """
+    parts = urlsplit(url)
+    query = [
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if name.lower() not in _SIGNATURE_PARAMS
+    ]
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ''))
+
+
+def is_intermediate(path: str) -> bool:
+    """是否为合并后会被删除的中间文件（分离的音视频轨、TS 分片）"""
+    return path.lower().endswith(INTERMEDIATE_EXTENSIONS)
+
+
+def tail_range(total_size: int) -> Optional[Tuple[int, int]]:
+    """
+    确认前缀匹配时比较的末尾区间
+
+    Args:
+        total_size: 文件总大小
+
+    Returns:
+        Optional[Tuple[int, int]]: 闭区间；文件不超过 PREFIX_BYTES（前缀哈希已覆盖整个文件）时为 None
+    """
+    if total_size <= PREFIX_BYTES:
+        return None
+    return max(PREFIX_BYTES, total_size - TAIL_BYTES), total_size - 1
+
+
+def read_file_tail(path: str, total_size: int) -> bytes:
+    """读取本地文件的末尾区间（见 tail_range）"""
+    span = tail_range(total_size)
+    if span is None:
+        return b''
+    with open(path, 'rb') as f:
+        f.seek(span[0])
+        return f.read(span[1] - span[0] + 1)
+
+
+def fetch_tail(
+    url: str,
+    total_size: int,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: int = 30,
+    session_pool: Optional[SessionPool] = None,
+) -> Optional[bytes]:
+    """
+    请求远端文件的末尾区间，用于确认前缀哈希的匹配
+
+    Args:
+        url: 视频URL
+        total_size: 文件总大小
+        headers: HTTP 请求头
+        timeout: 超时时间（秒）
+        session_pool: HTTP 会话池（可选）
+
+    Returns:
+        Optional[bytes]: 末尾数据（文件不超过 PREFIX_BYTES 时为 b''）；服务器未按 Range 返回或连接中断时为 None
+    """
+    span = tail_range(total_size)
+    if span is None:
+        return b''
+    tail_headers = dict(headers or {})
+    set_range_header(tail_headers, f'bytes={span[0]}-{span[1]}')
+    try:
+        response = get_session(url, session_pool).get(url, headers=tail_headers, timeout=timeout)
+    except requests.RequestException as err:
+        logger.debug(f"末尾区间请求失败: {err}")
+        return None
+    if response.status_code != 206 or len(response.content) != span[1] - span[0] + 1:
+        return None
+    return response.content
+
+
+def prefix_digest(prefix: bytes, total_size: int) -> str:
+    """
+    前缀哈希：文件大小 + 前 PREFIX_BYTES 字节
+
+    Args:
+        prefix: 文件开头的字节（不足 PREFIX_BYTES 时为整个文件）
+        total_size: 文件总大小
+
+    Returns:
+        str: 十六进制摘要
+    """
+    digest = hashlib.sha256(f"{total_size}:".encode('ascii'))
+    digest.update(prefix[:PREFIX_BYTES])
+    return digest.hexdigest()
+
+
+def probe_total_size(status_code: int, headers, remote: Optional[Dict[str, object]]) -> Optional[int]:
+    """由前缀探测响应推断文件总大小（206 取 Content-Range，200 取 Content-Length）"""
+    if remote:
+        return int(remote['total_size'])
+    if status_code == 200 and not headers.get('content-encoding'):
+        try:
+            return int(headers.get('content-length', ''))
+        except ValueError:
+            return None
+    return None
+
+
+def probe_prefix(
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: int = 30,
+    session_pool: Optional[SessionPool] = None,
+) -> Tuple[Optional[Dict[str, object]], Optional[str]]:
+    """
+    请求文件前 PREFIX_BYTES 字节，同时完成 Range 探测（代替 `Range: bytes=0-0` 的探测请求）
+
+    Args:
+        url: 视频URL
+        headers: HTTP 请求头
+        timeout: 超时时间（秒）
+        session_pool: HTTP 会话池（可选）
+
+    Returns:
+        Tuple[Optional[Dict[str, object]], Optional[str]]: (同 probe_range_support 的远端文件信息, 前缀哈希)；
+        无法取得时对应项为 None
+    """
+    probe_headers = dict(headers or {})
+    set_range_header(probe_headers, f'bytes=0-{PREFIX_BYTES - 1}')
+    try:
+        session = get_session(url, session_pool)
+        with session.get(url, headers=probe_headers, stream=True, timeout=timeout) as response:
+            remote = parse_probe_response(response.status_code, response.headers)
+            total_size = probe_total_size(response.status_code, response.headers, remote)
+            if total_size is None:
+                return remote, None
+            prefix = bytearray()
+            for chunk in response.iter_content(chunk_size=PREFIX_BYTES):
+                prefix += chunk
+                if len(prefix) >= PREFIX_BYTES:
+                    break
+            return remote, checked_prefix_digest(bytes(prefix), total_size)
+    except requests.RequestException as err:
+        logger.debug(f"前缀探测失败: {err}")
+        return None, None
+
+
+def checked_prefix_digest(prefix: bytes, total_size: int) -> Optional[str]:
+    """前缀长度与文件大小相符时返回前缀哈希（连接提前结束时为 None）"""
+    if len(prefix) < min(PREFIX_BYTES, total_size):
+        return None
+    return prefix_digest(prefix, total_size)
+
+
+class ContentHasher:
+    """
+    边下载边计算的分块内容哈希
+
+    `update(offset, data)` 可由多个连接并发调用；每块只在从块起点开始连续写入时流式计算，
+    其余（续传前已在磁盘上的、跨越分段边界的）块在 `finalize` 时从文件读取补算。
+    """
+
+    def __init__(self, block_size: int = BLOCK_SIZE):
+        self.block_size = block_size
+        self._partial: Dict[int, list] = {}
+        self._digests: Dict[int, bytes] = {}
+        self._lock = threading.Lock()
+        self.digest: Optional[str] = None
+        self.prefix: Optional[str] = None
+        self.size = 0
+
+    def update(self, offset: int, data: bytes) -> None:
+        """
+        登记写入文件 offset 处的数据
+
+        Args:
+            offset: 数据在文件中的偏移
+            data: 写入的数据
+        """
+        view = memoryview(data)
+        with self._lock:
+            while view:
+                index = offset // self.block_size
+                block_end = (index + 1) * self.block_size
+                piece = view[:block_end - offset]
+                state = self._partial.get(index)
+                if state is None and offset == index * self.block_size and index not in self._digests:
+                    state = self._partial[index] = [hashlib.sha256(), offset]
+                if state is not None and state[1] == offset:
+                    state[0].update(piece)
+                    state[1] += len(piece)
+                    if state[1] == block_end:
+                        self._digests[index] = state[0].digest()
+                        del self._partial[index]
+                offset += len(piece)
+                view = view[len(piece):]
+
+    def finalize(self, path: str) -> str:
+        """
+        计算内容哈希与前缀哈希（补算未流式计算的块）
+
+        Args:
+            path: 下载完成的文件
+
+        Returns:
+            str: 内容哈希
+        """
+        size = os.path.getsize(path)
+        count = -(-size // self.block_size)
+        filled = 0
+        with open(path, 'rb') as f:
+            prefix = f.read(PREFIX_BYTES)
+            with self._lock:
+                digests: List[bytes] = []
+                for index in range(count):
+                    block_start = index * self.block_size
+                    block_end = min(block_start + self.block_size, size)
+                    state = self._partial.get(index)
+                    if index in self._digests:
+                        digests.append(self._digests[index])
+                    elif state is not None and state[1] == block_end:
+                        # 文件末尾不足一块
+                        digests.append(state[0].digest())
+                    else:
+                        f.seek(block_start)
+                        digests.append(hashlib.sha256(f.read(block_end - block_start)).digest())
+                        filled += 1
+        if filled:
+            logger.debug(f"从磁盘补算 {filled}/{count} 个块的哈希: {os.path.basename(path)}")
+        self.size = size
+        self.prefix = prefix_digest(prefix, size)
+        self.digest = hashlib.sha256(b''.join(digests)).hexdigest()
+        return self.digest
+
+
+class DedupStore:
+    """
+    URL → 内容哈希 → 文件路径 的持久化索引
+
+    线程安全；同一文件可由多个进程共享（SQLite 自带文件锁）。索引中的文件被删除或改动（大小不符）后自动失效。
+    """
+
+    def __init__(self, path: str, mode: str = DEFAULT_DEDUP_MODE):
+        """
+        打开（或创建）索引数据库
+
+        Args:
+            path: SQLite 文件路径
+            mode: 已有相同内容时的处理方式（link / skip）
+        """
+        if mode not in DEDUP_MODES:
+            raise ValueError(f"不支持的去重方式: {mode}")
+        self.path = os.path.expanduser(path)
+        self.mode = mode
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS contents ("
+                " hash TEXT PRIMARY KEY,"
+                " path TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " prefix TEXT NOT NULL,"
+                " created REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS contents_prefix ON contents (prefix)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS urls ("
+                " url_key TEXT PRIMARY KEY,"
+                " url TEXT NOT NULL,"
+                " hash TEXT NOT NULL)"
+            )
+
+    def find_by_url(self, url: str) -> Optional[str]:
+        """
+        查找该 URL 之前下载的文件
+
+        Args:
+            url: 媒体 URL
+
+        Returns:
+            Optional[str]: 已有文件路径，未命中或文件已失效时为 None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT c.hash, c.path, c.size FROM urls u JOIN contents c ON c.hash = u.hash"
+                " WHERE u.url_key = ?",
+                (media_key(url),),
+            ).fetchone()
+            return self._valid_path_locked(row)
+
+    def has_prefix(self, prefix: str) -> bool:
+        """是否有前缀哈希相同的候选文件（命中时调用方再取回末尾区间确认）"""
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM contents WHERE prefix = ? LIMIT 1", (prefix,)).fetchone()
+        return row is not None
+
+    def find_by_prefix(self, url: str, prefix: str, tail: bytes) -> Optional[str]:
+        """
+        按前缀哈希查找候选文件，末尾区间也一致时视为内容相同，并把 URL 登记到该内容
+
+        Args:
+            url: 媒体 URL
+            prefix: 前缀哈希（见 prefix_digest）
+            tail: 远端文件的末尾区间（见 fetch_tail）
+
+        Returns:
+            Optional[str]: 已有文件路径，未命中时为 None
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT hash, path, size FROM contents WHERE prefix = ?", (prefix,)
+            ).fetchall()
+            for row in rows:
+                path = self._valid_path_locked(row)
+                if not path:
+                    continue
+                try:
+                    matched = read_file_tail(path, row[2]) == tail
+                except OSError:
+                    matched = False
+                if matched:
+                    self._add_url_locked(url, row[0])
+                    return path
+        return None
+
+    def add_file(self, url: str, path: str, hasher: Optional[ContentHasher] = None) -> str:
+        """
+        登记下载完成的文件；内容与已有文件相同时按去重方式替换为已有文件
+
+        Args:
+            url: 媒体 URL
+            path: 下载完成的文件
+            hasher: 下载时使用的哈希器（可选，未传入时读取整个文件计算）
+
+        Returns:
+            str: 最终使用的文件路径
+        """
+        hasher = hasher or ContentHasher()
+        digest = hasher.finalize(path)
+        path = os.path.abspath(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT hash, path, size FROM contents WHERE hash = ?", (digest,)
+            ).fetchone()
+            existing = self._valid_path_locked(row)
+            if existing is None or existing == path:
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO contents (hash, path, size, prefix, created) VALUES (?, ?, ?, ?, ?)",
+                        (digest, path, hasher.size, hasher.prefix, time.time()),
+                    )
+            self._add_url_locked(url, digest)
+        if existing is None or existing == path:
+            return path
+        logger.info(f"下载内容与已有文件相同: {os.path.basename(path)} = {existing}")
+        return self.materialize(existing, path)
+
+    def materialize(self, existing: str, output_path: str) -> str:
+        """
+        按去重方式复用已有文件
+
+        Args:
+            existing: 已有文件路径
+            output_path: 本次下载的输出路径
+
+        Returns:
+            str: link 模式为 output_path（无法创建硬链接时复制）；skip 模式为已有文件路径
+        """
+        RangeJournal.discard(output_path)
+        try:
+            if os.path.exists(output_path) and os.path.samefile(existing, output_path):
+                return output_path
+        except OSError:
+            pass
+        if self.mode == 'link':
+            tmp_path = f"{output_path}.{os.getpid()}.link"
+            try:
+                os.link(existing, tmp_path)
+                os.replace(tmp_path, output_path)
+                logger.info(f"内容已存在，创建硬链接: {os.path.basename(output_path)} -> {existing}")
+                return output_path
+            except OSError as err:
+                logger.debug(f"无法创建硬链接，改为复制: {err}")
+                _remove_quietly(tmp_path)
+            # 已有文件可能属于其他批次（其他目录），不能把它的路径交给本次的后处理
+            tmp_path = f"{output_path}.{os.getpid()}.copy"
+            try:
+                shutil.copyfile(existing, tmp_path)
+                os.replace(tmp_path, output_path)
+                logger.info(f"内容已存在，复制已有文件: {os.path.basename(output_path)} <- {existing}")
+                return output_path
+            except OSError:
+                _remove_quietly(tmp_path)
+                raise
+        _remove_quietly(output_path)
+        logger.info(f"内容已存在，跳过下载: {existing}")
+        return existing
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _valid_path_locked(self, row) -> Optional[str]:
+        """文件仍存在且大小一致时返回路径，否则删除该内容的索引"""
+        if row is None:
+            return None
+        digest, path, size = row
+        try:
+            if os.path.getsize(path) == size:
+                return path
+        except OSError:
+            pass
+        with self._conn:
+            self._conn.execute("DELETE FROM contents WHERE hash = ?", (digest,))
+            self._conn.execute("DELETE FROM urls WHERE hash = ?", (digest,))
+        logger.debug(f"去重索引中的文件已失效: {path}")
+        return None
+
+    def _add_url_locked(self, url: str, digest: str) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO urls (url_key, url, hash) VALUES (?, ?, ?)",
+                (media_key(url), url, digest),
+            )
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        if os.path.lexists(path):
+            os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,167 @@
+"""
+站点提取器：对已知站点直接请求页面 HTML 并解析媒体信息，成功时无需启动浏览器
+
+提取器按注册顺序尝试，第一个 `suitable()` 的提取器负责该页面；提取失败时回退到无头浏览器。
+解析（`parse`）与网络请求（`extract`）分离，可直接用保存的 HTML 离线验证：
+
+    BilibiliExtractor().parse(url, open('page.html', encoding='utf-8').read())
+"""
+import json
+import logging
+import re
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+import requests
+from .http_session import SessionPool, get_session
+
+logger = logging.getLogger(__name__)
+
+# 页面请求超时（秒）
+PAGE_TIMEOUT = 15
+
+
+def fetch_page(
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    session_pool: Optional[SessionPool] = None,
+) -> Optional[str]:
+    """
+    请求页面 HTML
+
+    Args:
+        url: 页面 URL
+        headers: HTTP 请求头
+        session_pool: HTTP 会话池（可选）
+
+    Returns:
+        Optional[str]: 页面 HTML，请求失败时为 None
+    """
+    try:
+        response = get_session(url, session_pool).get(url, headers=headers, timeout=PAGE_TIMEOUT)
+        response.raise_for_status()
+    except requests.RequestException as err:
+        logger.debug(f"请求页面失败 {url}: {err}")
+        return None
+    if not response.encoding or response.encoding.lower() == 'iso-8859-1':
+        response.encoding = response.apparent_encoding or 'utf-8'
+    return response.text
+
+
+class Extractor:
+    """
+    提取器基类：子类实现 `suitable` 与 `parse`
+
+    `parse` 返回的结果结构与页面解析缓存一致：
+    {'extractor': 名称, 'media_urls': [...], 'headers': {url: headers}, 'playinfo': ... 或 None}
+    """
+
+    name = 'base'
+
+    def suitable(self, url: str) -> bool:
+        """是否处理该页面 URL"""
+        raise NotImplementedError
+
+    def parse(self, url: str, html: str) -> Optional[Dict[str, object]]:
+        """
+        从页面 HTML 解析媒体信息（不访问网络）
+
+        Args:
+            url: 页面 URL
+            html: 页面 HTML
+
+        Returns:
+            Optional[Dict[str, object]]: 解析结果，无法提取时为 None
+        """
+        raise NotImplementedError
+
+    def extract(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        session_pool: Optional[SessionPool] = None,
+    ) -> Optional[Dict[str, object]]:
+        """
+        请求页面并解析
+
+        Args:
+            url: 页面 URL
+            headers: 请求页面使用的 HTTP 请求头
+            session_pool: HTTP 会话池（可选）
+
+        Returns:
+            Optional[Dict[str, object]]: 解析结果，请求或解析失败时为 None
+        """
+        html = fetch_page(url, headers, session_pool)
+        if not html:
+            return None
+        return self.parse(url, html)
+
+    def _result(self, media_urls: List[str], playinfo: Optional[Dict[str, object]] = None) -> Dict[str, object]:
+        return {'extractor': self.name, 'media_urls': media_urls, 'headers': {}, 'playinfo': playinfo}
+
+
+class BilibiliExtractor(Extractor):
+    """Bilibili 视频页：解析 HTML 中内嵌的 `window.__playinfo__`（DASH 或 durl 直链）"""
+
+    name = 'bilibili'
+
+    _PLAYINFO_RE = re.compile(r'window\.__playinfo__\s*=\s*(\{.*?\})\s*</script>', re.S)
+
+    def suitable(self, url: str) -> bool:
+        parsed = urlparse(url)
+        host = (parsed.hostname or '').lower()
+        return (host == 'bilibili.com' or host.endswith('.bilibili.com')) and parsed.path.startswith('/video/')
+
+    def parse(self, url: str, html: str) -> Optional[Dict[str, object]]:
+        match = self._PLAYINFO_RE.search(html)
+        if not match:
+            logger.debug("页面中没有 __playinfo__")
+            return None
+        try:
+            playinfo = json.loads(match.group(1))
+        except ValueError as err:
+            logger.debug(f"__playinfo__ 不是有效 JSON: {err}")
+            return None
+        if not isinstance(playinfo, dict) or playinfo.get('code', 0) != 0:
+            logger.debug(f"__playinfo__ 返回错误: {playinfo.get('message') if isinstance(playinfo, dict) else playinfo}")
+            return None
+        data = playinfo.get('data') or {}
+        dash = data.get('dash') or {}
+        media_urls = [
+            item.get('baseUrl') or item.get('base_url')
+            for item in [*(dash.get('video') or []), *(dash.get('audio') or [])]
+        ]
+        if not any(media_urls):
+            # 旧版 / 无 DASH 的视频：durl 为整段 flv/mp4 直链
+            media_urls = [item.get('url') for item in data.get('durl') or []]
+            playinfo = None
+        media_urls = [media_url for media_url in media_urls if media_url]
+        if not media_urls:
+            return None
+        return self._result(media_urls, playinfo)
+
+
+# 按顺序尝试的提取器
+EXTRACTORS: List[Extractor] = [BilibiliExtractor()]
+
+
+def register_extractor(extractor: Extractor, first: bool = False) -> None:
+    """
+    注册提取器
+
+    Args:
+        extractor: 提取器实例
+        first: 是否优先于已注册的提取器
+    """
+    if first:
+        EXTRACTORS.insert(0, extractor)
+    else:
+        EXTRACTORS.append(extractor)
+
+
+def find_extractor(url: str) -> Optional[Extractor]:
+    """返回处理该页面的提取器，没有时为 None"""
+    for extractor in EXTRACTORS:
+        if extractor.suitable(url):
+            return extractor
+    return None
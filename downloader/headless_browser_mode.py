@@ -3,7 +3,9 @@
 自动打开网页 → 监听网络请求 → 匹配视频流链接（m3u8/mp4）→ 下载并合并
 """
 import asyncio
+import functools
 import logging
+import os
 from pathlib import Path
 from typing import Dict, List, Optional, Set
 from urllib.parse import urlparse
@@ -13,7 +15,37 @@ from playwright.async_api import (
     Browser,
     BrowserContext,
 )
-from .utils import download_video, get_video_filename, is_video_url, auto_mux_downloads, detect_and_merge_ts_files
+from .utils import (
+    download_dash,
+    is_video_url,
+    auto_mux_downloads,
+    detect_and_merge_ts_files,
+)
+from .segmented_download import DEFAULT_CONNECTIONS
+from .http_session import SessionPool
+from .hls import DEFAULT_QUALITY, drop_sibling_variants
+from .dash import DEFAULT_CODEC_PREFERENCE, manifest_media_keys, parse_playinfo
+from .scheduler import DEFAULT_MAX_DOWNLOADS, DEFAULT_PER_HOST, AsyncHostLimiter
+from .postprocess import DEFAULT_POSTPROCESS_JOBS
+from .pipeline import DownloadPipeline
+from .browser_pool import (
+    DEFAULT_BROWSER_POOL_SIZE,
+    DEFAULT_BROWSER_RECYCLE,
+    DEFAULT_CONTEXT_RECYCLE,
+    BrowserPool,
+)
+from .request_routing import (
+    DEFAULT_MEDIA_BODY_POLICY,
+    MEDIA_BODY_POLICIES,
+    BlockPolicy,
+    is_manifest_url,
+    is_media_content_type,
+    is_media_url,
+)
+from .storage_state import StorageStateCache, cookie_header, local_storage_script
+from .resolution_cache import ResolutionCache
+from .dedup_store import DedupStore
+from .extractors import find_extractor
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +55,11 @@ DEFAULT_CHROMIUM_USER_AGENT = (
     "Chrome/129.0.6668.89 Safari/537.36"
 )
 
+# 已发现可播放媒体后，连续多久没有新的媒体响应即认为捕获完成（秒）
+DEFAULT_SETTLE_QUIET = 2.0
+# 页面加载后等待媒体的最长时间（秒）
+DEFAULT_SETTLE_TIMEOUT = 15.0
+
 DEFAULT_SEC_CH_UA = '"Google Chrome";v="129", "Not=A?Brand";v="24", "Chromium";v="129"'
 DEFAULT_SEC_CH_UA_PLATFORM = '"macOS"'
 DEFAULT_SEC_CH_UA_FULL_VERSION = '"129.0.6668.89"'
@@ -130,6 +167,27 @@ class HeadlessBrowserDownloader:
         locale: str = "zh-CN",
         timezone_id: str = "Asia/Shanghai",
         user_data_dir: Optional[str] = None,
+        download_connections: int = DEFAULT_CONNECTIONS,
+        session_pool: Optional[SessionPool] = None,
+        quality: str = DEFAULT_QUALITY,
+        codec_preference: str = DEFAULT_CODEC_PREFERENCE,
+        max_downloads: int = DEFAULT_MAX_DOWNLOADS,
+        per_host: int = DEFAULT_PER_HOST,
+        settle_quiet: float = DEFAULT_SETTLE_QUIET,
+        settle_timeout: float = DEFAULT_SETTLE_TIMEOUT,
+        linger: float = 0,
+        browser_pool: Optional[BrowserPool] = None,
+        request_headers: Optional[Dict[str, str]] = None,
+        media_bodies: str = DEFAULT_MEDIA_BODY_POLICY,
+        block_policy: Optional[BlockPolicy] = None,
+        state_cache: Optional[StorageStateCache] = None,
+        resolution_cache: Optional[ResolutionCache] = None,
+        use_extractors: bool = True,
+        dedup_store: Optional[DedupStore] = None,
+        postprocess_jobs: int = DEFAULT_POSTPROCESS_JOBS,
+        postprocess_per_disk: Optional[int] = None,
+        ts_remux: bool = False,
+        download_limiter: Optional[AsyncHostLimiter] = None,
     ):
         """
         初始化 Playwright 浏览器下载器
@@ -143,13 +201,64 @@ class HeadlessBrowserDownloader:
             locale: 浏览器语言
             timezone_id: 浏览器时区
             user_data_dir: 复用已有浏览器用户数据目录（仅对 chromium 生效，确保 Widevine/登录状态）
+            download_connections: 单个文件的并发连接数（MP4 分段 / HLS、DASH 分片）
+            session_pool: HTTP 会话池（可选，未传入时每批下载单独创建）
+            quality: m3u8 主播放列表 / DASH 的画质选择策略（best / worst / <=1080p / max-bitrate=...）
+            codec_preference: DASH 视频编码偏好（如 "avc,hevc,av1"）
+            max_downloads: 同时下载的文件数上限
+            per_host: 同一 host 同时下载的文件数上限
+            settle_quiet: 发现可播放媒体后的静默窗口（秒），期间无新媒体响应即结束捕获
+            settle_timeout: 页面加载后等待媒体的最长时间（秒）
+            linger: 捕获结束后保留浏览器的秒数（调试用，默认 0 立即关闭）
+            browser_pool: 浏览器池（可选，传入时从池中借用上下文而不是启动新浏览器）
+            request_headers: 额外请求头（如 Cookie），同时用于页面请求与媒体下载
+            media_bodies: 浏览器内媒体正文的处理方式（allow 不拦截 / abort 记录后中止 / truncate 只取 1 字节），
+                拦截后由下载器单独下载，避免同一媒体传输两次；清单始终放行
+            block_policy: 资源屏蔽策略（可选，捕获期间不加载图片、字体、广告与统计脚本等）
+            state_cache: 按站点缓存的登录状态（可选，新页面加载缓存的 Cookie / localStorage，结束时保存）
+            resolution_cache: 页面 URL → 媒体 URL 解析缓存（可选，命中时不启动浏览器）
+            use_extractors: 是否先用站点提取器直接解析页面 HTML（成功时不启动浏览器，失败时回退浏览器）
+            dedup_store: 内容去重存储（可选，内容已下载过的文件按 link / skip 复用）
+            postprocess_jobs: 同时运行的后处理任务（音视频合并、.ts 合并）数上限
+            postprocess_per_disk: 同一磁盘上同时运行的后处理任务数上限（None 表示机械硬盘 1 个，其他不单独限制）
+            ts_remux: 是否把合并的 .ts 片段转封装为 MP4（默认直接拼接输出 .ts，不启动 ffmpeg）
+            download_limiter: 下载并发限制（可选，多个下载器共享时 max_downloads / per_host 对它们整体生效）
         """
+        if media_bodies not in MEDIA_BODY_POLICIES:
+            raise ValueError(f"不支持的媒体正文处理方式: {media_bodies}")
         self.headless = headless
         self.browser_type = browser_type
         self.browser_channel = browser_channel
         self.locale = locale
         self.timezone_id = timezone_id
         self.user_data_dir = Path(user_data_dir).expanduser() if user_data_dir else None
+        self.download_connections = download_connections
+        self.session_pool = session_pool
+        self.quality = quality
+        self.codec_preference = codec_preference
+        self.max_downloads = max_downloads
+        self.per_host = per_host
+        self.settle_quiet = settle_quiet
+        self.settle_timeout = settle_timeout
+        self.linger = linger
+        self._media_event: Optional[asyncio.Event] = None
+        self.browser_pool = browser_pool
+        self.request_headers: Dict[str, str] = dict(request_headers or {})
+        self.media_bodies = media_bodies
+        self.block_policy = block_policy
+        self.state_cache = state_cache
+        self.resolution_cache = resolution_cache
+        self.use_extractors = use_extractors
+        self.dedup_store = dedup_store
+        self.postprocess_jobs = postprocess_jobs
+        self.postprocess_per_disk = postprocess_per_disk
+        self.ts_remux = ts_remux
+        self.download_limiter = download_limiter
+        self._from_cache = False
+        self.playinfo: Optional[Dict[str, object]] = None
+        self.pipeline: Optional[DownloadPipeline] = None
+        self._pipeline_output_dir = "."
+        self._dash_submitted = False
         self.browser: Optional[Browser] = None
         self.context: Optional[BrowserContext] = None
         self.page: Optional[Page] = None
@@ -157,6 +266,7 @@ class HeadlessBrowserDownloader:
         self.video_request_meta: Dict[str, Dict[str, str]] = {}
         self.target_url: Optional[str] = None
         self.target_origin: Optional[str] = None
+        self.target_host: Optional[str] = None
         self.playwright_context_manager = None  # 用于保持 Playwright 上下文管理器打开
         self.playwright_instance = None  # 已进入的 Playwright 实例
         self.user_agent = user_agent
@@ -187,22 +297,97 @@ class HeadlessBrowserDownloader:
             
             # 检查 URL 是否包含视频扩展名
             content_type = headers.get('content-type', '').lower()
-            is_media_response = any(
-                keyword in content_type for keyword in ('video', 'audio')
-            )
+            is_media_response = is_media_content_type(content_type)
             
             if is_video_url(url) or is_media_response:
                 log_prefix = (
                     f"发现媒体响应 (Content-Type: {content_type})"
                     if content_type else "发现媒体URL"
                 )
-                logger.info(f"{log_prefix}: {url}")
-                self.video_urls.add(url)
-                await self._store_response_metadata(response)
+                raw_headers = await self._request_headers_of(response.request)
+                self._record_media(url, raw_headers, log_prefix)
                 
         except Exception as e:
             logger.debug(f"处理响应时出错: {e}")
     
+    async def _handle_route(self, route, request) -> None:
+        """
+        请求路由：屏蔽策略命中的请求直接中止；记录媒体请求后中止或截断浏览器自身的媒体正文下载；
+        其余请求（含清单）放行
+        
+        Args:
+            route: Playwright Route 对象
+            request: Playwright Request 对象
+        """
+        url = request.url
+        if self.block_policy is not None and self.block_policy.should_block(
+            url, request.resource_type, self.target_host
+        ):
+            try:
+                await route.abort("blockedbyclient")
+            except Exception as err:
+                logger.debug(f"屏蔽请求失败: {err}")
+            return
+        known_media = is_media_url(url)
+        if (
+            self.media_bodies == "allow"
+            or is_manifest_url(url)
+            or not (known_media or request.resource_type == "media")
+        ):
+            await self._continue_route(route)
+            return
+        try:
+            raw_headers = await self._request_headers_of(request)
+            if known_media and self.media_bodies == "abort":
+                self._record_media(url, raw_headers, "拦截媒体请求")
+                await route.abort()
+                return
+            # 扩展名无法判断的 <video>/<audio> 请求或 truncate 模式：只取 1 字节，按响应类型判断是否为媒体
+            fetch_headers = {
+                key: value for key, value in raw_headers.items() if not key.startswith(":")
+            }
+            fetch_headers["range"] = "bytes=0-0"
+            response = await route.fetch(headers=fetch_headers)
+            if known_media or is_media_content_type(response.headers.get("content-type", "")):
+                self._record_media(url, raw_headers, "截断媒体请求")
+            await route.fulfill(response=response)
+        except Exception as err:
+            logger.debug(f"拦截媒体请求失败，改为放行 {url}: {err}")
+            await self._continue_route(route)
+    
+    def _routing_enabled(self) -> bool:
+        """是否需要注册请求路由（拦截媒体正文或屏蔽资源）"""
+        return self.media_bodies != "allow" or (
+            self.block_policy is not None and self.block_policy.enabled
+        )
+    
+    async def _continue_route(self, route) -> None:
+        try:
+            await route.continue_()
+        except Exception as err:
+            # 页面关闭或请求已被处理
+            logger.debug(f"放行请求失败: {err}")
+    
+    def _record_media(self, url: str, raw_headers: Optional[Dict[str, str]], log_prefix: str) -> None:
+        """
+        登记捕获到的媒体：URL、下载请求头，并在边捕获边下载时提交给流水线
+        
+        Args:
+            url: 媒体 URL
+            raw_headers: 浏览器发出该请求时的完整请求头（None 表示读取失败）
+            log_prefix: 日志前缀
+        """
+        if url not in self.video_urls:
+            logger.info(f"{log_prefix}: {url}")
+        self.video_urls.add(url)
+        if raw_headers is not None:
+            self.video_request_meta[url] = self._prepare_download_headers(raw_headers)
+        if self._media_event is not None:
+            self._media_event.set()
+        if self.pipeline is not None:
+            # 边捕获边下载：立即交给下载流水线（去重与 m3u8/.ts 过滤由流水线增量完成）
+            self.pipeline.submit(url, self._download_headers_for(url))
+    
     async def collect_video_urls(self, url: str, timeout: int = 90000, keep_browser_open: bool = False) -> List[str]:
         """
         打开网页，监听网络，收集视频 URL 列表
@@ -217,118 +402,257 @@ class HeadlessBrowserDownloader:
         """
         self.video_urls.clear()
         self.video_request_meta.clear()
-        self.target_url = url
-        parsed = urlparse(url)
-        self.target_origin = f"{parsed.scheme}://{parsed.netloc}" if parsed.scheme and parsed.netloc else None
+        self.playinfo = None
+        self._dash_submitted = False
+        self._from_cache = False
+        self._media_event = asyncio.Event()
+        self._set_target(url)
+        
+        if self._restore_cached_resolution(url) or await self._run_extractor(url):
+            return list(self.video_urls)
         
         try:
-            if keep_browser_open and self.playwright_instance:
-                # 使用已存在的 Playwright 实例
-                p = self.playwright_instance
-            else:
-                # 创建新的 Playwright 上下文管理器
-                playwright_cm = async_playwright()
-                p = await playwright_cm.__aenter__()
-                if keep_browser_open:
-                    # 保存上下文管理器和实例以便后续清理
-                    self.playwright_context_manager = playwright_cm
-                    self.playwright_instance = p
-            
-            # 启动浏览器
-            launch_kwargs = {"headless": self.headless}
-            context_kwargs = self._build_context_kwargs()
-            
-            if self.browser_channel and self.browser_type != "chromium":
-                logger.warning(
-                    "browser_channel 仅对 chromium 生效，已忽略该参数"
-                )
-            
-            if self.browser_type == "chromium":
-                launch_args = self._build_launch_args()
-                if launch_args:
-                    existing_args = launch_kwargs.get("args", [])
-                    launch_kwargs["args"] = [*existing_args, *launch_args]
-                if self.browser_channel:
-                    launch_kwargs["channel"] = self.browser_channel
-                    logger.info(
-                        f"使用浏览器通道: {self.browser_channel}"
-                    )
-                if self.user_data_dir:
-                    logger.info(
-                        f"复用用户数据目录: {self.user_data_dir}"
-                    )
-                    self.context = await p.chromium.launch_persistent_context(
-                        str(self.user_data_dir),
-                        **launch_kwargs,
-                        **context_kwargs,
-                    )
-                    self.browser = self.context.browser
-                else:
-                    self.browser = await p.chromium.launch(**launch_kwargs)
-                    self.context = await self.browser.new_context(**context_kwargs)
-            elif self.browser_type == "firefox":
-                self.browser = await p.firefox.launch(**launch_kwargs)
-                self.context = await self.browser.new_context(**context_kwargs)
-            elif self.browser_type == "webkit":
-                self.browser = await p.webkit.launch(**launch_kwargs)
-                self.context = await self.browser.new_context(**context_kwargs)
+            if self.browser_pool is not None:
+                # 池化模式：从浏览器池借用已初始化的上下文，无需启动浏览器
+                self.context = await self.browser_pool.acquire()
             else:
-                raise ValueError(f"不支持的浏览器类型: {self.browser_type}")
-            
-            logger.info(f"启动浏览器: {self.browser_type} (headless={self.headless})")
-            
-            if self.enable_stealth:
-                await self._apply_stealth_polyfills()
+                await self._launch_browser()
+            state = self.state_cache.load(url) if self.state_cache is not None else None
+            if state and state.get('cookies'):
+                try:
+                    await self.context.add_cookies(state['cookies'])
+                except Exception as err:
+                    logger.debug(f"加载缓存的 Cookie 失败: {err}")
             self.page = await self.context.new_page()
+            if state:
+                script = local_storage_script(state)
+                if script:
+                    await self.page.add_init_script(script)
+            if self.request_headers:
+                await self.page.set_extra_http_headers(self.request_headers)
+            if self._routing_enabled():
+                # 路由注册在页面上，池化的上下文归还后不会残留
+                await self.page.route("**/*", self._handle_route)
             
             # 监听响应
             self.page.on("response", self._handle_response)
+            # DOM 就绪后尽早读取 __playinfo__，使 DASH 下载不必等到页面加载结束
+            self.page.on("domcontentloaded", self._handle_dom_ready)
             
             logger.info(f"正在访问: {url}")
             # 访问页面
             await self.page.goto(url, wait_until="networkidle", timeout=timeout)
             
-            # 等待一段时间以捕获延迟加载的视频
-            logger.info("等待页面加载完成...")
-            await asyncio.sleep(5)
-            
             # 尝试滚动页面以触发懒加载
             try:
-                await self.page.evaluate("""
-                    () => {
-                        window.scrollTo(0, document.body.scrollHeight);
-                        return new Promise(resolve => setTimeout(resolve, 2000));
-                    }
-                """)
+                await self.page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
                 await self.page.evaluate("window.scrollTo(0, 0)")
-                await asyncio.sleep(2)
             except Exception as e:
                 logger.debug(f"滚动页面时出错: {e}")
             
+            await self._capture_playinfo()
+            
+            # 等待延迟加载的媒体：发现可播放媒体且静默一段时间后结束，最长等待 settle_timeout
+            logger.info("等待媒体加载完成...")
+            await self._wait_for_media_settled()
+            
+            if self.resolution_cache is not None:
+                self.resolution_cache.put(url, self.video_urls, self.video_request_meta, self.playinfo)
+            
             if not keep_browser_open:
-                # 自动关闭浏览器和 Playwright
+                # 自动关闭浏览器和 Playwright（池化模式下归还上下文）
                 await self._cleanup_resources()
-                try:
-                    await playwright_cm.__aexit__(None, None, None)
-                except Exception:
-                    pass
                         
         except Exception as e:
             logger.error(f"收集视频URL时出错: {e}")
             if not keep_browser_open:
                 await self._cleanup_resources()
-                try:
-                    if 'playwright_cm' in locals():
-                        await playwright_cm.__aexit__(None, None, None)
-                except Exception:
-                    pass
         
         video_urls_list = list(self.video_urls)
         logger.info(f"共收集到 {len(video_urls_list)} 个视频URL")
         return video_urls_list
 
+    def _set_target(self, url: str) -> None:
+        """记录目标页面（下载请求头的 Referer / Origin 与站点规则使用）"""
+        self.target_url = url
+        parsed = urlparse(url)
+        self.target_origin = f"{parsed.scheme}://{parsed.netloc}" if parsed.scheme and parsed.netloc else None
+        self.target_host = parsed.hostname
+    
+    def _restore_cached_resolution(self, url: str) -> bool:
+        """
+        解析缓存命中时恢复捕获结果
+        
+        Returns:
+            bool: 是否命中
+        """
+        if self.resolution_cache is None:
+            return False
+        cached = self.resolution_cache.get(url)
+        if not cached:
+            return False
+        logger.info(f"命中页面解析缓存，跳过浏览器（{len(cached['media_urls'])} 个媒体 URL）")
+        self._from_cache = True
+        self._apply_resolution(cached)
+        return True
+    
+    async def _run_extractor(self, url: str) -> bool:
+        """
+        已知站点先直接请求页面 HTML 解析媒体信息，成功时跳过浏览器
+        
+        Returns:
+            bool: 是否提取成功
+        """
+        extractor = find_extractor(url) if self.use_extractors else None
+        if extractor is None:
+            return False
+        headers = {"User-Agent": self.user_agent or DEFAULT_CHROMIUM_USER_AGENT}
+        if self.state_cache is not None:
+            state = self.state_cache.load(url)
+            cookies = cookie_header(state, url) if state else None
+            if cookies:
+                headers["Cookie"] = cookies
+        headers.update(self.request_headers)
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(
+                None, functools.partial(extractor.extract, url, headers, self.session_pool)
+            )
+        except Exception as err:
+            logger.debug(f"提取器 {extractor.name} 出错: {err}")
+            result = None
+        if not result:
+            logger.info(f"提取器 {extractor.name} 未能解析页面，改用浏览器")
+            return False
+        logger.info(f"提取器 {extractor.name} 解析成功，跳过浏览器（{len(result['media_urls'])} 个媒体 URL）")
+        self._apply_resolution(result)
+        if self.resolution_cache is not None:
+            self.resolution_cache.put(url, self.video_urls, self.video_request_meta, self.playinfo)
+        return True
+    
+    def _apply_resolution(self, resolution: Dict[str, object]) -> None:
+        """恢复媒体 URL、下载请求头与 __playinfo__（边捕获边下载时直接提交给流水线）"""
+        self.playinfo = resolution.get('playinfo')
+        self.video_request_meta.update(resolution.get('headers') or {})
+        for media_url in resolution['media_urls']:
+            self.video_urls.add(media_url)
+            if self.pipeline is not None:
+                self.pipeline.submit(media_url, self._download_headers_for(media_url))
+    
+    async def _launch_browser(self) -> None:
+        """启动 Playwright 与浏览器，创建 BrowserContext（非池化模式）"""
+        if self.playwright_instance:
+            # 使用已存在的 Playwright 实例
+            p = self.playwright_instance
+        else:
+            # 创建新的 Playwright 上下文管理器，保存以便 _cleanup_resources 统一清理
+            playwright_cm = async_playwright()
+            p = await playwright_cm.__aenter__()
+            self.playwright_context_manager = playwright_cm
+            self.playwright_instance = p
+        
+        # 启动浏览器
+        launch_kwargs = self._build_launch_kwargs()
+        context_kwargs = self._build_context_kwargs()
+        
+        if self.browser_type == "chromium":
+            if self.user_data_dir:
+                logger.info(
+                    f"复用用户数据目录: {self.user_data_dir}"
+                )
+                self.context = await p.chromium.launch_persistent_context(
+                    str(self.user_data_dir),
+                    **launch_kwargs,
+                    **context_kwargs,
+                )
+                self.browser = self.context.browser
+            else:
+                self.browser = await p.chromium.launch(**launch_kwargs)
+                self.context = await self.browser.new_context(**context_kwargs)
+        elif self.browser_type == "firefox":
+            self.browser = await p.firefox.launch(**launch_kwargs)
+            self.context = await self.browser.new_context(**context_kwargs)
+        elif self.browser_type == "webkit":
+            self.browser = await p.webkit.launch(**launch_kwargs)
+            self.context = await self.browser.new_context(**context_kwargs)
+        else:
+            raise ValueError(f"不支持的浏览器类型: {self.browser_type}")
+        
+        logger.info(f"启动浏览器: {self.browser_type} (headless={self.headless})")
+        
+        if self.enable_stealth:
+            await self._apply_stealth_polyfills()
+
+    async def _wait_for_media_settled(self) -> None:
+        """
+        等待媒体捕获稳定：已发现清单或可播放流，且 settle_quiet 秒内没有新的媒体响应；
+        最长等待 settle_timeout 秒
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + self.settle_timeout
+        while True:
+            now = loop.time()
+            if now >= deadline:
+                logger.info(f"等待媒体已达上限 {self.settle_timeout:g} 秒，结束捕获")
+                return
+            if self._has_playable_media():
+                timeout = min(self.settle_quiet, deadline - now)
+            else:
+                timeout = deadline - now
+            self._media_event.clear()
+            try:
+                await asyncio.wait_for(self._media_event.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                if self._has_playable_media():
+                    logger.info(f"媒体已就绪（{loop.time() - started:.1f} 秒），结束捕获")
+                    return
+    
+    def _has_playable_media(self) -> bool:
+        """是否已捕获清单（m3u8/mpd/__playinfo__）或可直接播放的媒体（单独的 .ts 分片不算）"""
+        if self.playinfo is not None:
+            return True
+        return any(
+            not urlparse(url).path.lower().endswith('.ts') for url in self.video_urls
+        )
+    
+    async def _handle_dom_ready(self, page) -> None:
+        """DOMContentLoaded 回调：读取 __playinfo__ 并立即提交 DASH 下载"""
+        if self.pipeline is None or self.playinfo is not None:
+            return
+        await self._capture_playinfo()
+        self._submit_playinfo_dash(self.pipeline, self._pipeline_output_dir)
+    
+    async def _capture_playinfo(self) -> None:
+        """读取页面中的 `window.__playinfo__`（Bilibili DASH 信息），用于精确选择音视频流"""
+        if not self.page or self.playinfo is not None:
+            return
+        try:
+            playinfo = await self.page.evaluate("() => window.__playinfo__ || null")
+        except Exception as err:
+            logger.debug(f"读取 __playinfo__ 失败: {err}")
+            return
+        if isinstance(playinfo, dict):
+            self.playinfo = playinfo
+            logger.info("检测到页面 __playinfo__ DASH 信息")
+    
     async def _cleanup_resources(self) -> None:
-        """关闭浏览器/上下文，避免残留进程"""
+        """关闭浏览器/上下文，避免残留进程（池化模式下关闭页面并归还上下文）"""
+        await self._save_storage_state()
+        if self.browser_pool is not None:
+            page, context = self.page, self.context
+            self.page = None
+            self.context = None
+            discard = False
+            if page:
+                try:
+                    await page.close()
+                except Exception:
+                    # 页面无法正常关闭时上下文可能已损坏，不再复用
+                    discard = True
+            if context:
+                await self.browser_pool.release(context, discard=discard)
+            return
         if self.context:
             try:
                 await self.context.close()
@@ -353,6 +677,36 @@ class HeadlessBrowserDownloader:
                 self.playwright_context_manager = None
                 self.playwright_instance = None
     
+    async def _save_storage_state(self) -> None:
+        """关闭前把当前站点的 Cookie / localStorage 写入缓存"""
+        if self.state_cache is None or self.context is None or not self.target_url:
+            return
+        try:
+            state = await self.context.storage_state()
+        except Exception as err:
+            logger.debug(f"读取登录状态失败: {err}")
+            return
+        self.state_cache.save(self.target_url, state)
+    
+    def _build_launch_kwargs(self) -> Dict[str, object]:
+        """构建 `browser_type.launch` 参数（无头模式、Chromium 启动参数与通道）"""
+        launch_kwargs: Dict[str, object] = {"headless": self.headless}
+        if self.browser_channel and self.browser_type != "chromium":
+            logger.warning(
+                "browser_channel 仅对 chromium 生效，已忽略该参数"
+            )
+        if self.browser_type == "chromium":
+            launch_args = self._build_launch_args()
+            if launch_args:
+                existing_args = launch_kwargs.get("args", [])
+                launch_kwargs["args"] = [*existing_args, *launch_args]
+            if self.browser_channel:
+                launch_kwargs["channel"] = self.browser_channel
+                logger.info(
+                    f"使用浏览器通道: {self.browser_channel}"
+                )
+        return launch_kwargs
+    
     def _build_launch_args(self) -> List[str]:
         """构建 Chromium 启动参数，移除 --enable-automation 等标记"""
         if not self.enable_stealth:
@@ -381,6 +735,9 @@ class HeadlessBrowserDownloader:
             context_kwargs["user_agent"] = self.user_agent
         if self.extra_http_headers:
             context_kwargs["extra_http_headers"] = self.extra_http_headers
+        if self._routing_enabled():
+            # Service Worker 发出的请求不经过 page.route
+            context_kwargs["service_workers"] = "block"
         return context_kwargs
     
     async def _apply_stealth_polyfills(self) -> None:
@@ -393,16 +750,13 @@ class HeadlessBrowserDownloader:
         except Exception as err:
             logger.debug(f"注入 stealth 脚本失败: {err}")
     
-    async def _store_response_metadata(self, response) -> None:
-        """记录媒体请求所需的下载头部，确保后续直连不被 403 拒绝"""
+    async def _request_headers_of(self, request) -> Optional[Dict[str, str]]:
+        """读取请求的完整请求头（含 Cookie），用于后续直连下载，避免被 403 拒绝"""
         try:
-            url = response.url
-            request = response.request
-            raw_headers = await request.all_headers()
-            prepared = self._prepare_download_headers(raw_headers)
-            self.video_request_meta[url] = prepared
+            return await request.all_headers()
         except Exception as err:
-            logger.debug(f"记录请求头失败: {err}")
+            logger.debug(f"读取请求头失败: {err}")
+            return None
     
     def _prepare_download_headers(self, raw_headers: Dict[str, str]) -> Dict[str, str]:
         """清理 Playwright 请求头，仅保留下载所需字段"""
@@ -437,135 +791,184 @@ class HeadlessBrowserDownloader:
         else:
             headers["User-Agent"] = headers["User-Agent"] or (self.user_agent or DEFAULT_CHROMIUM_USER_AGENT)
         
+        # 显式指定的请求头优先
+        for key, value in self.request_headers.items():
+            normalized_key = "-".join(part.capitalize() for part in key.lower().split("-"))
+            headers[normalized_key] = value
+        
         # 避免只下载首个 range 块
         headers["Range"] = "bytes=0-"
         headers.setdefault("Accept", "*/*")
         headers.setdefault("Accept-Encoding", "identity")
         return headers
     
-    async def download_videos(self, video_urls: List[str], output_dir: str) -> None:
+    async def download_videos(
+        self,
+        video_urls: List[str],
+        output_dir: str,
+        page_url: Optional[str] = None,
+    ) -> List[str]:
         """
         根据 URL 列表下载视频
         
         Args:
             video_urls: 视频URL列表
             output_dir: 输出目录
+            page_url: 媒体所在页面（可选，未经浏览器捕获时用作 Referer / Origin）
+            
+        Returns:
+            List[str]: 最终得到的文件路径列表（含合并后的文件）
         """
+        if page_url:
+            self._set_target(page_url)
         if not video_urls:
             logger.warning("没有视频URL可下载")
-            return
+            return []
         
         logger.info(f"开始下载 {len(video_urls)} 个视频到: {output_dir}")
-        
-        # 识别 m3u8 URL 及其基础路径，用于过滤掉属于同一流的 .ts 文件
-        m3u8_base_paths = set()
-        m3u8_urls = []
-        for url in video_urls:
-            if '.m3u8' in url.lower():
-                m3u8_urls.append(url)
-                # 提取 m3u8 的基础路径（例如: /hls/1011435/index.m3u8 -> /hls/1011435/）
-                parsed = urlparse(url)
-                path = parsed.path
-                # 移除文件名，获取目录路径
-                if '/' in path:
-                    base_path = path[:path.rfind('/') + 1]
-                    m3u8_base_paths.add(base_path)
-                    logger.debug(f"检测到 m3u8 基础路径: {base_path} (来自: {url})")
-        
-        if m3u8_urls:
-            logger.info(f"检测到 {len(m3u8_urls)} 个 m3u8 流，将优先使用 m3u8 下载完整视频")
-        
-        # 过滤掉属于 m3u8 流的 .ts 文件（避免重复下载）
-        filtered_urls = []
-        skipped_ts_count = 0
-        for url in video_urls:
-            if url.lower().endswith('.ts'):
-                # 检查这个 .ts 文件是否属于某个已检测到的 m3u8 流
-                parsed = urlparse(url)
-                path = parsed.path
-                is_part_of_m3u8 = False
-                for base_path in m3u8_base_paths:
-                    if path.startswith(base_path):
-                        is_part_of_m3u8 = True
-                        skipped_ts_count += 1
-                        logger.debug(f"跳过 .ts 文件（属于 m3u8 流）: {url}")
-                        break
-                if not is_part_of_m3u8:
-                    filtered_urls.append(url)
-            else:
-                filtered_urls.append(url)
-        
-        if skipped_ts_count > 0:
-            logger.info(f"检测到 m3u8 流，已跳过 {skipped_ts_count} 个 .ts 文件（将使用 m3u8 下载完整视频）")
-        
-        headers_map = {}
-        for url in filtered_urls:
-            headers_map[url] = self.video_request_meta.get(url) or self._prepare_download_headers({})
-        
-        downloaded_files: List[str] = []
-        total = len(filtered_urls)
-        
-        # 显示总体下载进度
+        pipeline = self._create_pipeline(output_dir)
+        await pipeline.start()
         try:
-            from tqdm import tqdm
-            TQDM_AVAILABLE = True
-        except ImportError:
-            TQDM_AVAILABLE = False
-            tqdm = lambda x, **kwargs: x
-        
-        if TQDM_AVAILABLE and total > 1:
-            pbar = tqdm(
-                total=total,
-                desc="总体下载进度",
-                unit="文件",
-                ncols=100,
-                position=0,
-                leave=True
+            # 一次性提交时先按主播放列表统一过滤码流 m3u8（与捕获顺序无关）
+            loop = asyncio.get_running_loop()
+            headers_map = {url: self._download_headers_for(url) for url in video_urls}
+            video_urls = await loop.run_in_executor(
+                None,
+                functools.partial(
+                    drop_sibling_variants, video_urls, headers_map, pipeline.session_pool, pipeline.playlists
+                ),
             )
-        else:
-            pbar = None
-        
-        try:
-            for i, url in enumerate(filtered_urls):
-                headers = headers_map.get(url)
-                try:
-                    file_path = download_video(
-                        url,
-                        output_dir,
-                        index=i if total > 1 else None,
-                        headers=headers,
-                    )
-                except Exception as err:
-                    logger.error(f"直接下载失败 {url}: {err}")
-                    file_path = None
-                if file_path:
-                    downloaded_files.append(file_path)
-                
-                if pbar:
-                    pbar.update(1)
-                    pbar.set_postfix({"已完成": f"{len(downloaded_files)}/{total}"})
+            self._submit_playinfo_dash(pipeline, output_dir)
+            for url in video_urls:
+                pipeline.submit(url, headers_map[url])
+            return await self._finish_pipeline(pipeline, output_dir)
         finally:
-            if pbar:
-                pbar.close()
-        
+            await pipeline.close()
+    
+    def _create_pipeline(self, output_dir: str) -> DownloadPipeline:
+        """创建下载流水线（下载参数与当前下载器一致）"""
+        return DownloadPipeline(
+            output_dir,
+            connections=self.download_connections,
+            session_pool=self.session_pool,
+            quality=self.quality,
+            codec_preference=self.codec_preference,
+            max_downloads=self.max_downloads,
+            per_host=self.per_host,
+            dedup_store=self.dedup_store,
+            limiter=self.download_limiter,
+        )
+    
+    async def _finish_pipeline(self, pipeline: DownloadPipeline, output_dir: str) -> List[str]:
+        """等待流水线中的下载全部完成，并执行合并等后处理，返回最终文件列表"""
+        downloaded_files = await pipeline.finish()
         if not downloaded_files:
             logger.error("所有下载尝试均失败")
-            return
+            if self._from_cache and self.target_url:
+                # 缓存的签名 URL 可能已失效，下次运行重新捕获
+                self.resolution_cache.invalidate(self.target_url)
+                logger.info("已清除该页面的解析缓存，重新运行将重新打开页面捕获")
+            return []
         
         logger.info(f"成功下载 {len(downloaded_files)} 个视频")
         
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None,
+            functools.partial(self._post_process, downloaded_files, output_dir),
+        )
+    
+    def _download_headers_for(self, url: str) -> Dict[str, str]:
+        """下载某个媒体 URL 使用的请求头（优先使用浏览器实际发出的请求头）"""
+        return self.video_request_meta.get(url) or self._prepare_download_headers({})
+    
+    def _submit_playinfo_dash(self, pipeline: DownloadPipeline, output_dir: str) -> None:
+        """
+        页面提供了 DASH 清单（__playinfo__）时，只下载选中的一路视频 + 一路音频，
+        播放器捕获到的其他码率 .m4s 不再逐个下载（每个流水线只提交一次）
+        """
+        if self._dash_submitted:
+            return
+        dash_manifest = self._parse_playinfo()
+        if not dash_manifest:
+            return
+        self._dash_submitted = True
+        pipeline.add_skip_keys(manifest_media_keys(dash_manifest))
+        logger.info("使用 __playinfo__ 选择音视频流，跳过已捕获的 DASH 分轨")
+        loop = asyncio.get_running_loop()
+        job = functools.partial(
+            self._download_playinfo_dash, dash_manifest, output_dir, pipeline.session_pool
+        )
+        pipeline.submit_job(lambda: loop.run_in_executor(None, job))
+    
+    def _post_process(self, downloaded_files: List[str], output_dir: str) -> List[str]:
+        """合并 .ts 片段与分离的音视频流（在工作线程中运行），返回仍存在的最终文件"""
+        original_files = list(downloaded_files)
         # 检测并合并 .ts 文件（HLS 视频片段）
         # 注意：如果已有 m3u8 下载，通常不会有 .ts 文件需要合并
-        merged_ts_files = detect_and_merge_ts_files(downloaded_files, output_dir)
+        merged_ts_files = detect_and_merge_ts_files(
+            downloaded_files,
+            output_dir,
+            self.postprocess_jobs,
+            ts_remux=self.ts_remux,
+            postprocess_per_disk=self.postprocess_per_disk,
+        )
         if merged_ts_files:
             logger.info(f"已合并 .ts 文件: {merged_ts_files}")
             # 从 downloaded_files 中移除已合并的 .ts 文件
             downloaded_files = [f for f in downloaded_files if not f.endswith('.ts')]
         
         # 自动合并分离的音视频流（例如 Bilibili DASH 的 .m4s）
-        muxed_files = auto_mux_downloads(downloaded_files, output_dir)
+        muxed_files = auto_mux_downloads(
+            downloaded_files, output_dir, self.postprocess_jobs, self.postprocess_per_disk
+        )
         if muxed_files:
             logger.info(f"生成合并文件: {muxed_files}")
+        
+        final_files: List[str] = []
+        for path in [*original_files, *merged_ts_files, *muxed_files]:
+            if path not in final_files and os.path.exists(path):
+                final_files.append(path)
+        return final_files
+    
+    def _download_playinfo_dash(
+        self,
+        dash_manifest: Dict[str, object],
+        output_dir: str,
+        session_pool: SessionPool,
+    ) -> Optional[str]:
+        """下载 __playinfo__ 中选中的音视频流并合并（在工作线程中运行）"""
+        dash_output = os.path.join(output_dir, self._dash_output_name())
+        try:
+            if download_dash(
+                dash_manifest,
+                dash_output,
+                headers=self._prepare_download_headers({}),
+                session_pool=session_pool,
+                connections=self.download_connections,
+                quality=self.quality,
+                codec_preference=self.codec_preference,
+            ):
+                return dash_output
+        except Exception as err:
+            logger.error(f"DASH 下载失败: {err}")
+        return None
+    
+    def _parse_playinfo(self) -> Optional[Dict[str, object]]:
+        """解析已捕获的 __playinfo__，无 DASH 信息时返回 None"""
+        if not self.playinfo:
+            return None
+        try:
+            manifest = parse_playinfo(self.playinfo)
+        except (ValueError, AttributeError) as err:
+            logger.debug(f"__playinfo__ 不含可用的 DASH 信息: {err}")
+            return None
+        return manifest if manifest['representations'] else None
+    
+    def _dash_output_name(self) -> str:
+        """根据目标页面 URL 生成 DASH 合并输出文件名（例如 BV 号）"""
+        name = Path(urlparse(self.target_url or '').path.rstrip('/')).name
+        return f"{name or 'video'}.mp4"
     
     async def run_async(self, url: str, output_dir: str, timeout: int = 90000) -> None:
         """
@@ -582,8 +985,14 @@ class HeadlessBrowserDownloader:
         logger.info(f"输出目录: {output_dir}")
         logger.info("=" * 60)
         
+        # 先启动下载流水线：捕获到的媒体立即开始下载，不必等页面加载结束
+        pipeline = self._create_pipeline(output_dir)
+        await pipeline.start()
+        self.pipeline = pipeline
+        self._pipeline_output_dir = output_dir
+        finish_task: Optional[asyncio.Task] = None
         try:
-            # 1. 收集视频URL（保持浏览器打开）
+            # 1. 收集视频URL（保持浏览器打开），期间边捕获边下载
             video_urls = await self.collect_video_urls(url, timeout=timeout, keep_browser_open=True)
             
             if not video_urls:
@@ -594,22 +1003,168 @@ class HeadlessBrowserDownloader:
                 await self._cleanup_resources()
                 return
             
-            # 2. 下载视频（浏览器保持打开）
-            await self.download_videos(video_urls, output_dir)
+            # 2. 捕获结束：__playinfo__ 可能在页面加载末尾才出现，补充提交后等待剩余下载
+            self._submit_playinfo_dash(pipeline, output_dir)
+            finish_task = asyncio.create_task(self._finish_pipeline(pipeline, output_dir))
             
-            # 3. 等待 30 秒后关闭浏览器（给用户时间查看页面或调试）
-            if not self.headless:
-                logger.info("下载已开始，浏览器将在 30 秒后自动关闭...")
-            else:
-                logger.info("下载已开始，将在 30 秒后关闭浏览器...")
-            await asyncio.sleep(30)
+            # 3. 仅在显式要求时保留浏览器（调试用），下载同时进行
+            if self.linger > 0:
+                logger.info(f"下载已开始，浏览器将在 {self.linger:g} 秒后关闭...")
+                await asyncio.sleep(self.linger)
+            await self._cleanup_resources()
+            
+            # 4. 直链下载不依赖浏览器，关闭浏览器后继续等待下载完成
+            await finish_task
             
         except Exception as e:
             logger.error(f"执行过程中出错: {e}", exc_info=True)
         finally:
+            if finish_task is not None and not finish_task.done():
+                finish_task.cancel()
+            self.pipeline = None
+            await pipeline.close()
             # 关闭浏览器和 Playwright
             await self._cleanup_resources()
     
+    async def run_many_async(
+        self,
+        urls: List[str],
+        output_dir: str,
+        timeout: int = 90000,
+        pool_size: int = DEFAULT_BROWSER_POOL_SIZE,
+        context_recycle: int = DEFAULT_CONTEXT_RECYCLE,
+        browser_recycle: int = DEFAULT_BROWSER_RECYCLE,
+    ) -> None:
+        """
+        异步执行多个 URL：共享一个浏览器，pool_size 个页面并行处理 URL 队列
+        
+        Args:
+            urls: 目标网页URL列表
+            output_dir: 输出目录
+            timeout: 单个页面的超时时间（毫秒）
+            pool_size: 并行页面数（浏览器池上下文数）
+            context_recycle: 每个上下文服务的页面数上限
+            browser_recycle: 浏览器服务的页面数上限（0 表示不重启）
+        """
+        if self.user_data_dir:
+            # 持久化上下文只能有一个，无法池化
+            logger.warning("--user-data-dir 不支持浏览器池，将逐个处理 URL")
+            for url in urls:
+                await self.run_async(url, output_dir, timeout=timeout)
+            return
+        
+        pool = self.create_browser_pool(pool_size, context_recycle, browser_recycle)
+        queue: asyncio.Queue = asyncio.Queue()
+        for url in urls:
+            queue.put_nowait(url)
+        
+        async def worker() -> None:
+            while True:
+                try:
+                    url = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                # 每个 URL 使用独立的下载器实例（捕获状态互不干扰），共享浏览器池与会话池
+                downloader = self.with_browser_pool(pool)
+                await downloader.run_async(url, output_dir, timeout=timeout)
+        
+        await pool.start()
+        try:
+            await asyncio.gather(*(worker() for _ in range(pool.size)))
+        finally:
+            await pool.close()
+    
+    def create_browser_pool(
+        self,
+        pool_size: int = DEFAULT_BROWSER_POOL_SIZE,
+        context_recycle: int = DEFAULT_CONTEXT_RECYCLE,
+        browser_recycle: int = DEFAULT_BROWSER_RECYCLE,
+    ) -> BrowserPool:
+        """
+        按当前浏览器配置创建浏览器池（调用方负责 start / close）
+        
+        Args:
+            pool_size: 并行页面数（浏览器池上下文数）
+            context_recycle: 每个上下文服务的页面数上限
+            browser_recycle: 浏览器服务的页面数上限（0 表示不重启）
+            
+        Returns:
+            BrowserPool: 未启动的浏览器池
+        """
+        return BrowserPool(
+            browser_type=self.browser_type,
+            size=pool_size,
+            context_recycle=context_recycle,
+            browser_recycle=browser_recycle,
+            launch_kwargs=self._build_launch_kwargs(),
+            context_kwargs=self._build_context_kwargs(),
+            init_script=STEALTH_INIT_SCRIPT if self.enable_stealth else None,
+        )
+    
+    def with_browser_pool(self, pool: BrowserPool, **overrides) -> 'HeadlessBrowserDownloader':
+        """
+        创建与当前配置相同、使用指定浏览器池的下载器
+        
+        Args:
+            pool: 浏览器池
+            **overrides: 覆盖的构造参数（例如单个任务的 quality、request_headers）
+            
+        Returns:
+            HeadlessBrowserDownloader: 新的下载器实例
+        """
+        options = dict(
+            headless=self.headless,
+            browser_type=self.browser_type,
+            browser_channel=self.browser_channel,
+            user_agent=self.user_agent,
+            enable_stealth=self.enable_stealth,
+            locale=self.locale,
+            timezone_id=self.timezone_id,
+            download_connections=self.download_connections,
+            session_pool=self.session_pool,
+            quality=self.quality,
+            codec_preference=self.codec_preference,
+            max_downloads=self.max_downloads,
+            per_host=self.per_host,
+            settle_quiet=self.settle_quiet,
+            settle_timeout=self.settle_timeout,
+            linger=self.linger,
+            request_headers=self.request_headers,
+            media_bodies=self.media_bodies,
+            block_policy=self.block_policy,
+            state_cache=self.state_cache,
+            resolution_cache=self.resolution_cache,
+            use_extractors=self.use_extractors,
+            dedup_store=self.dedup_store,
+            postprocess_jobs=self.postprocess_jobs,
+            postprocess_per_disk=self.postprocess_per_disk,
+            ts_remux=self.ts_remux,
+            download_limiter=self.download_limiter,
+        )
+        options.update(overrides)
+        return HeadlessBrowserDownloader(browser_pool=pool, **options)
+    
+    def run_many(
+        self,
+        urls: List[str],
+        output_dir: str,
+        timeout: int = 90000,
+        pool_size: int = DEFAULT_BROWSER_POOL_SIZE,
+        context_recycle: int = DEFAULT_CONTEXT_RECYCLE,
+        browser_recycle: int = DEFAULT_BROWSER_RECYCLE,
+    ) -> None:
+        """
+        同步执行多个 URL（见 run_many_async）
+        """
+        asyncio.run(self.run_many_async(
+            urls,
+            output_dir,
+            timeout=timeout,
+            pool_size=pool_size,
+            context_recycle=context_recycle,
+            browser_recycle=browser_recycle,
+        ))
+    
     def run(self, url: str, output_dir: str, timeout: int = 90000) -> None:
         """
         同步执行：一键完成启动浏览器 + 收集 URL + 下载视频
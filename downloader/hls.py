@@ -0,0 +1,627 @@
+"""
+HLS 原生下载：解析 m3u8 → 使用捕获的请求头并发拉取分片 → 按顺序写入单个文件
+
+只有最终的封装转换（remux）交给 ffmpeg，分片下载完全在进程内完成。
+`#EXT-X-KEY:METHOD=AES-128` 的分片在工作线程中边下载边解密（需要安装 cryptography）。
+"""
+import logging
+import os
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from urllib.parse import urljoin, urlparse
+import requests
+from .http_session import SessionPool, get_session
+try:
+    from tqdm import tqdm
+    TQDM_AVAILABLE = True
+except ImportError:
+    TQDM_AVAILABLE = False
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    CRYPTO_AVAILABLE = True
+except ImportError:
+    CRYPTO_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 默认并发拉取分片的线程数
+DEFAULT_HLS_WORKERS = 8
+# 单个分片失败后的重试次数
+SEGMENT_RETRIES = 3
+# 分片流式读取/解密的块大小
+STREAM_READ_SIZE = 64 * 1024
+# 默认码流选择策略
+DEFAULT_QUALITY = 'best'
+# 过滤码流时并行下载播放列表的线程数
+PLAYLIST_FETCH_WORKERS = 8
+
+_ATTRIBUTE_RE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+_MAX_HEIGHT_RE = re.compile(r'^<=\s*(\d+)p?$', re.IGNORECASE)
+_MAX_BITRATE_RE = re.compile(r'^max-bitrate\s*=\s*(\d+(?:\.\d+)?)\s*([kKmM]?)$')
+
+
+class UnsupportedPlaylistError(ValueError):
+    """原生引擎无法处理的播放列表（直播、加密方式未知等），调用方应回退到 ffmpeg"""
+
+
+def parse_attributes(text: str) -> Dict[str, str]:
+    """
+    解析 `KEY=VALUE,KEY="VALUE"` 形式的标签属性
+
+    Args:
+        text: 标签冒号后的属性文本
+
+    Returns:
+        Dict[str, str]: 属性字典（已去除引号）
+    """
+    return {key: value.strip('"') for key, value in _ATTRIBUTE_RE.findall(text)}
+
+
+def parse_m3u8(text: str, base_url: str) -> Dict[str, object]:
+    """
+    解析 m3u8 播放列表
+
+    Args:
+        text: 播放列表内容
+        base_url: 播放列表 URL（用于解析相对路径）
+
+    Returns:
+        Dict[str, object]: {
+            "is_master": bool,
+            "variants": [{"uri", "bandwidth", "resolution", "codecs", ...}],
+            "media": [EXT-X-MEDIA 属性字典],
+            "segments": [{"uri", "duration", "sequence", "byterange", "key", "map"}],
+            "media_sequence": int,
+            "endlist": bool,
+        }
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines or not lines[0].startswith('#EXTM3U'):
+        raise ValueError("不是有效的 m3u8 播放列表")
+
+    variants: List[Dict[str, object]] = []
+    media: List[Dict[str, str]] = []
+    segments: List[Dict[str, object]] = []
+    media_sequence = 0
+    endlist = False
+    pending_variant: Optional[Dict[str, object]] = None
+    duration: Optional[float] = None
+    byterange: Optional[str] = None
+    current_key: Optional[Dict[str, str]] = None
+    current_map: Optional[Dict[str, object]] = None
+    last_range_end: Dict[str, int] = {}
+
+    for line in lines[1:]:
+        if line.startswith('#EXT-X-STREAM-INF:'):
+            attrs = parse_attributes(line.split(':', 1)[1])
+            pending_variant = {
+                'bandwidth': int(attrs.get('BANDWIDTH', 0) or 0),
+                'average_bandwidth': int(attrs.get('AVERAGE-BANDWIDTH', 0) or 0),
+                'resolution': attrs.get('RESOLUTION'),
+                'codecs': attrs.get('CODECS'),
+                'frame_rate': attrs.get('FRAME-RATE'),
+                'audio': attrs.get('AUDIO'),
+            }
+        elif line.startswith('#EXT-X-MEDIA:'):
+            attrs = parse_attributes(line.split(':', 1)[1])
+            if 'URI' in attrs:
+                attrs['URI'] = urljoin(base_url, attrs['URI'])
+            media.append(attrs)
+        elif line.startswith('#EXT-X-MEDIA-SEQUENCE:'):
+            media_sequence = int(line.split(':', 1)[1])
+        elif line.startswith('#EXTINF:'):
+            duration = float(line.split(':', 1)[1].split(',', 1)[0] or 0)
+        elif line.startswith('#EXT-X-BYTERANGE:'):
+            byterange = line.split(':', 1)[1]
+        elif line.startswith('#EXT-X-KEY:'):
+            attrs = parse_attributes(line.split(':', 1)[1])
+            if attrs.get('METHOD', 'NONE') == 'NONE':
+                current_key = None
+            else:
+                current_key = dict(attrs)
+                if 'URI' in current_key:
+                    current_key['URI'] = urljoin(base_url, current_key['URI'])
+        elif line.startswith('#EXT-X-MAP:'):
+            attrs = parse_attributes(line.split(':', 1)[1])
+            current_map = {'uri': urljoin(base_url, attrs.get('URI', ''))}
+            if 'BYTERANGE' in attrs:
+                current_map['range'] = _parse_byterange(attrs['BYTERANGE'], 0)
+        elif line.startswith('#EXT-X-ENDLIST'):
+            endlist = True
+        elif line.startswith('#'):
+            continue
+        elif pending_variant is not None:
+            pending_variant['uri'] = urljoin(base_url, line)
+            variants.append(pending_variant)
+            pending_variant = None
+        else:
+            uri = urljoin(base_url, line)
+            segment: Dict[str, object] = {
+                'uri': uri,
+                'duration': duration or 0.0,
+                'sequence': media_sequence + len(segments),
+                'byterange': None,
+                'key': current_key,
+                'map': current_map,
+            }
+            if byterange:
+                start, end = _parse_byterange(byterange, last_range_end.get(uri, 0))
+                segment['byterange'] = (start, end)
+                last_range_end[uri] = end + 1
+            segments.append(segment)
+            duration = None
+            byterange = None
+
+    return {
+        'is_master': bool(variants),
+        'variants': variants,
+        'media': media,
+        'segments': segments,
+        'media_sequence': media_sequence,
+        'endlist': endlist,
+    }
+
+
+def fetch_playlist(
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    session_pool: Optional[SessionPool] = None,
+) -> Dict[str, object]:
+    """
+    下载并解析播放列表
+
+    Args:
+        url: m3u8 URL
+        headers: HTTP 请求头
+        session_pool: HTTP 会话池（可选）
+
+    Returns:
+        Dict[str, object]: parse_m3u8 的解析结果
+    """
+    response = get_session(url, session_pool).get(url, headers=_strip_range(headers), timeout=30)
+    response.raise_for_status()
+    # 以重定向后的最终地址作为相对路径基准
+    return parse_m3u8(response.text, response.url or url)
+
+
+def parse_quality(value: str) -> Dict[str, object]:
+    """
+    解析码流选择策略
+
+    支持 `best`、`worst`、`<=1080p`（最高分辨率高度）、`max-bitrate=2.5M`（最高码率，bps，可带 k/M 后缀）
+
+    Args:
+        value: 策略字符串
+
+    Returns:
+        Dict[str, object]: {"mode": "best"|"worst"|"max_height"|"max_bitrate", "limit": int|None}
+
+    Raises:
+        ValueError: 无法识别的策略
+    """
+    text = (value or DEFAULT_QUALITY).strip()
+    if text.lower() in ('best', 'worst'):
+        return {'mode': text.lower(), 'limit': None}
+    match = _MAX_HEIGHT_RE.match(text)
+    if match:
+        return {'mode': 'max_height', 'limit': int(match.group(1))}
+    match = _MAX_BITRATE_RE.match(text)
+    if match:
+        multiplier = {'': 1, 'k': 1000, 'm': 1000 * 1000}[match.group(2).lower()]
+        return {'mode': 'max_bitrate', 'limit': int(float(match.group(1)) * multiplier)}
+    raise ValueError(f"无法识别的码流选择策略: {value}")
+
+
+def select_variant(variants: List[Dict[str, object]], quality: str = DEFAULT_QUALITY) -> Dict[str, object]:
+    """
+    按策略从主播放列表中选择一个码流
+
+    满足上限的码流中取最高画质；没有码流满足上限时取最低画质。
+
+    Args:
+        variants: parse_m3u8 解析出的码流列表
+        quality: 码流选择策略（见 parse_quality）
+
+    Returns:
+        Dict[str, object]: 选中的码流
+    """
+    policy = parse_quality(quality)
+    ranked = sorted(variants, key=_variant_rank)
+    if policy['mode'] == 'worst':
+        return ranked[0]
+    if policy['mode'] == 'max_height':
+        eligible = [v for v in ranked if _variant_height(v) <= policy['limit']]
+    elif policy['mode'] == 'max_bitrate':
+        eligible = [v for v in ranked if (v.get('bandwidth') or 0) <= policy['limit']]
+    else:
+        eligible = ranked
+    return eligible[-1] if eligible else ranked[0]
+
+
+def fetch_playlists(
+    urls: List[str],
+    headers_map: Optional[Dict[str, Dict[str, str]]] = None,
+    session_pool: Optional[SessionPool] = None,
+) -> Dict[str, Dict[str, object]]:
+    """
+    并行下载并解析多个播放列表
+
+    Args:
+        urls: m3u8 URL 列表
+        headers_map: URL → HTTP 请求头
+        session_pool: HTTP 会话池（可选）
+
+    Returns:
+        Dict[str, Dict[str, object]]: URL → parse_m3u8 的解析结果（下载或解析失败的 URL 不在其中）
+    """
+    def fetch(url: str) -> Optional[Dict[str, object]]:
+        try:
+            return fetch_playlist(url, headers_map.get(url) if headers_map else None, session_pool)
+        except Exception as err:
+            logger.debug(f"读取播放列表失败 {url}: {err}")
+            return None
+
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(PLAYLIST_FETCH_WORKERS, len(urls))) as executor:
+        results = dict(zip(urls, executor.map(fetch, urls)))
+    return {url: playlist for url, playlist in results.items() if playlist is not None}
+
+
+def drop_sibling_variants(
+    video_urls: List[str],
+    headers_map: Optional[Dict[str, Dict[str, str]]] = None,
+    session_pool: Optional[SessionPool] = None,
+    playlists: Optional[Dict[str, Dict[str, object]]] = None,
+) -> List[str]:
+    """
+    从下载列表中移除已被主播放列表覆盖的码流播放列表
+
+    播放器切换清晰度时会请求多个码流的 m3u8，如果同时捕获到了主播放列表，
+    只需下载主播放列表（由 select_variant 选出一个码流），其余码流 URL 都是重复下载。
+    各播放列表并行下载；传入 playlists 时解析结果存入其中，download_hls 直接使用，不再重复请求。
+
+    Args:
+        video_urls: 待下载的 URL 列表
+        headers_map: URL → HTTP 请求头
+        session_pool: HTTP 会话池（可选）
+        playlists: 播放列表缓存 URL → 解析结果（可选）
+
+    Returns:
+        List[str]: 过滤后的 URL 列表（保持原顺序）
+    """
+    m3u8_urls = [url for url in video_urls if '.m3u8' in url.lower()]
+    if len(m3u8_urls) < 2:
+        return video_urls
+
+    if playlists is None:
+        playlists = {}
+    playlists.update(fetch_playlists(
+        [url for url in m3u8_urls if url not in playlists], headers_map, session_pool
+    ))
+    variant_keys = set()
+    for url in m3u8_urls:
+        playlist = playlists.get(url)
+        if playlist and playlist['is_master']:
+            variant_keys.update(url_key(v['uri']) for v in playlist['variants'])
+
+    if not variant_keys:
+        return video_urls
+    filtered = [url for url in video_urls if url_key(url) not in variant_keys]
+    dropped = len(video_urls) - len(filtered)
+    if dropped:
+        logger.info(f"已跳过 {dropped} 个属于主播放列表的码流 m3u8（仅下载按策略选中的码流）")
+    return filtered
+
+
+def download_hls(
+    url: str,
+    output_path: str,
+    headers: Optional[Dict[str, str]] = None,
+    session_pool: Optional[SessionPool] = None,
+    workers: int = DEFAULT_HLS_WORKERS,
+    quality: str = DEFAULT_QUALITY,
+    playlists: Optional[Dict[str, Dict[str, object]]] = None,
+) -> str:
+    """
+    原生下载 HLS 流：并发拉取分片，按顺序写入 output_path
+
+    Args:
+        url: m3u8 URL（主播放列表或媒体播放列表）
+        output_path: 分片拼接后的输出文件路径（.ts 或 fMP4）
+        headers: HTTP 请求头（Cookie/Referer 等）
+        session_pool: HTTP 会话池（可选）
+        workers: 并发拉取分片的线程数
+        quality: 主播放列表的码流选择策略（见 parse_quality）
+        playlists: 已下载的播放列表缓存（可选，见 drop_sibling_variants；命中的条目使用后移除）
+
+    Returns:
+        str: 拼接后的容器格式（"ts" 或 "mp4"）
+
+    Raises:
+        UnsupportedPlaylistError: 播放列表无法由原生引擎处理
+        IOError: 分片下载失败
+    """
+    playlists = playlists if playlists is not None else {}
+    playlist = playlists.pop(url, None) or fetch_playlist(url, headers, session_pool)
+    if playlist['is_master']:
+        variant = select_variant(playlist['variants'], quality)
+        if _has_external_renditions(playlist, variant):
+            raise UnsupportedPlaylistError("码流的音轨/字幕为独立播放列表")
+        logger.info(
+            f"主播放列表包含 {len(playlist['variants'])} 个码流，"
+            f"选择 {variant.get('resolution') or '未知分辨率'} ({variant.get('bandwidth')} bps)"
+        )
+        playlist = playlists.pop(variant['uri'], None) or fetch_playlist(variant['uri'], headers, session_pool)
+        if playlist['is_master']:
+            raise UnsupportedPlaylistError("嵌套的主播放列表")
+
+    segments: List[Dict[str, object]] = playlist['segments']
+    if not segments:
+        raise UnsupportedPlaylistError("播放列表中没有分片")
+    if not playlist['endlist']:
+        raise UnsupportedPlaylistError("直播播放列表（缺少 #EXT-X-ENDLIST）")
+    _check_encryption_supported(segments)
+    key_cache = _KeyCache(headers, session_pool)
+
+    container = 'mp4' if segments[0]['map'] else 'ts'
+    filename = os.path.basename(output_path)
+    logger.info(f"开始并发下载 {len(segments)} 个 HLS 分片 ({workers} 线程): {filename}")
+
+    pbar = None
+    if TQDM_AVAILABLE:
+        pbar = tqdm(total=len(segments), desc=f"下载 HLS {filename[:30]}", unit='片段', ncols=100)
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    try:
+        with open(output_path, 'wb') as out:
+            fetch_segments_ordered(
+                segments,
+                out,
+                headers=headers,
+                session_pool=session_pool,
+                workers=workers,
+                key_cache=key_cache,
+                on_segment=(lambda: pbar.update(1)) if pbar is not None else None,
+            )
+    finally:
+        if pbar is not None:
+            pbar.close()
+
+    return container
+
+
+def fetch_segments_ordered(
+    segments: List[Dict[str, object]],
+    out,
+    headers: Optional[Dict[str, str]] = None,
+    session_pool: Optional[SessionPool] = None,
+    workers: int = DEFAULT_HLS_WORKERS,
+    key_cache: Optional['_KeyCache'] = None,
+    on_segment=None,
+) -> None:
+    """
+    并发下载分片并按顺序写入文件对象
+
+    滑动窗口最多预取 2×workers 个分片，写出顺序与列表一致，内存占用有上限。
+    分片字典需包含 uri、byterange，可选 key（AES-128）、map（初始化分片）。
+
+    Args:
+        segments: 分片列表
+        out: 已打开的二进制文件对象
+        headers: HTTP 请求头
+        session_pool: HTTP 会话池（可选）
+        workers: 并发线程数
+        key_cache: AES-128 密钥缓存（加密分片需要）
+        on_segment: 每写出一个分片后的回调
+    """
+    written_maps = set()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        window = deque()
+        pending = iter(segments)
+        max_in_flight = max(1, workers) * 2
+
+        def submit_next() -> bool:
+            segment = next(pending, None)
+            if segment is None:
+                return False
+            future = executor.submit(_fetch_segment, segment, headers, session_pool, key_cache)
+            window.append((segment, future))
+            return True
+
+        for _ in range(max_in_flight):
+            if not submit_next():
+                break
+        try:
+            while window:
+                segment, future = window.popleft()
+                data = future.result()
+                init = segment.get('map')
+                if init and init['uri'] + str(init.get('range')) not in written_maps:
+                    out.write(_fetch_bytes(init['uri'], headers, session_pool, init.get('range')))
+                    written_maps.add(init['uri'] + str(init.get('range')))
+                out.write(data)
+                if on_segment is not None:
+                    on_segment()
+                submit_next()
+        except Exception:
+            # 失败时取消尚未开始的分片，避免继续占用带宽
+            for _, future in window:
+                future.cancel()
+            raise
+
+
+def _variant_height(variant: Dict[str, object]) -> int:
+    resolution = variant.get('resolution') or ''
+    if 'x' in resolution:
+        try:
+            return int(resolution.lower().split('x', 1)[1])
+        except ValueError:
+            return 0
+    return 0
+
+
+def _variant_rank(variant: Dict[str, object]):
+    return _variant_height(variant), variant.get('bandwidth') or 0
+
+
+def url_key(url: str) -> str:
+    """忽略查询参数（签名等）的 URL 比较键"""
+    parsed = urlparse(url)
+    return f"{parsed.netloc}{parsed.path}".lower()
+
+
+def _has_external_renditions(playlist: Dict[str, object], variant: Dict[str, object]) -> bool:
+    """码流引用的 EXT-X-MEDIA 分组是否带有独立 URI（需要另外下载音轨）"""
+    group = variant.get('audio')
+    if not group:
+        return False
+    return any(
+        media.get('GROUP-ID') == group and media.get('URI')
+        for media in playlist['media']
+    )
+
+
+def _check_encryption_supported(segments: List[Dict[str, object]]) -> None:
+    """仅支持 AES-128 整段加密，其余方式交给 ffmpeg"""
+    for segment in segments:
+        key = segment['key']
+        if not key:
+            continue
+        method = key.get('METHOD')
+        if method != 'AES-128':
+            raise UnsupportedPlaylistError(f"不支持的加密方式: {method}")
+        if key.get('KEYFORMAT', 'identity') != 'identity':
+            raise UnsupportedPlaylistError(f"不支持的密钥格式: {key.get('KEYFORMAT')}")
+        if not key.get('URI'):
+            raise UnsupportedPlaylistError("AES-128 密钥缺少 URI")
+        if not CRYPTO_AVAILABLE:
+            raise UnsupportedPlaylistError("未安装 cryptography，无法解密 AES-128 分片")
+
+
+class _KeyCache:
+    """
+    AES-128 密钥缓存：每个密钥 URI 只使用捕获的请求头下载一次，供所有工作线程共享
+    """
+
+    def __init__(self, headers: Optional[Dict[str, str]], session_pool: Optional[SessionPool]):
+        self.headers = headers
+        self.session_pool = session_pool
+        self._keys: Dict[str, bytes] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get(self, uri: str) -> bytes:
+        """获取密钥（首次调用时下载）"""
+        with self._lock:
+            key = self._keys.get(uri)
+            if key is not None:
+                return key
+            uri_lock = self._locks.setdefault(uri, threading.Lock())
+        # 同一 URI 的并发请求只有一个线程真正下载，其余等待结果
+        with uri_lock:
+            with self._lock:
+                key = self._keys.get(uri)
+            if key is None:
+                key = _fetch_bytes(uri, self.headers, self.session_pool)
+                if len(key) != 16:
+                    raise IOError(f"AES-128 密钥长度异常 ({len(key)} bytes): {uri}")
+                logger.debug(f"已获取 AES-128 密钥: {uri}")
+                with self._lock:
+                    self._keys[uri] = key
+            return key
+
+
+def _segment_iv(segment: Dict[str, object]) -> bytes:
+    """分片 IV：优先使用 IV 属性，否则按规范使用媒体序列号"""
+    iv = segment['key'].get('IV')
+    if iv:
+        value = iv[2:] if iv.lower().startswith('0x') else iv
+        return bytes.fromhex(value.rjust(32, '0'))
+    return int(segment['sequence']).to_bytes(16, 'big')
+
+
+def _fetch_segment(
+    segment: Dict[str, object],
+    headers: Optional[Dict[str, str]],
+    session_pool: Optional[SessionPool],
+    key_cache: Optional[_KeyCache] = None,
+) -> bytes:
+    """下载单个分片（带重试），加密分片边下载边解密"""
+    key = None
+    iv = None
+    if segment.get('key') and key_cache is not None:
+        key = key_cache.get(segment['key']['URI'])
+        iv = _segment_iv(segment)
+    return _fetch_bytes(segment['uri'], headers, session_pool, segment.get('byterange'), key=key, iv=iv)
+
+
+def _fetch_bytes(
+    url: str,
+    headers: Optional[Dict[str, str]],
+    session_pool: Optional[SessionPool],
+    byterange=None,
+    key: Optional[bytes] = None,
+    iv: Optional[bytes] = None,
+) -> bytes:
+    request_headers = _strip_range(headers)
+    if byterange:
+        request_headers['Range'] = f'bytes={byterange[0]}-{byterange[1]}'
+    session = get_session(url, session_pool)
+    last_error: Optional[Exception] = None
+    for attempt in range(SEGMENT_RETRIES + 1):
+        try:
+            with session.get(url, headers=request_headers, stream=True, timeout=30) as response:
+                response.raise_for_status()
+                if byterange and response.status_code != 206:
+                    # 忽略 Range 的服务器返回整个文件，逐片写入会得到数倍大小的损坏文件
+                    raise UnsupportedPlaylistError(
+                        f"服务器未按 EXT-X-BYTERANGE 返回分段（状态码 {response.status_code}）"
+                    )
+                if key is None:
+                    return response.content
+                decryptor = Cipher(algorithms.AES(key), modes.CBC(iv)).decryptor()
+                parts = [
+                    decryptor.update(chunk)
+                    for chunk in response.iter_content(chunk_size=STREAM_READ_SIZE)
+                    if chunk
+                ]
+                parts.append(decryptor.finalize())
+                return _strip_pkcs7(b''.join(parts))
+        except UnsupportedPlaylistError:
+            raise
+        except (requests.RequestException, ValueError) as err:
+            last_error = err
+            logger.debug(f"分片下载失败（第 {attempt + 1} 次）{url}: {err}")
+    raise IOError(f"分片下载失败 {url}: {last_error}")
+
+
+def _strip_pkcs7(data: bytes) -> bytes:
+    """去除 PKCS#7 填充"""
+    if not data:
+        return data
+    pad = data[-1]
+    if 1 <= pad <= 16 and data.endswith(bytes([pad]) * pad):
+        return data[:-pad]
+    return data
+
+
+def _parse_byterange(value: str, default_offset: int):
+    """解析 `length[@offset]`，返回闭区间 (start, end)"""
+    if '@' in value:
+        length, offset = value.split('@', 1)
+        start = int(offset)
+    else:
+        length = value
+        start = default_offset
+    return start, start + int(length) - 1
+
+
+def _strip_range(headers: Optional[Dict[str, str]]) -> Dict[str, str]:
+    """移除捕获请求头中的 Range（播放列表与分片需要完整响应）"""
+    return {k: v for k, v in (headers or {}).items() if k.lower() != 'range'}
+
@@ -0,0 +1,157 @@
+"""
+HTTP 会话池：按 scheme + host 复用 requests.Session，批量下载同一 CDN 时避免重复 TCP/TLS 握手
+"""
+import logging
+import socket
+import threading
+from typing import Dict, Optional
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# 每个 host 的最大连接数（需不小于分段下载/分片下载的并发数）
+DEFAULT_POOL_SIZE = 16
+# TCP keep-alive 探测间隔（秒）
+DEFAULT_KEEPALIVE_INTERVAL = 30
+
+
+class _KeepAliveAdapter(HTTPAdapter):
+    """在底层 socket 上开启 TCP keep-alive 的 HTTPAdapter"""
+
+    def __init__(self, keepalive_interval: Optional[int] = None, **kwargs):
+        self.keepalive_interval = keepalive_interval
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self.keepalive_interval:
+            kwargs['socket_options'] = _keepalive_socket_options(self.keepalive_interval)
+        super().init_poolmanager(*args, **kwargs)
+
+
+class SessionPool:
+    """
+    按 host 管理的 requests.Session 池
+
+    同一 host 的所有请求（探测、分段、分片）共享一个 Session 及其连接池，
+    线程安全，可在批量下载的整个生命周期内复用。
+    """
+
+    def __init__(
+        self,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        keep_alive: bool = True,
+        keepalive_interval: int = DEFAULT_KEEPALIVE_INTERVAL,
+    ):
+        """
+        初始化会话池
+
+        Args:
+            pool_size: 每个 host 的最大保持连接数
+            keep_alive: 是否复用连接（False 时每个请求结束即关闭连接）
+            keepalive_interval: TCP keep-alive 探测间隔（秒）
+        """
+        self.pool_size = max(1, pool_size)
+        self.keep_alive = keep_alive
+        self.keepalive_interval = keepalive_interval
+        self._sessions: Dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> requests.Session:
+        """
+        获取 URL 所属 host 的 Session（不存在则创建）
+
+        Args:
+            url: 请求 URL
+
+        Returns:
+            requests.Session: 该 host 共享的会话
+        """
+        parsed = urlparse(url)
+        key = f"{parsed.scheme}://{parsed.netloc}".lower()
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._create_session()
+                self._sessions[key] = session
+                logger.debug(f"创建 HTTP 会话: {key}")
+            return session
+
+    def close(self) -> None:
+        """关闭所有会话及其连接"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            try:
+                session.close()
+            except Exception:
+                pass
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = _KeepAliveAdapter(
+            keepalive_interval=self.keepalive_interval if self.keep_alive else None,
+            pool_connections=1,
+            pool_maxsize=self.pool_size,
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    def __enter__(self) -> 'SessionPool':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+_default_pool: Optional[SessionPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_session_pool() -> SessionPool:
+    """
+    获取进程级默认会话池，供未显式传入会话池的调用方使用
+
+    Returns:
+        SessionPool: 默认会话池
+    """
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = SessionPool()
+        return _default_pool
+
+
+def get_session(url: str, session_pool: Optional[SessionPool] = None) -> requests.Session:
+    """
+    获取 URL 对应的 Session，未传入会话池时使用默认会话池
+
+    Args:
+        url: 请求 URL
+        session_pool: 会话池（可选）
+
+    Returns:
+        requests.Session: 会话
+    """
+    return (session_pool or get_default_session_pool()).get(url)
+
+
+def _keepalive_socket_options(interval: int):
+    """构建 TCP keep-alive socket 选项（按平台能力尽量设置）"""
+    from urllib3.connection import HTTPConnection
+
+    options = list(HTTPConnection.default_socket_options)
+    options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    if hasattr(socket, 'TCP_KEEPIDLE'):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, interval))
+    elif hasattr(socket, 'TCP_KEEPALIVE'):
+        # macOS
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPALIVE, interval))
+    if hasattr(socket, 'TCP_KEEPINTVL'):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, interval))
+    return options
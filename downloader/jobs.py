@@ -0,0 +1,250 @@
+"""
+批量任务：从 JSONL 读取任务，页面捕获与下载分为两个独立的并发阶段，结果逐条写入 JSONL
+
+任务文件每行一个 JSON 对象，例如：
+    {"url": "https://www.bilibili.com/video/BVxxxx", "output_dir": "./downloads/bili", "quality": "<=1080p"}
+    {"url": "https://example.com/page", "headers": {"Cookie": "a=b"}, "id": "job-2"}
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from .browser_pool import DEFAULT_BROWSER_POOL_SIZE, DEFAULT_BROWSER_RECYCLE, DEFAULT_CONTEXT_RECYCLE
+from .hls import parse_quality
+
+logger = logging.getLogger(__name__)
+
+# 同时进行下载阶段的任务数
+DEFAULT_DOWNLOAD_JOBS = 2
+# 单个任务支持的字段
+JOB_FIELDS = ('id', 'url', 'output_dir', 'quality', 'codec_preference', 'headers', 'timeout')
+
+
+def load_jobs(path: str) -> List[Dict[str, object]]:
+    """
+    读取 JSONL 任务文件（空行与 # 开头的行会被忽略）
+
+    Args:
+        path: 任务文件路径
+
+    Returns:
+        List[Dict[str, object]]: 任务列表；无效行会被记录并跳过
+
+    Raises:
+        OSError: 文件无法读取
+    """
+    jobs: List[Dict[str, object]] = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                job = json.loads(line)
+            except ValueError as err:
+                logger.error(f"任务文件第 {line_no} 行不是有效 JSON，已跳过: {err}")
+                continue
+            try:
+                jobs.append(_normalize_job(job, line_no))
+            except ValueError as err:
+                logger.error(f"任务文件第 {line_no} 行无效，已跳过: {err}")
+    logger.info(f"从 {path} 读取 {len(jobs)} 个任务")
+    return jobs
+
+
+def _normalize_job(job: object, line_no: int) -> Dict[str, object]:
+    if not isinstance(job, dict):
+        raise ValueError("每行必须是 JSON 对象")
+    if not isinstance(job.get('url'), str) or not job['url']:
+        raise ValueError("缺少 url 字段")
+    unknown = set(job) - set(JOB_FIELDS)
+    if unknown:
+        logger.warning(f"任务文件第 {line_no} 行包含未知字段，已忽略: {', '.join(sorted(unknown))}")
+    if job.get('quality') is not None:
+        parse_quality(str(job['quality']))
+    if job.get('headers') is not None and not isinstance(job['headers'], dict):
+        raise ValueError("headers 必须是对象")
+    normalized = {key: job[key] for key in JOB_FIELDS if job.get(key) is not None}
+    normalized.setdefault('id', str(line_no))
+    return normalized
+
+
+class ResultWriter:
+    """逐条追加写入任务结果（JSONL），每条写入后立即刷新，中断时已完成的结果不会丢失"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def write(self, result: Dict[str, object]) -> None:
+        """写入一条结果"""
+        with self._lock:
+            self._file.write(json.dumps(result, ensure_ascii=False) + '\n')
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self) -> 'ResultWriter':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+async def run_jobs_async(
+    jobs: List[Dict[str, object]],
+    downloader,
+    results_path: str,
+    output_dir: str,
+    capture_concurrency: int = DEFAULT_BROWSER_POOL_SIZE,
+    download_jobs: int = DEFAULT_DOWNLOAD_JOBS,
+    timeout: int = 90000,
+    context_recycle: int = DEFAULT_CONTEXT_RECYCLE,
+    browser_recycle: int = DEFAULT_BROWSER_RECYCLE,
+) -> Dict[str, int]:
+    """
+    执行批量任务：捕获阶段（浏览器池并行页面）→ 下载阶段（独立并发），结果写入 JSONL
+
+    Args:
+        jobs: load_jobs 返回的任务列表
+        downloader: 作为配置模板的 HeadlessBrowserDownloader
+        results_path: 结果 JSONL 路径（追加写入）
+        output_dir: 任务未指定 output_dir 时使用的输出目录
+        capture_concurrency: 同时捕获的页面数
+        download_jobs: 同时处于下载阶段的任务数
+        timeout: 页面超时（毫秒），任务可单独指定
+        context_recycle: 每个浏览器上下文服务的页面数上限
+        browser_recycle: 浏览器服务的页面数上限（0 表示不重启）
+
+    Returns:
+        Dict[str, int]: 各状态的任务数
+    """
+    if downloader.user_data_dir:
+        logger.warning("批量任务使用浏览器池，--user-data-dir 将被忽略")
+    capture_queue: asyncio.Queue = asyncio.Queue()
+    for job in jobs:
+        capture_queue.put_nowait(job)
+    # 有界队列：下载跟不上时暂停捕获，避免签名 URL 在排队期间过期
+    download_queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, download_jobs))
+    summary: Dict[str, int] = {}
+    pool = downloader.create_browser_pool(capture_concurrency, context_recycle, browser_recycle)
+
+    def report(job: Dict[str, object], result: Dict[str, object]) -> None:
+        record = {'id': job['id'], 'url': job['url'], **result}
+        record['finished_at'] = datetime.now(timezone.utc).isoformat()
+        writer.write(record)
+        summary[record['status']] = summary.get(record['status'], 0) + 1
+        logger.info(f"任务 {job['id']} 完成: {record['status']}")
+
+    async def capture_worker() -> None:
+        while True:
+            try:
+                job = capture_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.monotonic()
+            job_output_dir = str(job.get('output_dir') or output_dir)
+            overrides = {
+                key: job[key] for key in ('quality', 'codec_preference') if key in job
+            }
+            if 'headers' in job:
+                overrides['request_headers'] = job['headers']
+            worker = downloader.with_browser_pool(pool, **overrides)
+            try:
+                video_urls = await worker.collect_video_urls(
+                    str(job['url']), timeout=int(job.get('timeout', timeout))
+                )
+            except Exception as err:
+                report(job, _result('error', started, error=str(err)))
+                continue
+            capture_seconds = time.monotonic() - started
+            if not video_urls:
+                report(job, _result('no_media', started, capture_seconds=capture_seconds))
+                continue
+            await download_queue.put((job, worker, video_urls, job_output_dir, started, capture_seconds))
+
+    async def download_worker() -> None:
+        while True:
+            item = await download_queue.get()
+            if item is None:
+                return
+            job, worker, video_urls, job_output_dir, started, capture_seconds = item
+            download_started = time.monotonic()
+            try:
+                files = await worker.download_videos(video_urls, job_output_dir)
+            except Exception as err:
+                report(job, _result('error', started, error=str(err), capture_seconds=capture_seconds))
+                continue
+            report(job, _result(
+                'ok' if files else 'failed',
+                started,
+                capture_seconds=capture_seconds,
+                download_seconds=time.monotonic() - download_started,
+                output_dir=job_output_dir,
+                media_urls=len(video_urls),
+                files=files,
+            ))
+
+    with ResultWriter(results_path) as writer:
+        await pool.start()
+        try:
+            download_tasks = [asyncio.create_task(download_worker()) for _ in range(max(1, download_jobs))]
+            try:
+                await asyncio.gather(*(capture_worker() for _ in range(pool.size)))
+            finally:
+                for _ in download_tasks:
+                    await download_queue.put(None)
+            await asyncio.gather(*download_tasks)
+        finally:
+            await pool.close()
+    logger.info(f"批量任务完成: {summary}，结果已写入 {results_path}")
+    return summary
+
+
+def run_jobs(jobs: List[Dict[str, object]], downloader, results_path: str, output_dir: str, **kwargs) -> Dict[str, int]:
+    """
+    同步执行批量任务（见 run_jobs_async）
+    """
+    return asyncio.run(run_jobs_async(jobs, downloader, results_path, output_dir, **kwargs))
+
+
+def _result(
+    status: str,
+    started: float,
+    error: Optional[str] = None,
+    capture_seconds: Optional[float] = None,
+    download_seconds: Optional[float] = None,
+    output_dir: Optional[str] = None,
+    media_urls: int = 0,
+    files: Optional[List[str]] = None,
+) -> Dict[str, object]:
+    """构建一条任务结果"""
+    files = files or []
+    result: Dict[str, object] = {
+        'status': status,
+        'media_urls': media_urls,
+        'files': files,
+        'bytes': sum(os.path.getsize(path) for path in files if os.path.exists(path)),
+        'capture_seconds': _round(capture_seconds),
+        'download_seconds': _round(download_seconds),
+        'total_seconds': _round(time.monotonic() - started),
+    }
+    if output_dir is not None:
+        result['output_dir'] = output_dir
+    if error:
+        result['error'] = error
+    return result
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 2) if value is not None else None
@@ -0,0 +1,196 @@
+"""
+媒体信息探测服务：并行运行 ffprobe，一次取得完整的 JSON 流信息并按文件缓存
+
+结果按 (路径, 大小, 修改时间) 缓存，合并、校验与日志输出共用同一次探测；文件被改写后自动重新探测。
+"""
+import json
+import logging
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+from .toolchain import get_toolchain
+
+logger = logging.getLogger(__name__)
+
+# 单个文件的探测超时（秒）
+PROBE_TIMEOUT = 10
+# 默认并行探测数：ffprobe 只读文件头，耗时主要在进程启动与等待 I/O，单核机器上也并行 4 个
+DEFAULT_PROBE_WORKERS = min(8, max(4, os.cpu_count() or 1))
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_probe_output(output: str) -> Optional[Dict[str, object]]:
+    """
+    解析 `ffprobe -print_format json -show_streams -show_format` 的输出
+
+    Args:
+        output: ffprobe 标准输出
+
+    Returns:
+        Optional[Dict[str, object]]: {'format', 'duration', 'bit_rate', 'streams': [{'type', 'codec', 'bit_rate',
+        'duration', 'width', 'height', 'sample_rate', 'channels'}, ...]}；无法解析时为 None
+    """
+    try:
+        data = json.loads(output)
+    except ValueError:
+        return None
+    fmt = data.get('format') or {}
+    streams = []
+    for stream in data.get('streams') or []:
+        streams.append({
+            'type': stream.get('codec_type'),
+            'codec': stream.get('codec_name'),
+            'bit_rate': _to_int(stream.get('bit_rate')),
+            'duration': _to_float(stream.get('duration')),
+            'width': _to_int(stream.get('width')),
+            'height': _to_int(stream.get('height')),
+            'sample_rate': _to_int(stream.get('sample_rate')),
+            'channels': _to_int(stream.get('channels')),
+        })
+    return {
+        'format': fmt.get('format_name'),
+        'duration': _to_float(fmt.get('duration')),
+        'bit_rate': _to_int(fmt.get('bit_rate')),
+        'streams': streams,
+    }
+
+
+def stream_counts(info: Dict[str, object]) -> Tuple[int, int]:
+    """(视频流数, 音频流数)"""
+    types = [stream['type'] for stream in info['streams']]
+    return types.count('video'), types.count('audio')
+
+
+def describe_media(info: Dict[str, object]) -> str:
+    """用于日志的媒体摘要，例如 "h264 1920x1080 + aac，时长 63.2s" """
+    parts = []
+    for stream in info['streams']:
+        if stream['type'] == 'video':
+            size = f" {stream['width']}x{stream['height']}" if stream['width'] and stream['height'] else ''
+            parts.append(f"{stream['codec']}{size}")
+        elif stream['type'] == 'audio':
+            parts.append(str(stream['codec']))
+    summary = ' + '.join(parts) or '无音视频流'
+    if info.get('duration'):
+        summary += f"，时长 {info['duration']:.1f}s"
+    return summary
+
+
+class MediaProbe:
+    """带缓存的 ffprobe 探测服务（线程安全）"""
+
+    def __init__(self, workers: int = DEFAULT_PROBE_WORKERS, timeout: float = PROBE_TIMEOUT):
+        """
+        Args:
+            workers: 并行探测数
+            timeout: 单个文件的探测超时（秒）
+        """
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self._cache: Dict[Tuple[str, int, int], Optional[Dict[str, object]]] = {}
+        self._lock = threading.Lock()
+
+    def probe(self, path: str) -> Optional[Dict[str, object]]:
+        """
+        探测单个文件（命中缓存时不启动 ffprobe）
+
+        Args:
+            path: 媒体文件路径
+
+        Returns:
+            Optional[Dict[str, object]]: 见 parse_probe_output；文件不存在、ffprobe 不可用或解析失败时为 None
+        """
+        key = self._key(path)
+        if key is None:
+            return None
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key]
+        info = self._run_ffprobe(path)
+        with self._lock:
+            self._cache[key] = info
+        return info
+
+    def probe_many(self, paths: Iterable[str]) -> Dict[str, Optional[Dict[str, object]]]:
+        """
+        并行探测多个文件
+
+        Args:
+            paths: 媒体文件路径
+
+        Returns:
+            Dict[str, Optional[Dict[str, object]]]: 路径 → 探测结果
+        """
+        paths = list(dict.fromkeys(paths))
+        if len(paths) <= 1 or self.workers == 1:
+            return {path: self.probe(path) for path in paths}
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(paths))) as executor:
+            return dict(zip(paths, executor.map(self.probe, paths)))
+
+    def forget(self, paths: Iterable[str]) -> None:
+        """删除文件的缓存结果（文件已删除或被替换时调用）"""
+        paths = {os.path.abspath(path) for path in paths}
+        with self._lock:
+            for key in [key for key in self._cache if key[0] in paths]:
+                del self._cache[key]
+
+    def _key(self, path: str) -> Optional[Tuple[str, int, int]]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+    def _run_ffprobe(self, path: str) -> Optional[Dict[str, object]]:
+        ffprobe = get_toolchain().ffprobe
+        if not ffprobe:
+            return None
+        cmd = [ffprobe, '-v', 'error', '-print_format', 'json', '-show_streams', '-show_format', path]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=self.timeout)
+        except (subprocess.TimeoutExpired, OSError) as err:
+            logger.debug(f"ffprobe 执行失败或超时 {os.path.basename(path)}: {err}")
+            return None
+        if result.returncode != 0:
+            logger.debug(f"ffprobe 解析失败: {result.stderr.strip()}")
+            return None
+        return parse_probe_output(result.stdout)
+
+
+_default_probe: Optional[MediaProbe] = None
+_default_lock = threading.Lock()
+
+
+def get_media_probe() -> MediaProbe:
+    """进程级共享的探测服务"""
+    global _default_probe
+    with _default_lock:
+        if _default_probe is None:
+            _default_probe = MediaProbe()
+        return _default_probe
+
+
+def probe_media(path: str) -> Optional[Dict[str, object]]:
+    """使用进程级探测服务探测单个文件"""
+    return get_media_probe().probe(path)
+
+
+def probe_media_many(paths: Iterable[str]) -> Dict[str, Optional[Dict[str, object]]]:
+    """使用进程级探测服务并行探测多个文件"""
+    return get_media_probe().probe_many(paths)
+
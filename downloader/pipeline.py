@@ -0,0 +1,346 @@
+"""
+边捕获边下载：浏览器发现的媒体 URL 立即入队，由下载协程并发消费
+
+去重、m3u8 与 .ts 分片的过滤、主播放列表下各码流 m3u8 的过滤都在入队时增量完成；
+.ts / .m4s 这类分片通常属于某个清单（m3u8 / DASH），推迟到捕获结束后再决定是否下载。
+"""
+import asyncio
+import functools
+import logging
+import os
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+from .http_session import SessionPool
+from .hls import DEFAULT_QUALITY, fetch_playlist, url_key
+from .dash import DEFAULT_CODEC_PREFERENCE
+from .dedup_store import DedupStore
+from .scheduler import DEFAULT_MAX_DOWNLOADS, DEFAULT_PER_HOST, AsyncHostLimiter, host_of
+from .segmented_download import DEFAULT_CONNECTIONS
+from .utils import download_video, get_video_filename
+from .async_download import AIOHTTP_AVAILABLE, create_client_session, download_video_async
+try:
+    from tqdm import tqdm
+    TQDM_AVAILABLE = True
+except ImportError:
+    TQDM_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 推迟到捕获结束后再处理的分片扩展名
+DEFERRED_EXTENSIONS = ('.ts', '.m4s')
+
+_SENTINEL = None
+
+
+class DownloadPipeline:
+    """
+    捕获与下载流水线
+
+    用法：`await start()` → 捕获过程中多次 `submit(url, headers)` → `await finish()` 取得下载结果，
+    最后 `await close()`（或使用 `async with`）。
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        connections: int = DEFAULT_CONNECTIONS,
+        session_pool: Optional[SessionPool] = None,
+        quality: str = DEFAULT_QUALITY,
+        codec_preference: str = DEFAULT_CODEC_PREFERENCE,
+        max_downloads: int = DEFAULT_MAX_DOWNLOADS,
+        per_host: int = DEFAULT_PER_HOST,
+        show_progress: bool = True,
+        dedup_store: Optional[DedupStore] = None,
+        limiter: Optional[AsyncHostLimiter] = None,
+    ):
+        """
+        初始化流水线
+
+        Args:
+            output_dir: 输出目录
+            connections: 单个文件的并发连接数（MP4 分段 / HLS、DASH 分片）
+            session_pool: HTTP 会话池（可选，未传入时由流水线创建并在关闭时释放）
+            quality: m3u8 主播放列表 / DASH 的画质选择策略
+            codec_preference: DASH 视频编码偏好
+            max_downloads: 同时下载的文件数上限
+            per_host: 同一 host 同时下载的文件数上限
+            show_progress: 是否显示总体下载进度条
+            dedup_store: 内容去重存储（可选，内容已下载过的文件直接复用）
+            limiter: 并发限制（可选，多条流水线共享时 max_downloads / per_host 对它们整体生效）
+        """
+        self.output_dir = output_dir
+        self.connections = connections
+        self.session_pool = session_pool
+        self.quality = quality
+        self.codec_preference = codec_preference
+        self.max_downloads = max_downloads
+        self.per_host = per_host
+        self.show_progress = show_progress
+        self.dedup_store = dedup_store
+        # 播放列表缓存：识别主播放列表时下载的 m3u8 留给下载直接使用
+        self.playlists: Dict[str, Dict[str, object]] = {}
+        self._owns_pool = session_pool is None
+        self._client = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._limiter: Optional[AsyncHostLimiter] = limiter
+        self._playlist_lock: Optional[asyncio.Lock] = None
+        self._tasks: List[asyncio.Task] = []
+        self._results: Dict[int, Optional[str]] = {}
+        self._seen: Set[str] = set()
+        self._skip_keys: Set[str] = set()
+        self._m3u8_bases: Set[str] = set()
+        self._deferred: List[Tuple[str, Optional[Dict[str, str]]]] = []
+        self._claimed_names: Set[str] = set()
+        self._next_index = 0
+        self._completed = 0
+        self._accepting = False
+        self._pbar = None
+
+    async def start(self) -> None:
+        """创建会话与调度协程（需在事件循环中调用）"""
+        if self.session_pool is None:
+            self.session_pool = SessionPool()
+        if AIOHTTP_AVAILABLE:
+            self._client = create_client_session(self.session_pool.pool_size, self.session_pool.keep_alive)
+        self._queue = asyncio.Queue()
+        if self._limiter is None:
+            self._limiter = AsyncHostLimiter(self.max_downloads, self.per_host)
+        self._playlist_lock = asyncio.Lock()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+        self._accepting = True
+
+    def submit(self, url: str, headers: Optional[Dict[str, str]] = None) -> bool:
+        """
+        提交一个捕获到的媒体 URL（可在 Playwright 事件回调中直接调用）
+
+        Args:
+            url: 媒体 URL
+            headers: 下载该 URL 使用的 HTTP 请求头
+
+        Returns:
+            bool: 是否进入下载队列（重复、已被清单覆盖或推迟处理时返回 False）
+        """
+        if not self._accepting or url in self._seen:
+            return False
+        self._seen.add(url)
+        if url_key(url) in self._skip_keys:
+            logger.debug(f"跳过已由清单覆盖的媒体: {url}")
+            return False
+
+        path = urlparse(url).path
+        if '.m3u8' in url.lower() and '/' in path:
+            # 记录 m3u8 的基础路径（例如: /hls/1011435/index.m3u8 -> /hls/1011435/），用于过滤同一流的 .ts
+            self._m3u8_bases.add(path[:path.rfind('/') + 1])
+        if path.lower().endswith(DEFERRED_EXTENSIONS):
+            if self._belongs_to_m3u8(url):
+                logger.debug(f"跳过 .ts 文件（属于 m3u8 流）: {url}")
+            else:
+                self._deferred.append((url, headers))
+            return False
+        self._enqueue(url, headers)
+        return True
+
+    def submit_job(self, job: Callable[[], Awaitable[Optional[str]]]) -> None:
+        """
+        提交一个自定义下载任务（例如根据 __playinfo__ 下载 DASH），占用一个全局并发名额
+
+        Args:
+            job: 返回输出文件路径（失败为 None）的协程函数
+        """
+        if not self._accepting:
+            return
+        index = self._take_index()
+        self._tasks.append(asyncio.create_task(self._run_job(index, job)))
+
+    def add_skip_keys(self, keys: Iterable[str]) -> None:
+        """
+        登记已由清单覆盖的媒体（url_key），之后捕获到的相同媒体不再单独下载
+
+        Args:
+            keys: URL 比较键集合
+        """
+        self._skip_keys.update(keys)
+
+    async def finish(self) -> List[str]:
+        """
+        结束捕获：处理推迟的分片，等待所有下载完成
+
+        Returns:
+            List[str]: 成功下载的文件路径列表（按发现顺序）
+        """
+        if not self._accepting:
+            return self._collect_results()
+        self._accepting = False
+
+        skipped_ts = 0
+        for url, headers in self._deferred:
+            if url_key(url) in self._skip_keys:
+                continue
+            if self._belongs_to_m3u8(url):
+                skipped_ts += 1
+                continue
+            self._enqueue(url, headers)
+        self._deferred.clear()
+        if skipped_ts:
+            logger.info(f"检测到 m3u8 流，已跳过 {skipped_ts} 个 .ts 文件（将使用 m3u8 下载完整视频）")
+
+        await self._queue.put(_SENTINEL)
+        await self._dispatcher
+        if self._tasks:
+            await asyncio.gather(*self._tasks)
+        return self._collect_results()
+
+    async def close(self) -> None:
+        """取消未完成的下载并释放会话"""
+        self._accepting = False
+        if self._dispatcher is not None and not self._dispatcher.done():
+            self._dispatcher.cancel()
+        pending = [task for task in self._tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        if self._pbar is not None:
+            self._pbar.close()
+            self._pbar = None
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+        if self._owns_pool and self.session_pool is not None:
+            self.session_pool.close()
+            self.session_pool = None
+
+    async def __aenter__(self) -> 'DownloadPipeline':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    def _enqueue(self, url: str, headers: Optional[Dict[str, str]]) -> None:
+        self._queue.put_nowait((self._take_index(), url, headers))
+
+    def _take_index(self) -> int:
+        index = self._next_index
+        self._next_index += 1
+        if self._pbar is None and self.show_progress and TQDM_AVAILABLE:
+            # 首个任务出现时才创建进度条，未发现媒体的页面不输出空进度条
+            self._pbar = tqdm(total=0, desc="总体下载进度", unit="文件", ncols=100, position=0, leave=True)
+        if self._pbar is not None:
+            self._pbar.total += 1
+            self._pbar.refresh()
+        return index
+
+    def _belongs_to_m3u8(self, url: str) -> bool:
+        """.ts 分片是否位于已捕获的 m3u8 目录下"""
+        path = urlparse(url).path
+        return path.lower().endswith('.ts') and any(path.startswith(base) for base in self._m3u8_bases)
+
+    async def _dispatch(self) -> None:
+        """从队列取出 URL 并立即创建下载任务（并发由 AsyncHostLimiter 约束）"""
+        while True:
+            item = await self._queue.get()
+            if item is _SENTINEL:
+                return
+            index, url, headers = item
+            self._tasks.append(asyncio.create_task(self._run(index, url, headers)))
+
+    async def _run(self, index: int, url: str, headers: Optional[Dict[str, str]]) -> None:
+        file_path = None
+        try:
+            if '.m3u8' in url.lower():
+                # 按入队顺序逐个识别播放列表：主播放列表登记后，其码流 m3u8 不再单独下载
+                async with self._playlist_lock:
+                    if url_key(url) not in self._skip_keys:
+                        await self._register_playlist(url, headers)
+            async with self._limiter.slot(host_of(url)):
+                if url_key(url) in self._skip_keys:
+                    logger.info(f"跳过属于主播放列表的码流 m3u8（仅下载按策略选中的码流）: {url}")
+                else:
+                    file_path = await self._download(index, url, headers)
+        except asyncio.CancelledError:
+            raise
+        except Exception as err:
+            logger.error(f"直接下载失败 {url}: {err}")
+        self._record(index, file_path)
+
+    async def _run_job(self, index: int, job: Callable[[], Awaitable[Optional[str]]]) -> None:
+        file_path = None
+        try:
+            async with self._limiter.slot():
+                file_path = await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as err:
+            logger.error(f"下载任务失败: {err}")
+        self._record(index, file_path)
+
+    async def _register_playlist(self, url: str, headers: Optional[Dict[str, str]]) -> None:
+        playlist = self.playlists.get(url)
+        if playlist is None:
+            loop = asyncio.get_running_loop()
+            try:
+                playlist = await loop.run_in_executor(
+                    None, functools.partial(fetch_playlist, url, headers, self.session_pool)
+                )
+            except Exception as err:
+                logger.debug(f"读取播放列表失败 {url}: {err}")
+                return
+            self.playlists[url] = playlist
+        if playlist['is_master']:
+            self._skip_keys.update(url_key(v['uri']) for v in playlist['variants'])
+
+    async def _download(self, index: int, url: str, headers: Optional[Dict[str, str]]) -> Optional[str]:
+        filename = self._claim_filename(url, index)
+        if self._client is not None:
+            return await download_video_async(
+                self._client,
+                url,
+                self.output_dir,
+                filename=filename,
+                headers=headers,
+                connections=self.connections,
+                session_pool=self.session_pool,
+                quality=self.quality,
+                codec_preference=self.codec_preference,
+                dedup_store=self.dedup_store,
+                playlists=self.playlists,
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None,
+            functools.partial(
+                download_video,
+                url,
+                self.output_dir,
+                filename=filename,
+                headers=headers,
+                connections=self.connections,
+                session_pool=self.session_pool,
+                quality=self.quality,
+                codec_preference=self.codec_preference,
+                dedup_store=self.dedup_store,
+                playlists=self.playlists,
+            ),
+        )
+
+    def _claim_filename(self, url: str, index: int) -> str:
+        """生成输出文件名；与本批次已有文件重名（忽略扩展名）时追加索引"""
+        filename = get_video_filename(url)
+        if os.path.splitext(filename)[0] in self._claimed_names:
+            filename = get_video_filename(url, index)
+        self._claimed_names.add(os.path.splitext(filename)[0])
+        return filename
+
+    def _record(self, index: int, file_path: Optional[str]) -> None:
+        self._results[index] = file_path
+        if file_path:
+            self._completed += 1
+        if self._pbar is not None:
+            self._pbar.update(1)
+            self._pbar.set_postfix({"已完成": f"{self._completed}/{self._pbar.total}"})
+
+    def _collect_results(self) -> List[str]:
+        # 跳过模式下不同 URL 可能复用同一个已有文件
+        return list(dict.fromkeys(self._results[i] for i in sorted(self._results) if self._results[i]))
@@ -0,0 +1,114 @@
+"""
+下载后处理任务（音视频合并、.ts 合并）的并行执行
+
+每个任务是一个独立的 ffmpeg 进程（或 TS 直接拼接），瓶颈在 CPU 与磁盘：全局并发按 CPU 核数限制；
+输出在机械硬盘上时同一磁盘只运行一个任务，避免多个流复制任务来回寻道，SSD 等不再单独限制。
+"""
+import logging
+import os
+import threading
+from typing import Callable, Iterable, List, Optional, Tuple
+from .scheduler import run_batch
+
+logger = logging.getLogger(__name__)
+
+# 同时运行的后处理任务数上限
+DEFAULT_POSTPROCESS_JOBS = min(4, max(2, os.cpu_count() or 1))
+# 机械硬盘上同时运行的后处理任务数
+ROTATIONAL_JOBS_PER_DISK = 1
+
+# (任务名称, 输出路径, 任务函数)；任务函数返回是否成功
+PostprocessJob = Tuple[str, str, Callable[[], bool]]
+
+
+def disk_of(path: str) -> str:
+    """输出路径所在的设备（用于单磁盘并发限制）"""
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        return str(os.stat(directory).st_dev)
+    except OSError:
+        return directory
+
+
+def is_rotational(disk: str) -> bool:
+    """
+    设备是否为机械硬盘（读取 Linux sysfs 的 queue/rotational）
+
+    Args:
+        disk: disk_of 返回的设备号
+
+    Returns:
+        bool: 是机械硬盘时为 True；无法判断（tmpfs、overlay、非 Linux 等）时为 False
+    """
+    try:
+        device = int(disk)
+    except ValueError:
+        return False
+    block = f"/sys/dev/block/{os.major(device)}:{os.minor(device)}"
+    # 分区本身没有 queue 目录，取所属的整块磁盘
+    for candidate in (block, os.path.join(block, '..')):
+        try:
+            with open(os.path.join(candidate, 'queue', 'rotational'), 'r', encoding='ascii') as f:
+                return f.read().strip() == '1'
+        except OSError:
+            continue
+    return False
+
+
+def jobs_per_disk(disks: Iterable[str], max_jobs: int) -> int:
+    """单磁盘并发上限：任一输出磁盘是机械硬盘时为 ROTATIONAL_JOBS_PER_DISK，否则不单独限制"""
+    if any(is_rotational(disk) for disk in set(disks)):
+        return ROTATIONAL_JOBS_PER_DISK
+    return max_jobs
+
+
+def run_postprocess_jobs(
+    jobs: List[PostprocessJob],
+    max_jobs: int = DEFAULT_POSTPROCESS_JOBS,
+    per_disk: Optional[int] = None,
+    label: str = "后处理",
+) -> List[bool]:
+    """
+    并行执行后处理任务，逐个报告完成进度与失败
+
+    Args:
+        jobs: 任务列表
+        max_jobs: 同时运行的任务数上限
+        per_disk: 同一磁盘上同时运行的任务数上限，None 表示按磁盘类型决定（见 jobs_per_disk）
+        label: 日志中的任务类别
+
+    Returns:
+        List[bool]: 与 jobs 顺序一致的执行结果（任务抛出异常视为失败）
+    """
+    if not jobs:
+        return []
+    total = len(jobs)
+    lock = threading.Lock()
+    state = {'done': 0}
+    disks = {job[1]: disk_of(job[1]) for job in jobs}
+    if per_disk is None:
+        per_disk = jobs_per_disk(disks.values(), max_jobs)
+    parallel = min(max_jobs, total)
+    if len(set(disks.values())) == 1:
+        parallel = min(parallel, per_disk)
+    if total > 1:
+        logger.info(f"{label}: {total} 个任务，最多 {max(1, parallel)} 个并行")
+
+    def report(index: int, job: PostprocessJob, result: Optional[bool]) -> None:
+        with lock:
+            state['done'] += 1
+            done = state['done']
+        if result:
+            logger.info(f"{label} [{done}/{total}] 完成: {job[0]}")
+        else:
+            logger.warning(f"{label} [{done}/{total}] 失败: {job[0]}")
+
+    results = run_batch(
+        jobs,
+        lambda index, job: job[2](),
+        max_workers=max_jobs,
+        per_host=per_disk,
+        key=lambda job: disks[job[1]],
+        on_done=report,
+    )
+    return [bool(result) for result in results]
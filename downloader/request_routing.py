@@ -0,0 +1,243 @@
+"""
+浏览器请求路由（page.route）相关的策略与 URL 分类
+
+- 媒体正文：捕获到媒体请求后可以中止或截断浏览器自身的媒体正文传输，避免与下载器重复下载；
+  清单（m3u8/mpd）始终放行，播放器才会继续请求后续媒体。
+- 资源屏蔽：捕获期间不加载图片、字体以及广告 / 统计脚本，缩短页面加载并更快到达 networkidle。
+"""
+import logging
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# 清单扩展名：始终放行
+MANIFEST_EXTENSIONS = ('.m3u8', '.mpd')
+# 媒体正文扩展名
+MEDIA_EXTENSIONS = ('.mp4', '.m4s', '.m4a', '.m4v', '.ts', '.webm', '.flv', '.avi', '.mov')
+
+# 浏览器内媒体正文的处理方式
+# allow：不拦截；abort：记录请求后直接中止；truncate：只向服务器请求 1 字节并把截断的响应交给播放器
+MEDIA_BODY_POLICIES: Tuple[str, ...] = ('allow', 'abort', 'truncate')
+DEFAULT_MEDIA_BODY_POLICY = 'allow'
+
+
+def _path_of(url: str) -> str:
+    try:
+        return urlparse(url).path.lower()
+    except Exception:
+        return ''
+
+
+def is_manifest_url(url: str) -> bool:
+    """URL 是否为 HLS / DASH 清单"""
+    return _path_of(url).endswith(MANIFEST_EXTENSIONS)
+
+
+def is_media_url(url: str) -> bool:
+    """URL 是否为媒体正文（按扩展名判断，不含清单）"""
+    return _path_of(url).endswith(MEDIA_EXTENSIONS)
+
+
+def is_media_content_type(content_type: str) -> bool:
+    """Content-Type 是否为音视频"""
+    content_type = (content_type or '').lower()
+    return 'video' in content_type or 'audio' in content_type
+
+
+# Playwright 的请求资源类型
+RESOURCE_TYPES = (
+    'document', 'stylesheet', 'image', 'media', 'font', 'script', 'texttrack',
+    'xhr', 'fetch', 'eventsource', 'websocket', 'manifest', 'other',
+)
+# 默认屏蔽的资源类型
+DEFAULT_BLOCKED_RESOURCE_TYPES = ('image', 'font')
+# 永不屏蔽的资源类型：页面本身与音视频
+_NEVER_BLOCKED_TYPES = ('document', 'media')
+# 内置的广告 / 统计域名（匹配自身及子域名）
+DEFAULT_BLOCKED_HOSTS = (
+    'doubleclick.net',
+    'googlesyndication.com',
+    'googleadservices.com',
+    'google-analytics.com',
+    'googletagmanager.com',
+    'googletagservices.com',
+    'adservice.google.com',
+    'facebook.net',
+    'scorecardresearch.com',
+    'hotjar.com',
+    'hm.baidu.com',
+    'pos.baidu.com',
+    'cpro.baidu.com',
+    'cnzz.com',
+    'umeng.com',
+    'growingio.com',
+    'sensorsdata.cn',
+    'mmstat.com',
+    'tanx.com',
+    'miaozhen.com',
+    'admaster.com.cn',
+)
+
+
+def host_matches(host: str, domains: Iterable[str]) -> bool:
+    """host 是否为 domains 中某个域名或其子域名"""
+    host = (host or '').lower().rstrip('.')
+    return any(host == domain or host.endswith('.' + domain) for domain in domains)
+
+
+def parse_resource_types(value: str) -> Tuple[str, ...]:
+    """
+    解析逗号分隔的资源类型列表（"none" 表示不按类型屏蔽）
+
+    Args:
+        value: 例如 "image,font,stylesheet"
+
+    Returns:
+        Tuple[str, ...]: 资源类型
+
+    Raises:
+        ValueError: 包含未知或不允许屏蔽的资源类型
+    """
+    types = tuple(t.strip().lower() for t in value.split(',') if t.strip())
+    if types in ((), ('none',)):
+        return ()
+    for resource_type in types:
+        if resource_type not in RESOURCE_TYPES:
+            raise ValueError(f"未知的资源类型: {resource_type}（可选: {', '.join(RESOURCE_TYPES)}）")
+        if resource_type in _NEVER_BLOCKED_TYPES:
+            raise ValueError(f"资源类型 {resource_type} 不能被屏蔽")
+    return types
+
+
+def load_host_list(path: str) -> Set[str]:
+    """
+    读取域名屏蔽列表：每行一个域名，兼容 hosts 文件格式（"0.0.0.0 ads.example.com"），# 开头为注释
+
+    Args:
+        path: 列表文件路径
+
+    Returns:
+        Set[str]: 域名集合
+
+    Raises:
+        OSError: 文件无法读取
+    """
+    hosts: Set[str] = set()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            host = line.split()[-1].lower().rstrip('.')
+            if host not in ('localhost', '0.0.0.0', '127.0.0.1'):
+                hosts.add(host)
+    logger.info(f"从 {path} 读取 {len(hosts)} 个屏蔽域名")
+    return hosts
+
+
+def parse_site_allow(entries: Iterable[str]) -> Dict[str, Set[str]]:
+    """
+    解析站点放行规则，格式为 "站点域名=项目,项目"，项目为资源类型或域名
+
+    例如 "bilibili.com=image,hdslb.com" 表示在 bilibili.com 及其子域名的页面上不屏蔽图片与 hdslb.com。
+
+    Args:
+        entries: 规则列表
+
+    Returns:
+        Dict[str, Set[str]]: 站点域名 -> 放行的资源类型 / 域名
+
+    Raises:
+        ValueError: 规则格式错误
+    """
+    site_allow: Dict[str, Set[str]] = {}
+    for entry in entries:
+        site, sep, items = entry.partition('=')
+        site = site.strip().lower()
+        if not sep or not site:
+            raise ValueError(f"放行规则格式应为 站点域名=项目[,项目]: {entry}")
+        allowed = {item.strip().lower() for item in items.split(',') if item.strip()}
+        if not allowed:
+            raise ValueError(f"放行规则缺少项目: {entry}")
+        site_allow.setdefault(site, set()).update(allowed)
+    return site_allow
+
+
+class BlockPolicy:
+    """
+    资源屏蔽策略：按资源类型与域名屏蔽请求，按页面所在站点放行
+
+    页面文档、音视频与清单永不屏蔽。
+    """
+
+    def __init__(
+        self,
+        resource_types: Iterable[str] = DEFAULT_BLOCKED_RESOURCE_TYPES,
+        blocked_hosts: Iterable[str] = DEFAULT_BLOCKED_HOSTS,
+        site_allow: Optional[Dict[str, Set[str]]] = None,
+    ):
+        """
+        初始化屏蔽策略
+
+        Args:
+            resource_types: 屏蔽的资源类型
+            blocked_hosts: 屏蔽的域名（含子域名）
+            site_allow: 站点域名 -> 放行的资源类型 / 域名（见 parse_site_allow）
+        """
+        self.resource_types: Set[str] = set(resource_types) - set(_NEVER_BLOCKED_TYPES)
+        self.blocked_hosts: Set[str] = {host.lower() for host in blocked_hosts}
+        self.site_allow: Dict[str, Set[str]] = dict(site_allow or {})
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.resource_types or self.blocked_hosts)
+
+    def allowed_for(self, page_host: Optional[str]) -> Set[str]:
+        """页面所在站点的放行项目"""
+        allowed: Set[str] = set()
+        if page_host:
+            for site, items in self.site_allow.items():
+                if host_matches(page_host, (site,)):
+                    allowed |= items
+        return allowed
+
+    def should_block(self, url: str, resource_type: str, page_host: Optional[str] = None) -> bool:
+        """
+        判断请求是否应被屏蔽
+
+        Args:
+            url: 请求 URL
+            resource_type: Playwright 资源类型
+            page_host: 当前页面的 host（用于站点放行规则）
+
+        Returns:
+            bool: 是否屏蔽
+        """
+        if resource_type in _NEVER_BLOCKED_TYPES or is_manifest_url(url) or is_media_url(url):
+            return False
+        try:
+            host = (urlparse(url).hostname or '').lower()
+        except ValueError:
+            return False
+        blocked_type = resource_type in self.resource_types
+        blocked_host = bool(host) and host_matches(host, self.blocked_hosts)
+        if not blocked_type and not blocked_host:
+            return False
+        allowed = self.allowed_for(page_host)
+        if not allowed:
+            return True
+        if blocked_type and resource_type not in allowed and not host_matches(host, allowed):
+            return True
+        return blocked_host and not host_matches(host, allowed)
+
+    def describe(self) -> List[str]:
+        """用于日志的策略摘要"""
+        parts = []
+        if self.resource_types:
+            parts.append(f"类型 {','.join(sorted(self.resource_types))}")
+        if self.blocked_hosts:
+            parts.append(f"{len(self.blocked_hosts)} 个域名")
+        if self.site_allow:
+            parts.append(f"{len(self.site_allow)} 条站点放行规则")
+        return parts
@@ -0,0 +1,228 @@
+"""
+页面 URL → 媒体 URL 解析缓存（SQLite）
+
+同一页面重复运行（重试、换画质重新下载）时直接使用上次捕获到的媒体 URL、下载请求头与 __playinfo__，
+完全跳过浏览器启动。媒体 URL 多为带过期时间的签名 URL，缓存有效期取其中最早的过期时间。
+"""
+import calendar
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+logger = logging.getLogger(__name__)
+
+# URL 中没有过期参数时的缓存有效期（秒）
+DEFAULT_RESOLUTION_TTL = 3600
+# 签名 URL 过期前预留的时间（秒），避免使用即将过期的 URL
+EXPIRY_MARGIN = 60
+
+# 规范化页面 URL 时去掉的跟踪参数
+_TRACKING_PARAMS = {
+    'spm_id_from', 'vd_source', 'from_spmid', 'share_source', 'share_medium', 'share_plat',
+    'share_session_id', 'share_tag', 'share_from', 'unique_k', 'bbid', 'fbclid', 'gclid',
+}
+# 签名 URL 中表示绝对过期时间（Unix 时间戳）的参数
+_EXPIRY_PARAMS = ('deadline', 'expires', 'expire', 'x-expires', 'e', 'exp', 'wstime', 'txtime')
+
+
+def normalize_page_url(url: str) -> str:
+    """
+    规范化页面 URL：小写 scheme/host，去掉片段、跟踪参数，查询参数排序
+
+    Args:
+        url: 页面 URL
+
+    Returns:
+        str: 缓存键
+    """
+    parsed = urlparse(url.strip())
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if key.lower() not in _TRACKING_PARAMS and not key.lower().startswith('utm_')
+    )
+    path = parsed.path.rstrip('/') or '/'
+    return urlunparse((parsed.scheme.lower(), parsed.netloc.lower(), path, '', urlencode(query), ''))
+
+
+def url_expiry(url: str) -> Optional[float]:
+    """
+    从签名 URL 的查询参数推断过期时间
+
+    支持 deadline= / expires= / e= 等 Unix 时间戳（秒或毫秒，十进制或 wsTime/txTime 的十六进制），
+    以及 X-Amz-Date + X-Amz-Expires。
+
+    Args:
+        url: 媒体 URL
+
+    Returns:
+        Optional[float]: 过期时间（Unix 时间戳），无法判断时为 None
+    """
+    try:
+        params = {key.lower(): value for key, value in parse_qsl(urlparse(url).query)}
+    except ValueError:
+        return None
+    now = time.time()
+    candidates: List[float] = []
+    for name in _EXPIRY_PARAMS:
+        value = params.get(name)
+        if not value:
+            continue
+        base = 16 if name in ('wstime', 'txtime') else 10
+        try:
+            timestamp = float(int(value, base))
+        except ValueError:
+            continue
+        if timestamp > 1e12:
+            timestamp /= 1000
+        # 只接受看起来像时间戳的值（一年以内的过去到十年以内的未来）
+        if now - 365 * 86400 < timestamp < now + 10 * 365 * 86400:
+            candidates.append(timestamp)
+    amz_date, amz_expires = params.get('x-amz-date'), params.get('x-amz-expires')
+    if amz_date and amz_expires:
+        try:
+            signed = calendar.timegm(time.strptime(amz_date, '%Y%m%dT%H%M%SZ'))
+            candidates.append(signed + int(amz_expires))
+        except (ValueError, OverflowError):
+            pass
+    return min(candidates) if candidates else None
+
+
+def _walk_urls(value: object) -> Iterator[str]:
+    """遍历 JSON 结构中的所有 http(s) URL（用于 __playinfo__）"""
+    if isinstance(value, str):
+        if value.startswith(('http://', 'https://', '//')):
+            yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _walk_urls(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _walk_urls(item)
+
+
+class ResolutionCache:
+    """
+    页面 URL → 媒体 URL 的持久化缓存
+
+    线程安全；同一文件可由多个进程共享（SQLite 自带文件锁）。
+    """
+
+    def __init__(self, path: str, default_ttl: float = DEFAULT_RESOLUTION_TTL):
+        """
+        打开（或创建）缓存数据库
+
+        Args:
+            path: SQLite 文件路径
+            default_ttl: URL 中没有过期参数时的有效期（秒），同时也是有效期的上限
+        """
+        self.path = os.path.expanduser(path)
+        self.default_ttl = default_ttl
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS resolutions ("
+                " page_key TEXT PRIMARY KEY,"
+                " page_url TEXT NOT NULL,"
+                " media TEXT NOT NULL,"
+                " playinfo TEXT,"
+                " created REAL NOT NULL,"
+                " expires REAL NOT NULL)"
+            )
+
+    def get(self, page_url: str) -> Optional[Dict[str, object]]:
+        """
+        读取未过期的解析结果
+
+        Args:
+            page_url: 页面 URL
+
+        Returns:
+            Optional[Dict[str, object]]: {'media_urls': [...], 'headers': {url: headers}, 'playinfo': ...}；
+            未命中或已过期时为 None
+        """
+        key = normalize_page_url(page_url)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT media, playinfo, expires FROM resolutions WHERE page_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            media, playinfo, expires = row
+            if expires <= time.time():
+                with self._conn:
+                    self._conn.execute("DELETE FROM resolutions WHERE page_key = ?", (key,))
+                logger.debug(f"解析缓存已过期: {key}")
+                return None
+        try:
+            entries = json.loads(media)
+            return {
+                'media_urls': [entry['url'] for entry in entries],
+                'headers': {entry['url']: entry['headers'] for entry in entries if entry.get('headers')},
+                'playinfo': json.loads(playinfo) if playinfo else None,
+                'expires': expires,
+            }
+        except (ValueError, KeyError, TypeError) as err:
+            logger.warning(f"解析缓存数据损坏，已忽略: {err}")
+            self.invalidate(page_url)
+            return None
+
+    def put(
+        self,
+        page_url: str,
+        media_urls: Iterable[str],
+        headers: Optional[Dict[str, Dict[str, str]]] = None,
+        playinfo: Optional[Dict[str, object]] = None,
+    ) -> Optional[float]:
+        """
+        保存解析结果，有效期取所有媒体 URL（含 __playinfo__ 中的 URL）最早的过期时间
+
+        Args:
+            page_url: 页面 URL
+            media_urls: 捕获到的媒体 URL
+            headers: 媒体 URL → 下载请求头
+            playinfo: 页面 __playinfo__（可选）
+
+        Returns:
+            Optional[float]: 缓存过期时间；没有可缓存内容或已临近过期时为 None
+        """
+        media_urls = list(media_urls)
+        if not media_urls and not playinfo:
+            return None
+        headers = headers or {}
+        now = time.time()
+        expiries = [url_expiry(url) for url in [*media_urls, *_walk_urls(playinfo)]]
+        expires = min(
+            [now + self.default_ttl, *(expiry - EXPIRY_MARGIN for expiry in expiries if expiry)]
+        )
+        if expires <= now:
+            return None
+        media = json.dumps(
+            [{'url': url, 'headers': headers.get(url)} for url in media_urls], ensure_ascii=False
+        )
+        key = normalize_page_url(page_url)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO resolutions (page_key, page_url, media, playinfo, created, expires)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, page_url, media, json.dumps(playinfo, ensure_ascii=False) if playinfo else None, now, expires),
+            )
+        logger.info(f"已缓存页面解析结果（{len(media_urls)} 个媒体 URL，{(expires - now) / 60:.0f} 分钟内有效）")
+        return expires
+
+    def invalidate(self, page_url: str) -> None:
+        """删除页面的缓存（例如缓存的 URL 下载失败）"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM resolutions WHERE page_key = ?", (normalize_page_url(page_url),))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
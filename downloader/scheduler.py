@@ -0,0 +1,174 @@
+"""
+批量下载调度：全局并发上限 + 单 host 并发上限
+
+调度线程只会把任务交给空闲工作线程，并跳过已达上限的 host，避免慢 host 占满全部工作线程。
+run_batch_async 为协程版本，供异步下载路径在事件循环中使用。
+"""
+import asyncio
+import logging
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# 同时下载的文件数上限
+DEFAULT_MAX_DOWNLOADS = 4
+# 同一 host 同时下载的文件数上限
+DEFAULT_PER_HOST = 2
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+def host_of(url: str) -> str:
+    """URL 的 host（用于单 host 并发限制）"""
+    try:
+        return urlparse(url).netloc.lower()
+    except Exception:
+        return ''
+
+
+def run_batch(
+    items: List[T],
+    func: Callable[[int, T], R],
+    max_workers: int = DEFAULT_MAX_DOWNLOADS,
+    per_host: int = DEFAULT_PER_HOST,
+    key: Callable[[T], str] = host_of,
+    on_done: Optional[Callable[[int, T, Optional[R]], None]] = None,
+) -> List[Optional[R]]:
+    """
+    并发执行批量任务，遵守全局与单 host 的并发上限
+
+    Args:
+        items: 任务列表（通常为 URL）
+        func: 任务函数 func(index, item)，异常会被记录并视为返回 None
+        max_workers: 全局并发上限
+        per_host: 单 host 并发上限
+        key: 从任务中提取 host 的函数
+        on_done: 每个任务完成后的回调 on_done(index, item, result)，在工作线程中调用
+
+    Returns:
+        List[Optional[R]]: 与 items 顺序一致的结果列表
+    """
+    results: List[Optional[R]] = [None] * len(items)
+    if not items:
+        return results
+    max_workers = max(1, max_workers)
+    per_host = max(1, per_host)
+
+    condition = threading.Condition()
+    active_hosts: Counter = Counter()
+    state = {'running': 0}
+    pending = list(enumerate(items))
+
+    def worker(index: int, item: T, host: str) -> None:
+        result: Optional[R] = None
+        try:
+            result = func(index, item)
+        except Exception as err:
+            logger.error(f"任务执行失败 {item}: {err}")
+        results[index] = result
+        try:
+            if on_done is not None:
+                on_done(index, item, result)
+        finally:
+            with condition:
+                active_hosts[host] -= 1
+                state['running'] -= 1
+                condition.notify_all()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        with condition:
+            while pending:
+                chosen = None
+                if state['running'] < max_workers:
+                    for position, (index, item) in enumerate(pending):
+                        if active_hosts[key(item)] < per_host:
+                            chosen = position
+                            break
+                if chosen is None:
+                    condition.wait()
+                    continue
+                index, item = pending.pop(chosen)
+                host = key(item)
+                active_hosts[host] += 1
+                state['running'] += 1
+                executor.submit(worker, index, item, host)
+
+    return results
+
+
+async def run_batch_async(
+    items: List[T],
+    func: Callable[[int, T], Awaitable[R]],
+    max_workers: int = DEFAULT_MAX_DOWNLOADS,
+    per_host: int = DEFAULT_PER_HOST,
+    key: Callable[[T], str] = host_of,
+    on_done: Optional[Callable[[int, T, Optional[R]], None]] = None,
+) -> List[Optional[R]]:
+    """
+    并发执行批量协程任务，遵守全局与单 host 的并发上限（run_batch 的异步版本）
+
+    Args:
+        items: 任务列表（通常为 URL）
+        func: 协程函数 func(index, item)，异常会被记录并视为返回 None
+        max_workers: 全局并发上限
+        per_host: 单 host 并发上限
+        key: 从任务中提取 host 的函数
+        on_done: 每个任务完成后的回调 on_done(index, item, result)，在事件循环中调用
+
+    Returns:
+        List[Optional[R]]: 与 items 顺序一致的结果列表
+    """
+    results: List[Optional[R]] = [None] * len(items)
+    if not items:
+        return results
+    limiter = AsyncHostLimiter(max_workers, per_host)
+
+    async def worker(index: int, item: T) -> None:
+        result: Optional[R] = None
+        async with limiter.slot(key(item)):
+            try:
+                result = await func(index, item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                logger.error(f"任务执行失败 {item}: {err}")
+        results[index] = result
+        if on_done is not None:
+            on_done(index, item, result)
+
+    await asyncio.gather(*(worker(index, item) for index, item in enumerate(items)))
+    return results
+
+
+class AsyncHostLimiter:
+    """
+    协程版并发限制：全局上限 + 单 host 上限（需在事件循环中创建）
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_DOWNLOADS, per_host: int = DEFAULT_PER_HOST):
+        per_host = max(1, per_host)
+        self._global = asyncio.Semaphore(max(1, max_workers))
+        self._hosts: Dict[str, asyncio.Semaphore] = defaultdict(lambda: asyncio.Semaphore(per_host))
+
+    @asynccontextmanager
+    async def slot(self, host: Optional[str] = None) -> AsyncIterator[None]:
+        """
+        占用一个并发名额
+
+        Args:
+            host: 任务所属 host；为 None 时只受全局上限约束
+        """
+        if host is None:
+            async with self._global:
+                yield
+            return
+        # 先占 host 名额再占全局名额：已达上限的 host 排队时不占用全局名额
+        async with self._hosts[host]:
+            async with self._global:
+                yield
@@ -0,0 +1,449 @@
+"""
+分段并发下载：探测 Range 支持 → 切分字节区间 → 多连接并发拉取 → 按偏移写入预分配文件
+
+下载进度记录在 `<文件>.part.json` 旁路日志中，进程中断后重新运行会只请求缺失的区间。
+"""
+import json
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+import requests
+from .http_session import SessionPool, get_session
+try:
+    from tqdm import tqdm
+    TQDM_AVAILABLE = True
+except ImportError:
+    TQDM_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 默认并发连接数
+DEFAULT_CONNECTIONS = 4
+# 小于该大小的文件不值得拆分，直接单连接下载
+MIN_SEGMENTED_SIZE = 8 * 1024 * 1024
+# 每个分段最小字节数，避免把中等文件切得过碎
+MIN_SEGMENT_SIZE = 2 * 1024 * 1024
+# 分段下载时每次读取的块大小
+SEGMENT_READ_SIZE = 256 * 1024
+# 单个分段失败后的重试次数
+SEGMENT_RETRIES = 3
+# 每写入多少字节向旁路日志登记一次进度
+JOURNAL_FLUSH_BYTES = 4 * 1024 * 1024
+# 旁路日志后缀
+JOURNAL_SUFFIX = '.part.json'
+
+_CONTENT_RANGE_RE = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+|\*)', re.IGNORECASE)
+
+
+def probe_range_support(
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: int = 30,
+    session_pool: Optional[SessionPool] = None,
+) -> Optional[Dict[str, object]]:
+    """
+    探测服务器是否支持 Range 请求，并返回文件总大小与校验信息
+
+    使用 `Range: bytes=0-0` 的 GET 请求代替 HEAD，很多 CDN 的签名 URL 不接受 HEAD。
+
+    Args:
+        url: 视频URL
+        headers: HTTP 请求头
+        timeout: 超时时间（秒）
+        session_pool: HTTP 会话池（可选，默认使用进程级会话池）
+
+    Returns:
+        Optional[Dict[str, object]]: 支持 Range 时返回
+            {"total_size": int, "etag": str|None, "last_modified": str|None}，否则返回 None
+    """
+    probe_headers = dict(headers or {})
+    set_range_header(probe_headers, 'bytes=0-0')
+    try:
+        session = get_session(url, session_pool)
+        with session.get(url, headers=probe_headers, stream=True, timeout=timeout) as response:
+            return parse_probe_response(response.status_code, response.headers)
+    except requests.RequestException as err:
+        logger.debug(f"探测 Range 支持失败: {err}")
+        return None
+
+
+def parse_probe_response(status_code: int, headers) -> Optional[Dict[str, object]]:
+    """
+    解析 `Range: bytes=0-0` 探测请求的响应（同步与异步下载共用）
+
+    Args:
+        status_code: HTTP 状态码
+        headers: 响应头（大小写不敏感的映射）
+
+    Returns:
+        Optional[Dict[str, object]]: 同 probe_range_support
+    """
+    if status_code != 206:
+        logger.debug(f"服务器未返回 206 (status={status_code})，不支持分段下载")
+        return None
+    match = _CONTENT_RANGE_RE.search(headers.get('content-range', ''))
+    if not match or match.group(3) == '*':
+        logger.debug("Content-Range 缺少总大小，不支持分段下载")
+        return None
+    return {
+        'total_size': int(match.group(3)),
+        'etag': headers.get('etag'),
+        'last_modified': headers.get('last-modified'),
+    }
+
+
+def split_ranges(
+    total_size: int,
+    connections: int,
+    min_segment_size: int = MIN_SEGMENT_SIZE,
+) -> List[Tuple[int, int]]:
+    """
+    将文件切分为若干闭区间字节范围
+
+    Args:
+        total_size: 文件总字节数
+        connections: 期望的并发连接数
+        min_segment_size: 每段最小字节数
+
+    Returns:
+        List[Tuple[int, int]]: (start, end) 闭区间列表
+    """
+    if total_size <= 0:
+        return []
+    count = max(1, min(connections, total_size // max(min_segment_size, 1)))
+    segment_size = -(-total_size // count)  # 向上取整
+    ranges = []
+    start = 0
+    while start < total_size:
+        end = min(start + segment_size, total_size) - 1
+        ranges.append((start, end))
+        start = end + 1
+    return ranges
+
+
+def download_segmented(
+    url: str,
+    output_path: str,
+    remote: Dict[str, object],
+    headers: Optional[Dict[str, str]] = None,
+    connections: int = DEFAULT_CONNECTIONS,
+    read_size: int = SEGMENT_READ_SIZE,
+    session_pool: Optional[SessionPool] = None,
+    hasher=None,
+) -> bool:
+    """
+    多连接分段下载到预分配文件，支持断点续传
+
+    Args:
+        url: 视频URL
+        output_path: 输出文件路径
+        remote: probe_range_support 返回的远端文件信息
+        headers: HTTP 请求头
+        connections: 并发连接数
+        read_size: 每次读取的块大小
+        session_pool: HTTP 会话池（可选，默认使用进程级会话池）
+        hasher: 内容哈希器（可选，见 dedup_store.ContentHasher；传入时分段按哈希块边界切分）
+
+    Returns:
+        bool: 是否下载成功
+    """
+    filename = os.path.basename(output_path)
+    total_size = int(remote['total_size'])
+    session = get_session(url, session_pool)
+    journal = open_journal(output_path, remote)
+    ranges = plan_ranges(journal, connections, align=hasher.block_size if hasher is not None else 1)
+    logger.info(f"分段下载 {filename}: {total_size} bytes，{len(ranges)} 个分段，{connections} 个连接")
+
+    progress_lock = threading.Lock()
+    pbar = None
+    if TQDM_AVAILABLE:
+        pbar = tqdm(
+            total=total_size,
+            initial=journal.completed_bytes(),
+            unit='B',
+            unit_scale=True,
+            unit_divisor=1024,
+            desc=f"下载 {filename[:30]}",
+            ncols=100,
+        )
+
+    def on_progress(n: int) -> None:
+        if pbar is not None:
+            with progress_lock:
+                pbar.update(n)
+
+    failed = []
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(connections, len(ranges)))) as executor:
+            futures = {
+                executor.submit(
+                    _download_range,
+                    session, url, output_path, start, end, headers, read_size, on_progress, journal, hasher,
+                ): (start, end)
+                for start, end in ranges
+            }
+            for future in as_completed(futures):
+                start, end = futures[future]
+                try:
+                    future.result()
+                except Exception as err:
+                    logger.error(f"分段 {start}-{end} 下载失败: {err}")
+                    failed.append((start, end))
+    finally:
+        if pbar is not None:
+            pbar.close()
+
+    if failed or journal.missing_ranges():
+        logger.warning(f"下载未完成，进度已保存到 {journal.path}，重新运行即可续传")
+        return False
+    journal.remove()
+    logger.info(f"MP4 下载完成: {filename}")
+    return True
+
+
+def open_journal(output_path: str, remote: Dict[str, object]) -> 'RangeJournal':
+    """
+    读取可续传的旁路日志；不存在或已失效时预分配输出文件并新建日志
+
+    Args:
+        output_path: 输出文件路径
+        remote: probe_range_support 返回的远端文件信息
+
+    Returns:
+        RangeJournal: 本次下载使用的日志
+    """
+    total_size = int(remote['total_size'])
+    journal = RangeJournal.load(output_path, remote)
+    if journal is not None:
+        done = journal.completed_bytes()
+        logger.info(f"检测到未完成的下载 {os.path.basename(output_path)}，从 {done}/{total_size} bytes 续传")
+        return journal
+    journal = RangeJournal(output_path, remote)
+    # 预分配文件，各连接按偏移独立写入
+    with open(output_path, 'wb') as f:
+        f.truncate(total_size)
+    journal.save()
+    return journal
+
+
+def plan_ranges(journal: 'RangeJournal', connections: int, align: int = 1) -> List[Tuple[int, int]]:
+    """
+    将日志中缺失的区间切分为待下载的分段
+
+    Args:
+        journal: 续传日志
+        connections: 并发连接数
+        align: 分段边界对齐的字节数（边界向后取整到其整数倍，区间首尾不变）
+
+    Returns:
+        List[Tuple[int, int]]: (start, end) 闭区间列表
+    """
+    ranges = []
+    for gap_start, gap_end in journal.missing_ranges():
+        start = gap_start
+        for _, end in split_ranges(gap_end - gap_start + 1, connections):
+            end = gap_start + end
+            if align > 1 and end < gap_end:
+                end = min(gap_end, -(-(end + 1) // align) * align - 1)
+            if end >= start:
+                ranges.append((start, end))
+                start = end + 1
+    return ranges
+
+
+def _download_range(
+    session: requests.Session,
+    url: str,
+    output_path: str,
+    start: int,
+    end: int,
+    headers: Optional[Dict[str, str]],
+    read_size: int,
+    on_progress,
+    journal: Optional['RangeJournal'] = None,
+    hasher=None,
+) -> None:
+    """
+    下载单个字节区间并写入文件对应偏移；连接中断时从已写位置续传
+    """
+    position = start
+    recorded = start
+    last_error: Optional[Exception] = None
+    for attempt in range(SEGMENT_RETRIES + 1):
+        if position > end:
+            return
+        range_headers = dict(headers or {})
+        set_range_header(range_headers, f'bytes={position}-{end}')
+        try:
+            with session.get(url, headers=range_headers, stream=True, timeout=30) as response:
+                if response.status_code != 206:
+                    raise IOError(f"期望 206 分段响应，实际为 {response.status_code}")
+                # 每个线程使用独立文件句柄，seek 后顺序写入，互不干扰
+                with open(output_path, 'r+b') as f:
+                    f.seek(position)
+                    for chunk in response.iter_content(chunk_size=read_size):
+                        if not chunk:
+                            continue
+                        remaining = end - position + 1
+                        if len(chunk) > remaining:
+                            chunk = chunk[:remaining]
+                        f.write(chunk)
+                        if hasher is not None:
+                            hasher.update(position, chunk)
+                        position += len(chunk)
+                        on_progress(len(chunk))
+                        if journal is not None and position - recorded >= JOURNAL_FLUSH_BYTES:
+                            f.flush()
+                            journal.mark_completed(recorded, position - 1)
+                            recorded = position
+                        if position > end:
+                            break
+                    f.flush()
+            if journal is not None and position > recorded:
+                journal.mark_completed(recorded, position - 1)
+                recorded = position
+            if position > end:
+                return
+            last_error = IOError(f"连接提前结束，已下载到 {position}")
+        except (requests.RequestException, IOError) as err:
+            last_error = err
+            if journal is not None and position > recorded:
+                journal.mark_completed(recorded, position - 1)
+                recorded = position
+        logger.debug(f"分段 {start}-{end} 第 {attempt + 1} 次尝试中断: {last_error}")
+    raise last_error or IOError("分段下载失败")
+
+
+def set_range_header(headers: Dict[str, str], value: str) -> None:
+    """覆盖 Range 头（兼容任意大小写的已有键）"""
+    for key in [k for k in headers if k.lower() == 'range']:
+        headers.pop(key)
+    headers['Range'] = value
+
+
+class RangeJournal:
+    """
+    断点续传旁路日志：记录已完成的字节区间及远端文件的校验信息（ETag/Last-Modified/长度）
+    """
+
+    def __init__(self, output_path: str, remote: Dict[str, object]):
+        self.output_path = output_path
+        self.path = output_path + JOURNAL_SUFFIX
+        self.total_size = int(remote['total_size'])
+        self.etag = remote.get('etag')
+        self.last_modified = remote.get('last_modified')
+        self.completed: List[List[int]] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, output_path: str, remote: Dict[str, object]) -> Optional['RangeJournal']:
+        """
+        读取已有日志；远端文件已变化或本地文件缺失时丢弃日志并返回 None
+        """
+        path = output_path + JOURNAL_SUFFIX
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as err:
+            logger.debug(f"读取续传日志失败，重新下载: {err}")
+            _remove_quietly(path)
+            return None
+
+        journal = cls(output_path, remote)
+        stale = (
+            data.get('total_size') != journal.total_size
+            or (journal.etag and data.get('etag') and data['etag'] != journal.etag)
+            or (journal.last_modified and data.get('last_modified')
+                and data['last_modified'] != journal.last_modified)
+        )
+        if stale:
+            logger.info(f"远端文件已变化，丢弃续传日志: {os.path.basename(path)}")
+            _remove_quietly(path)
+            return None
+        if not os.path.exists(output_path) or os.path.getsize(output_path) != journal.total_size:
+            logger.debug("本地文件缺失或大小不符，丢弃续传日志")
+            _remove_quietly(path)
+            return None
+        for start, end in data.get('completed', []):
+            journal._add_range(int(start), int(end))
+        return journal
+
+    @staticmethod
+    def exists(output_path: str) -> bool:
+        """判断输出文件是否存在续传日志"""
+        return os.path.exists(output_path + JOURNAL_SUFFIX)
+
+    @staticmethod
+    def discard(output_path: str) -> None:
+        """删除输出文件对应的续传日志"""
+        _remove_quietly(output_path + JOURNAL_SUFFIX)
+
+    def mark_completed(self, start: int, end: int) -> None:
+        """登记已写入磁盘的闭区间并持久化"""
+        with self._lock:
+            self._add_range(start, end)
+            self._save_locked()
+
+    def missing_ranges(self) -> List[Tuple[int, int]]:
+        """返回尚未完成的闭区间列表"""
+        with self._lock:
+            gaps = []
+            position = 0
+            for start, end in self.completed:
+                if start > position:
+                    gaps.append((position, start - 1))
+                position = max(position, end + 1)
+            if position < self.total_size:
+                gaps.append((position, self.total_size - 1))
+            return gaps
+
+    def completed_bytes(self) -> int:
+        """已完成的字节数"""
+        with self._lock:
+            return sum(end - start + 1 for start, end in self.completed)
+
+    def save(self) -> None:
+        """持久化日志"""
+        with self._lock:
+            self._save_locked()
+
+    def remove(self) -> None:
+        """下载完成后删除日志"""
+        _remove_quietly(self.path)
+
+    def _add_range(self, start: int, end: int) -> None:
+        merged: List[List[int]] = []
+        for existing in sorted(self.completed + [[start, end]]):
+            if merged and existing[0] <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], existing[1])
+            else:
+                merged.append(list(existing))
+        self.completed = merged
+
+    def _save_locked(self) -> None:
+        data = {
+            'total_size': self.total_size,
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'completed': self.completed,
+        }
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as err:
+            logger.debug(f"写入续传日志失败: {err}")
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+    except OSError:
+        pass
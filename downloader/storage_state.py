@@ -0,0 +1,207 @@
+"""
+按站点缓存 Playwright storage_state（Cookie + localStorage）
+
+页面捕获结束时保存当前站点的状态，之后的新上下文（任意浏览器类型、浏览器池中的并行页面）
+加载缓存即可跳过登录 / Cookie 预热，不再依赖只能单进程使用的 --user-data-dir。
+Cookie 全部过期或缓存超过有效期时视为失效，本次不加载，捕获结束后重新保存。
+"""
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# 缓存的最长有效期（秒）
+DEFAULT_STATE_MAX_AGE = 7 * 24 * 3600
+
+
+def site_key(url: str) -> Optional[str]:
+    """
+    站点键：页面 host（去掉 www. 前缀）
+
+    Args:
+        url: 页面 URL
+
+    Returns:
+        Optional[str]: 站点键，URL 无 host 时为 None
+    """
+    try:
+        host = (urlparse(url).hostname or '').lower()
+    except ValueError:
+        return None
+    if host.startswith('www.'):
+        host = host[4:]
+    return host or None
+
+
+def _domain_related(domain: str, site: str) -> bool:
+    """Cookie 域与站点是否相关（互为子域名）"""
+    domain = domain.lstrip('.').lower()
+    return bool(domain) and (
+        site == domain or site.endswith('.' + domain) or domain.endswith('.' + site)
+    )
+
+
+class StorageStateCache:
+    """按站点保存 / 加载 storage_state 的目录缓存"""
+
+    def __init__(self, directory: str, max_age: float = DEFAULT_STATE_MAX_AGE):
+        """
+        初始化缓存
+
+        Args:
+            directory: 缓存目录（每个站点一个 JSON 文件）
+            max_age: 缓存有效期（秒），超过后视为失效
+        """
+        self.directory = os.path.expanduser(directory)
+        self.max_age = max_age
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path_for(self, url: str) -> Optional[str]:
+        """站点对应的缓存文件路径"""
+        site = site_key(url)
+        if not site:
+            return None
+        return os.path.join(self.directory, f"{site}.json")
+
+    def load(self, url: str) -> Optional[Dict[str, object]]:
+        """
+        读取站点缓存，去掉已过期的 Cookie
+
+        Args:
+            url: 页面 URL
+
+        Returns:
+            Optional[Dict[str, object]]: storage_state；不存在、无法解析或已失效时为 None
+        """
+        path = self.path_for(url)
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            age = time.time() - os.path.getmtime(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as err:
+            logger.warning(f"读取登录状态缓存失败 {path}: {err}")
+            return None
+        if age > self.max_age:
+            logger.info(f"登录状态缓存已超过有效期（{age / 3600:.1f} 小时），将重新获取: {path}")
+            return None
+        cookies = state.get('cookies') or []
+        now = time.time()
+        valid = [cookie for cookie in cookies if not _is_expired(cookie, now)]
+        persistent = [cookie for cookie in cookies if _expires_at(cookie) > 0]
+        if persistent and not any(_expires_at(cookie) > 0 for cookie in valid):
+            logger.info(f"登录状态缓存中的 Cookie 已全部过期，将重新获取: {path}")
+            return None
+        state['cookies'] = valid
+        logger.info(f"加载登录状态缓存: {path}（{len(valid)} 个 Cookie）")
+        return state
+
+    def save(self, url: str, state: Dict[str, object]) -> Optional[str]:
+        """
+        保存站点状态：只保留与站点相关的 Cookie 与同站点 origin 的 localStorage（原子写入）
+
+        Args:
+            url: 页面 URL
+            state: `BrowserContext.storage_state()` 的返回值
+
+        Returns:
+            Optional[str]: 缓存文件路径，站点无法识别或没有可保存的内容时为 None
+        """
+        path = self.path_for(url)
+        site = site_key(url)
+        if not path or not site:
+            return None
+        now = time.time()
+        cookies = [
+            cookie for cookie in state.get('cookies') or []
+            if _domain_related(str(cookie.get('domain', '')), site) and not _is_expired(cookie, now)
+        ]
+        origins = [
+            origin for origin in state.get('origins') or []
+            if _domain_related(site_key(str(origin.get('origin', ''))) or '', site)
+        ]
+        if not cookies and not origins:
+            return None
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'cookies': cookies, 'origins': origins}, f, ensure_ascii=False)
+            # 并行页面同时保存时以最后一次为准，读取方不会看到写了一半的文件
+            os.replace(tmp_path, path)
+        except OSError as err:
+            logger.warning(f"保存登录状态缓存失败 {path}: {err}")
+            return None
+        logger.debug(f"已保存登录状态缓存: {path}（{len(cookies)} 个 Cookie）")
+        return path
+
+
+def cookie_header(state: Dict[str, object], url: str) -> Optional[str]:
+    """
+    由 storage_state 生成请求 url 时使用的 Cookie 请求头（不经过浏览器直接请求页面时使用）
+
+    Args:
+        state: storage_state
+        url: 请求 URL
+
+    Returns:
+        Optional[str]: Cookie 请求头，没有匹配的 Cookie 时为 None
+    """
+    try:
+        host = (urlparse(url).hostname or '').lower()
+    except ValueError:
+        return None
+    now = time.time()
+    pairs = []
+    for cookie in state.get('cookies') or []:
+        domain = str(cookie.get('domain', '')).lstrip('.').lower()
+        if domain and (host == domain or host.endswith('.' + domain)) and not _is_expired(cookie, now):
+            pairs.append(f"{cookie['name']}={cookie['value']}")
+    return '; '.join(pairs) or None
+
+
+def local_storage_script(state: Dict[str, object]) -> Optional[str]:
+    """
+    生成恢复 localStorage 的初始化脚本（只写入页面中尚不存在的键）
+
+    Args:
+        state: storage_state
+
+    Returns:
+        Optional[str]: 脚本；没有 localStorage 时为 None
+    """
+    entries: Dict[str, List[List[str]]] = {}
+    for origin in state.get('origins') or []:
+        items = [[item['name'], item['value']] for item in origin.get('localStorage') or []]
+        if items:
+            entries[str(origin.get('origin'))] = items
+    if not entries:
+        return None
+    return (
+        "(() => {"
+        f" const items = ({json.dumps(entries, ensure_ascii=False)})[location.origin];"
+        " if (!items) return;"
+        " try {"
+        " for (const [name, value] of items) {"
+        " if (localStorage.getItem(name) === null) localStorage.setItem(name, value);"
+        " }"
+        " } catch (err) {}"
+        " })();"
+    )
+
+
+def _expires_at(cookie: Dict[str, object]) -> float:
+    try:
+        return float(cookie.get('expires', -1))
+    except (TypeError, ValueError):
+        return -1
+
+
+def _is_expired(cookie: Dict[str, object], now: float) -> bool:
+    """会话 Cookie（expires <= 0）不会过期"""
+    expires = _expires_at(cookie)
+    return 0 < expires <= now
@@ -0,0 +1,261 @@
+"""
+ffmpeg / ffprobe 工具链探测：每个进程只探测一次
+
+记录 ffmpeg 版本、支持的输入协议 / 解复用器 / 码流过滤器以及 ffprobe 是否存在，
+后续代码据此选择处理路径，不再为检查可用性反复启动子进程。
+可选地把探测结果缓存到磁盘（按可执行文件路径 + 修改时间失效），新进程连一次探测也不需要。
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import threading
+from typing import Dict, FrozenSet, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 单条探测命令的超时（秒）
+PROBE_TIMEOUT = 5
+
+_VERSION_RE = re.compile(r'^ffmpeg version (\S+)')
+# `ffmpeg -demuxers` 的条目行：" D  aac ..."、" DE mov,mp4,m4a ..."、" D d alsa ..."（新版本带设备标记列）
+_FORMAT_LINE_RE = re.compile(r'^ ([D ][E ][d ]?) (\S+)')
+
+_lock = threading.Lock()
+_toolchain: Optional['Toolchain'] = None
+_cache_path: Optional[str] = None
+
+
+class Toolchain:
+    """探测到的 ffmpeg / ffprobe 信息"""
+
+    def __init__(
+        self,
+        ffmpeg: Optional[str] = None,
+        ffprobe: Optional[str] = None,
+        version: Optional[str] = None,
+        protocols: Iterable[str] = (),
+        demuxers: Iterable[str] = (),
+        bitstream_filters: Iterable[str] = (),
+    ):
+        """
+        Args:
+            ffmpeg: ffmpeg 可执行文件路径，不可用时为 None
+            ffprobe: ffprobe 可执行文件路径，不可用时为 None
+            version: ffmpeg 版本号
+            protocols: 支持的输入协议
+            demuxers: 支持的解复用器
+            bitstream_filters: 支持的码流过滤器
+        """
+        self.ffmpeg = ffmpeg
+        self.ffprobe = ffprobe
+        self.version = version
+        self.protocols: FrozenSet[str] = frozenset(protocols)
+        self.demuxers: FrozenSet[str] = frozenset(demuxers)
+        self.bitstream_filters: FrozenSet[str] = frozenset(bitstream_filters)
+
+    @property
+    def available(self) -> bool:
+        """ffmpeg 是否可用"""
+        return self.ffmpeg is not None
+
+    def has_protocol(self, name: str) -> bool:
+        return name.lower() in self.protocols
+
+    def has_demuxer(self, name: str) -> bool:
+        return name.lower() in self.demuxers
+
+    def has_bitstream_filter(self, name: str) -> bool:
+        return name.lower() in self.bitstream_filters
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            'ffmpeg': self.ffmpeg,
+            'ffprobe': self.ffprobe,
+            'version': self.version,
+            'protocols': sorted(self.protocols),
+            'demuxers': sorted(self.demuxers),
+            'bitstream_filters': sorted(self.bitstream_filters),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, object]) -> 'Toolchain':
+        return cls(
+            ffmpeg=data.get('ffmpeg'),
+            ffprobe=data.get('ffprobe'),
+            version=data.get('version'),
+            protocols=data.get('protocols') or (),
+            demuxers=data.get('demuxers') or (),
+            bitstream_filters=data.get('bitstream_filters') or (),
+        )
+
+    def describe(self) -> str:
+        """用于日志的摘要"""
+        if not self.available:
+            return "ffmpeg 不可用"
+        return (
+            f"ffmpeg {self.version or '未知版本'}（{len(self.protocols)} 个协议，"
+            f"{len(self.demuxers)} 个解复用器，{len(self.bitstream_filters)} 个码流过滤器），"
+            f"ffprobe {'可用' if self.ffprobe else '不可用'}"
+        )
+
+
+def set_toolchain_cache(path: Optional[str]) -> None:
+    """
+    设置探测结果的磁盘缓存文件（需在第一次调用 get_toolchain 之前设置）
+
+    Args:
+        path: JSON 缓存文件路径，None 表示不使用磁盘缓存
+    """
+    global _cache_path
+    _cache_path = os.path.expanduser(path) if path else None
+
+
+def get_toolchain() -> Toolchain:
+    """
+    返回本进程的工具链信息（第一次调用时探测，之后直接返回）
+
+    Returns:
+        Toolchain: 工具链信息
+    """
+    global _toolchain
+    if _toolchain is not None:
+        return _toolchain
+    with _lock:
+        if _toolchain is None:
+            _toolchain = _load_or_probe()
+            logger.debug(_toolchain.describe())
+    return _toolchain
+
+
+def reset_toolchain() -> None:
+    """丢弃已探测的结果（安装 / 更换 ffmpeg 后重新探测）"""
+    global _toolchain
+    with _lock:
+        _toolchain = None
+
+
+def _load_or_probe() -> Toolchain:
+    ffmpeg = shutil.which('ffmpeg')
+    ffprobe = shutil.which('ffprobe')
+    key = _binary_key(ffmpeg, ffprobe)
+    cached = _read_cache(key)
+    if cached is not None:
+        return cached
+    toolchain = probe_toolchain(ffmpeg, ffprobe)
+    _write_cache(key, toolchain)
+    return toolchain
+
+
+def probe_toolchain(ffmpeg: Optional[str], ffprobe: Optional[str]) -> Toolchain:
+    """
+    运行 ffmpeg 探测版本与能力
+
+    Args:
+        ffmpeg: ffmpeg 可执行文件路径
+        ffprobe: ffprobe 可执行文件路径
+
+    Returns:
+        Toolchain: 工具链信息；ffmpeg 无法运行时 ffmpeg 为 None
+    """
+    if not ffmpeg:
+        return Toolchain(ffprobe=ffprobe)
+    version_output = _run(ffmpeg, '-version')
+    if version_output is None:
+        return Toolchain(ffprobe=ffprobe)
+    match = _VERSION_RE.match(version_output)
+    return Toolchain(
+        ffmpeg=ffmpeg,
+        ffprobe=ffprobe,
+        version=match.group(1) if match else None,
+        protocols=parse_protocols(_run(ffmpeg, '-hide_banner', '-protocols') or ''),
+        demuxers=parse_demuxers(_run(ffmpeg, '-hide_banner', '-demuxers') or ''),
+        bitstream_filters=parse_bitstream_filters(_run(ffmpeg, '-hide_banner', '-bsfs') or ''),
+    )
+
+
+def parse_protocols(output: str) -> FrozenSet[str]:
+    """解析 `ffmpeg -protocols` 输出中的输入协议"""
+    protocols = set()
+    section = None
+    for line in output.splitlines():
+        stripped = line.strip()
+        if stripped.endswith(':'):
+            section = stripped[:-1].lower()
+        elif stripped and section == 'input':
+            protocols.add(stripped.lower())
+    return frozenset(protocols)
+
+
+def parse_demuxers(output: str) -> FrozenSet[str]:
+    """解析 `ffmpeg -demuxers` 输出（"mov,mp4,m4a" 这样的别名逐个登记）"""
+    demuxers = set()
+    for line in output.splitlines():
+        match = _FORMAT_LINE_RE.match(line)
+        if match and 'D' in match.group(1):
+            demuxers.update(name.lower() for name in match.group(2).split(','))
+    return frozenset(demuxers)
+
+
+def parse_bitstream_filters(output: str) -> FrozenSet[str]:
+    """解析 `ffmpeg -bsfs` 输出"""
+    return frozenset(
+        line.strip().lower() for line in output.splitlines()
+        if line.strip() and not line.strip().endswith(':')
+    )
+
+
+def _run(binary: str, *args: str) -> Optional[str]:
+    try:
+        result = subprocess.run([binary, *args], capture_output=True, text=True, timeout=PROBE_TIMEOUT)
+    except (subprocess.TimeoutExpired, OSError) as err:
+        logger.debug(f"执行 {os.path.basename(binary)} {' '.join(args)} 失败: {err}")
+        return None
+    return result.stdout
+
+
+def _binary_key(*binaries: Optional[str]) -> str:
+    """可执行文件路径 + 大小 + 修改时间，任一变化时磁盘缓存失效"""
+    parts = []
+    for binary in binaries:
+        if not binary:
+            parts.append('-')
+            continue
+        try:
+            real = os.path.realpath(binary)
+            stat = os.stat(real)
+            parts.append(f"{real}:{stat.st_size}:{stat.st_mtime_ns}")
+        except OSError:
+            parts.append(binary)
+    return '|'.join(parts)
+
+
+def _read_cache(key: str) -> Optional[Toolchain]:
+    if not _cache_path or not os.path.exists(_cache_path):
+        return None
+    try:
+        with open(_cache_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as err:
+        logger.debug(f"读取工具链缓存失败: {err}")
+        return None
+    if data.get('key') != key:
+        return None
+    return Toolchain.from_dict(data.get('toolchain') or {})
+
+
+def _write_cache(key: str, toolchain: Toolchain) -> None:
+    if not _cache_path:
+        return
+    tmp_path = f"{_cache_path}.{os.getpid()}.tmp"
+    try:
+        directory = os.path.dirname(_cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'key': key, 'toolchain': toolchain.to_dict()}, f)
+        os.replace(tmp_path, _cache_path)
+    except OSError as err:
+        logger.debug(f"写入工具链缓存失败: {err}")
@@ -0,0 +1,238 @@
+"""
+MPEG-TS 片段的原生合并：同一路流的 TS 片段按顺序直接拼接即为合法的 TS 文件，不需要启动 ffmpeg
+
+- 拼接使用 os.copy_file_range / os.sendfile 在内核中复制，数据不经过 Python（均不可用时退回普通读写）
+- 拼接前通过 mmap 校验每个 188 字节包的 0x47 同步字节；不是标准 TS 的片段（加密、fMP4、M2TS 等）报错，由调用方回退到 ffmpeg
+- 在片段衔接处按 PID 比较连续性计数器（continuity_counter，上一片段末尾 / 下一片段开头），缺片段时给出警告，不中断合并；
+  逐包检查整个片段需要 Python 循环（约 6.5 s/GB），只在 full_check=True 时执行
+"""
+import logging
+import mmap
+import os
+import shutil
+from typing import Dict, List, Optional, Tuple
+from .container_sniff import TS_PACKET_SIZE, TS_SYNC_BYTE
+
+logger = logging.getLogger(__name__)
+
+# 空包 PID，不参与连续性检查
+TS_NULL_PID = 0x1FFF
+# 单次内核复制的最大字节数
+COPY_CHUNK_SIZE = 64 * 1024 * 1024
+# 衔接检查时在片段开头 / 末尾各扫描的包数（约 770 KB，足以覆盖 PAT、PMT 与音视频 PID）
+JOIN_SCAN_PACKETS = 4096
+
+
+class TsMergeError(Exception):
+    """片段不是可直接拼接的 MPEG-TS"""
+
+
+def check_ts_sync(data) -> int:
+    """
+    校验一段 TS 数据每个包的同步字节（切片 + count，不逐包循环）
+
+    Args:
+        data: TS 数据（bytes / mmap），长度须为 188 的整数倍
+
+    Returns:
+        int: 包数
+
+    Raises:
+        TsMergeError: 同步字节错误
+    """
+    packet_count = len(data) // TS_PACKET_SIZE
+    sync_bytes = data[0::TS_PACKET_SIZE]
+    if sync_bytes.count(TS_SYNC_BYTE) != packet_count:
+        position = next(index for index, byte in enumerate(sync_bytes) if byte != TS_SYNC_BYTE)
+        raise TsMergeError(f"第 {position} 个包的同步字节不是 0x47")
+    return packet_count
+
+
+def check_ts_join(data, counters: Dict[int, int]) -> int:
+    """
+    校验一个片段的同步字节，并只在片段衔接处检查连续性计数器
+
+    片段开头每个 PID 的第一个带负载包与上一片段末尾的计数器比较，随后 counters 替换为本片段末尾的计数器。
+    只扫描首尾各 JOIN_SCAN_PACKETS 个包，耗时与片段大小无关。
+
+    Args:
+        data: TS 数据（bytes / mmap），长度须为 188 的整数倍
+        counters: PID → 上一片段末尾带负载包的计数器（首个片段传入空字典）
+
+    Returns:
+        int: 衔接处连续性计数器不连续的 PID 数
+
+    Raises:
+        TsMergeError: 同步字节错误
+    """
+    packet_count = check_ts_sync(data)
+    window = min(packet_count, JOIN_SCAN_PACKETS)
+    discontinuities = 0
+    for pid, (index, byte3) in _edge_payload_packets(data, 0, window).items():
+        last = counters.get(pid)
+        counter = byte3 & 0x0F
+        if last is None or counter == (last + 1) & 0x0F or counter == last:
+            continue
+        if byte3 & 0x20 and _has_discontinuity_flag(data, index * TS_PACKET_SIZE):
+            continue
+        discontinuities += 1
+    tail = _edge_payload_packets(data, packet_count - window, packet_count, reverse=True)
+    counters.clear()
+    counters.update((pid, byte3 & 0x0F) for pid, (_, byte3) in tail.items())
+    return discontinuities
+
+
+def _edge_payload_packets(data, start: int, stop: int, reverse: bool = False) -> Dict[int, Tuple[int, int]]:
+    """第 [start, stop) 个包中每个 PID 的第一个（reverse 时为最后一个）带负载包：PID → (包序号, 第 4 字节)"""
+    begin = start * TS_PACKET_SIZE
+    end = stop * TS_PACKET_SIZE
+    headers = list(zip(
+        data[begin + 1:end:TS_PACKET_SIZE], data[begin + 2:end:TS_PACKET_SIZE], data[begin + 3:end:TS_PACKET_SIZE]
+    ))
+    indexes = range(start, stop)
+    packets = zip(reversed(indexes), reversed(headers)) if reverse else zip(indexes, headers)
+    found: Dict[int, Tuple[int, int]] = {}
+    for index, (byte1, byte2, byte3) in packets:
+        pid = ((byte1 & 0x1F) << 8) | byte2
+        if pid == TS_NULL_PID or not byte3 & 0x10 or pid in found:
+            continue
+        found[pid] = (index, byte3)
+    return found
+
+
+def check_ts_packets(data, counters: Dict[int, int]) -> int:
+    """
+    校验一段 TS 数据的同步字节，并逐包检查连续性计数器（完整检查，约 6.5 s/GB）
+
+    Args:
+        data: TS 数据（bytes / mmap），长度须为 188 的整数倍
+        counters: PID → 上一个带负载包的计数器，跨片段共享以检查片段衔接处
+
+    Returns:
+        int: 连续性计数器不连续的次数
+
+    Raises:
+        TsMergeError: 同步字节错误
+    """
+    check_ts_sync(data)
+    discontinuities = 0
+    headers = zip(data[1::TS_PACKET_SIZE], data[2::TS_PACKET_SIZE], data[3::TS_PACKET_SIZE])
+    for index, (byte1, byte2, byte3) in enumerate(headers):
+        pid = ((byte1 & 0x1F) << 8) | byte2
+        if pid == TS_NULL_PID or not byte3 & 0x10:
+            # 空包、不带负载的包计数器不递增
+            continue
+        counter = byte3 & 0x0F
+        last = counters.get(pid)
+        counters[pid] = counter
+        if last is None or counter == (last + 1) & 0x0F or counter == last:
+            # counter == last：允许的重复包
+            continue
+        if byte3 & 0x20 and _has_discontinuity_flag(data, index * TS_PACKET_SIZE):
+            continue
+        discontinuities += 1
+    return discontinuities
+
+
+def _has_discontinuity_flag(data, position: int) -> bool:
+    """适配域中的 discontinuity_indicator（编码器声明的不连续，不算错误）"""
+    return data[position + 4] > 0 and bool(data[position + 5] & 0x80)
+
+
+def concat_ts_files(ts_files: List[str], output_path: str, full_check: bool = False) -> int:
+    """
+    校验并按顺序拼接 TS 片段（先写入 .part，完成后替换为 output_path）
+
+    Args:
+        ts_files: 片段路径（已排序）
+        output_path: 输出文件路径
+        full_check: 是否逐包检查连续性计数器（默认只检查片段衔接处）
+
+    Returns:
+        int: 连续性计数器不连续的次数（0 表示片段衔接完整）
+
+    Raises:
+        TsMergeError: 某个片段不是标准 188 字节包的 TS
+        OSError: 读写失败
+    """
+    part_path = f"{output_path}.part"
+    counters: Dict[int, int] = {}
+    discontinuities = 0
+    broken: List[str] = []
+    try:
+        with open(part_path, 'wb') as output:
+            for ts_file in ts_files:
+                size, count = _check_segment(ts_file, counters, full_check)
+                if count:
+                    discontinuities += count
+                    broken.append(os.path.basename(ts_file))
+                _copy_into(ts_file, output, size)
+        os.replace(part_path, output_path)
+    except BaseException:
+        _remove_quietly(part_path)
+        raise
+    if discontinuities:
+        shown = ', '.join(broken[:5]) + (' ...' if len(broken) > 5 else '')
+        logger.warning(f"TS 连续性计数器不连续 {discontinuities} 次（可能缺少片段）: {shown}")
+    return discontinuities
+
+
+def _check_segment(path: str, counters: Dict[int, int], full_check: bool) -> Tuple[int, int]:
+    """校验单个片段，返回 (大小, 不连续次数)"""
+    check = check_ts_packets if full_check else check_ts_join
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        name = os.path.basename(path)
+        if size == 0 or size % TS_PACKET_SIZE:
+            raise TsMergeError(f"{name} 大小 {size} 不是 {TS_PACKET_SIZE} 的整数倍")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            try:
+                return size, check(data, counters)
+            except TsMergeError as err:
+                raise TsMergeError(f"{name}: {err}") from None
+
+
+def _copy_into(path: str, output, size: int) -> None:
+    """把整个文件追加到 output 当前位置（优先内核内复制）"""
+    with open(path, 'rb') as source:
+        output.flush()
+        copied = _kernel_copy(source.fileno(), output.fileno(), size)
+        if copied < size:
+            # 内核复制不可用（或中途失败）时从已复制位置继续普通读写
+            source.seek(copied)
+            output.seek(0, os.SEEK_END)
+            shutil.copyfileobj(source, output)
+
+
+def _kernel_copy(source_fd: int, output_fd: int, size: int) -> int:
+    """copy_file_range → sendfile，返回已复制的字节数"""
+    copied = 0
+    copy_file_range = getattr(os, 'copy_file_range', None)
+    while copied < size and copy_file_range is not None:
+        try:
+            sent = copy_file_range(source_fd, output_fd, min(COPY_CHUNK_SIZE, size - copied), copied)
+        except OSError as err:
+            # 跨文件系统（旧内核 EXDEV）、文件系统不支持等
+            logger.debug(f"copy_file_range 不可用，改用 sendfile: {err}")
+            break
+        if sent == 0:
+            break
+        copied += sent
+    while copied < size and hasattr(os, 'sendfile'):
+        try:
+            sent = os.sendfile(output_fd, source_fd, copied, min(COPY_CHUNK_SIZE, size - copied))
+        except OSError as err:
+            logger.debug(f"sendfile 不可用，改用普通读写: {err}")
+            break
+        if sent == 0:
+            break
+        copied += sent
+    return copied
+
+
+def _remove_quietly(path: Optional[str]) -> None:
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
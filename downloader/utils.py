@@ -1,14 +1,42 @@
 """
 公共工具模块：视频下载功能（mp4/m3u8）、公共工具
 """
+import functools
 import os
 import subprocess
 import logging
-import requests
 import re
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Set
 from urllib.parse import urlparse
+from .http_session import SessionPool, get_session
+from .hls import (
+    DEFAULT_HLS_WORKERS,
+    DEFAULT_QUALITY,
+    UnsupportedPlaylistError,
+    download_hls,
+    drop_sibling_variants,
+)
+from .dash import (
+    DEFAULT_CODEC_PREFERENCE,
+    download_representation_segments,
+    fetch_mpd,
+    select_representations,
+)
+from .dedup_store import ContentHasher, DedupStore, fetch_tail, is_intermediate, probe_prefix
+from .toolchain import get_toolchain
+from .container_sniff import sniff_stream_counts
+from .media_probe import describe_media, get_media_probe, probe_media_many, stream_counts
+from .ts_merge import TsMergeError, concat_ts_files
+from .postprocess import DEFAULT_POSTPROCESS_JOBS, run_postprocess_jobs
+from .scheduler import DEFAULT_MAX_DOWNLOADS, DEFAULT_PER_HOST, run_batch
+from .segmented_download import (
+    DEFAULT_CONNECTIONS,
+    MIN_SEGMENTED_SIZE,
+    RangeJournal,
+    download_segmented,
+    probe_range_support,
+)
 try:
     from tqdm import tqdm
     TQDM_AVAILABLE = True
@@ -35,15 +63,26 @@ def download_mp4(
     output_path: str,
     chunk_size: int = 8192,
     headers: Optional[Dict[str, str]] = None,
+    connections: int = DEFAULT_CONNECTIONS,
+    session_pool: Optional[SessionPool] = None,
+    remote: Optional[Dict[str, object]] = None,
+    hasher: Optional[ContentHasher] = None,
 ) -> bool:
     """
     下载 MP4 视频文件
     
+    服务器支持 Range 且文件足够大时使用多连接分段下载（带断点续传日志），
+    否则回退到单连接流式下载。
+    
     Args:
         url: 视频URL
         output_path: 输出文件路径
         chunk_size: 下载块大小
         headers: HTTP 请求头
+        connections: 分段下载的并发连接数（1 表示单连接）
+        session_pool: HTTP 会话池（可选，默认使用进程级会话池）
+        remote: 已探测到的远端文件信息（可选，传入时不再发送探测请求）
+        hasher: 内容哈希器（可选，下载时同时计算内容哈希）
         
     Returns:
         bool: 是否下载成功
@@ -51,7 +90,27 @@ def download_mp4(
     try:
         filename = os.path.basename(output_path)
         logger.info(f"开始下载 MP4: {filename}")
-        response = requests.get(url, stream=True, timeout=30, headers=headers)
+        
+        if remote is None:
+            remote = probe_range_support(url, headers=headers, session_pool=session_pool)
+        if remote:
+            # 大文件或存在未完成的续传日志时走分段下载（带断点续传）
+            if remote['total_size'] >= MIN_SEGMENTED_SIZE or RangeJournal.exists(output_path):
+                os.makedirs(os.path.dirname(output_path) if os.path.dirname(output_path) else '.', exist_ok=True)
+                return download_segmented(
+                    url,
+                    output_path,
+                    remote,
+                    headers=headers,
+                    connections=max(1, connections),
+                    session_pool=session_pool,
+                    hasher=hasher,
+                )
+        else:
+            # 服务器不支持 Range，旧的续传日志无法使用
+            RangeJournal.discard(output_path)
+        
+        response = get_session(url, session_pool).get(url, stream=True, timeout=30, headers=headers)
         response.raise_for_status()
         
         total_size = int(response.headers.get('content-length', 0))
@@ -75,6 +134,8 @@ def download_mp4(
                     for chunk in response.iter_content(chunk_size=chunk_size):
                         if chunk:
                             f.write(chunk)
+                            if hasher is not None:
+                                hasher.update(downloaded, chunk)
                             downloaded += len(chunk)
                             pbar.update(len(chunk))
             else:
@@ -90,6 +151,8 @@ def download_mp4(
                         for chunk in response.iter_content(chunk_size=chunk_size):
                             if chunk:
                                 f.write(chunk)
+                                if hasher is not None:
+                                    hasher.update(downloaded, chunk)
                                 downloaded += len(chunk)
                                 pbar.update(len(chunk))
                 else:
@@ -97,6 +160,8 @@ def download_mp4(
                     for chunk in response.iter_content(chunk_size=chunk_size):
                         if chunk:
                             f.write(chunk)
+                            if hasher is not None:
+                                hasher.update(downloaded, chunk)
                             downloaded += len(chunk)
                             if total_size > 0:
                                 percent = (downloaded / total_size) * 100
@@ -110,32 +175,261 @@ def download_mp4(
         return False
 
 
-def download_m3u8(url: str, output_path: str) -> bool:
+def download_m3u8(
+    url: str,
+    output_path: str,
+    headers: Optional[Dict[str, str]] = None,
+    session_pool: Optional[SessionPool] = None,
+    workers: int = DEFAULT_HLS_WORKERS,
+    quality: str = DEFAULT_QUALITY,
+    playlists: Optional[Dict[str, Dict[str, object]]] = None,
+) -> bool:
     """
-    使用 ffmpeg 下载并合并 m3u8 视频
+    下载并合并 m3u8 视频
+    
+    优先使用原生 HLS 引擎并发拉取分片（携带捕获的请求头），再用 ffmpeg 做本地 remux；
+    原生引擎无法处理的播放列表回退到 ffmpeg 直接下载。
     
     Args:
         url: m3u8 URL
         output_path: 输出文件路径
+        headers: HTTP 请求头（Cookie/Referer 等）
+        session_pool: HTTP 会话池（可选）
+        workers: 并发拉取分片的线程数
+        quality: 主播放列表的码流选择策略（best / worst / <=1080p / max-bitrate=...）
+        playlists: 已下载的播放列表缓存（可选，见 hls.drop_sibling_variants）
         
     Returns:
         bool: 是否下载成功
     """
+    filename = os.path.basename(output_path)
+    logger.info(f"开始下载 m3u8: {filename}")
+    
+    # 检查 ffmpeg 是否可用
+    if not check_ffmpeg_available():
+        logger.error("ffmpeg 未安装或不在 PATH 中")
+        return False
+    
+    os.makedirs(os.path.dirname(output_path) if os.path.dirname(output_path) else '.', exist_ok=True)
+    
+    stream_path = os.path.splitext(output_path)[0] + '.hls.part'
     try:
-        filename = os.path.basename(output_path)
-        logger.info(f"开始下载 m3u8: {filename}")
+        container = download_hls(
+            url,
+            stream_path,
+            headers=headers,
+            session_pool=session_pool,
+            workers=workers,
+            quality=quality,
+            playlists=playlists,
+        )
+    except UnsupportedPlaylistError as err:
+        logger.info(f"原生 HLS 引擎不支持该播放列表（{err}），回退到 ffmpeg 下载")
+        _delete_file_safely(stream_path)
+        return _download_m3u8_ffmpeg(url, output_path, headers=headers)
+    except Exception as e:
+        logger.error(f"下载 m3u8 失败 {url}: {e}")
+        _delete_file_safely(stream_path)
+        return False
+    
+    try:
+        success = remux_to_mp4(stream_path, output_path, input_format='mpegts' if container == 'ts' else None)
+    finally:
+        _delete_file_safely(stream_path)
+    if success:
+        logger.info(f"m3u8 下载完成: {filename}")
+    return success
+
+
+def download_mpd(
+    url: str,
+    output_path: str,
+    headers: Optional[Dict[str, str]] = None,
+    session_pool: Optional[SessionPool] = None,
+    connections: int = DEFAULT_CONNECTIONS,
+    quality: str = DEFAULT_QUALITY,
+    codec_preference: str = DEFAULT_CODEC_PREFERENCE,
+) -> bool:
+    """
+    下载 DASH MPD 清单对应的视频（只下载选中的一路视频 + 一路音频）
+    
+    Args:
+        url: MPD URL
+        output_path: 输出文件路径
+        headers: HTTP 请求头
+        session_pool: HTTP 会话池（可选）
+        connections: 单个文件的并发连接数（整文件分段 / 分片并发）
+        quality: 画质策略
+        codec_preference: 视频编码偏好
+        
+    Returns:
+        bool: 是否下载成功
+    """
+    try:
+        logger.info(f"开始下载 DASH: {os.path.basename(output_path)}")
+        manifest = fetch_mpd(url, headers=headers, session_pool=session_pool)
+    except Exception as e:
+        logger.error(f"解析 MPD 失败 {url}: {e}")
+        return False
+    return download_dash(
+        manifest,
+        output_path,
+        headers=headers,
+        session_pool=session_pool,
+        connections=connections,
+        quality=quality,
+        codec_preference=codec_preference,
+    )
+
+
+def download_dash(
+    manifest: Dict[str, object],
+    output_path: str,
+    headers: Optional[Dict[str, str]] = None,
+    session_pool: Optional[SessionPool] = None,
+    connections: int = DEFAULT_CONNECTIONS,
+    quality: str = DEFAULT_QUALITY,
+    codec_preference: str = DEFAULT_CODEC_PREFERENCE,
+) -> bool:
+    """
+    按策略选出一路视频与一路音频下载，并用 ffmpeg 合并为 MP4
+    
+    Args:
+        manifest: dash.parse_mpd / dash.parse_playinfo 的解析结果
+        output_path: 输出文件路径
+        headers: HTTP 请求头
+        session_pool: HTTP 会话池（可选）
+        connections: 单个文件的并发连接数（整文件分段 / 分片并发）
+        quality: 画质策略
+        codec_preference: 视频编码偏好
         
-        # 检查 ffmpeg 是否可用
+    Returns:
+        bool: 是否下载成功
+    """
+    video, audio = select_representations(
+        manifest['representations'], quality=quality, codec_preference=codec_preference
+    )
+    if not video and not audio:
+        logger.error("DASH 清单中没有可下载的音视频表示")
+        return False
+    
+    os.makedirs(os.path.dirname(output_path) if os.path.dirname(output_path) else '.', exist_ok=True)
+    stem = os.path.splitext(output_path)[0]
+    track_paths = []
+    try:
+        for rep, suffix in ((video, '.video.m4s'), (audio, '.audio.m4s')):
+            if not rep:
+                continue
+            track_path = stem + suffix
+            if not _download_representation(rep, track_path, headers, session_pool, connections):
+                return False
+            track_paths.append(track_path)
+        
+        if len(track_paths) == 1:
+            os.replace(track_paths[0], output_path)
+            track_paths = []
+            return True
         if not check_ffmpeg_available():
-            logger.error("ffmpeg 未安装或不在 PATH 中")
+            logger.error("ffmpeg 不可用，已保留分离的音视频轨")
+            track_paths = []
             return False
+        return mux_streams(track_paths[0], track_paths[1], output_path)
+    finally:
+        for track_path in track_paths:
+            _delete_file_safely(track_path)
+
+
+def _download_representation(
+    rep: Dict[str, object],
+    output_path: str,
+    headers: Optional[Dict[str, str]],
+    session_pool: Optional[SessionPool],
+    connections: int,
+) -> bool:
+    """下载单个 DASH 表示：分片式并发拉取，整文件式按 MP4 分段下载（依次尝试备用地址）"""
+    if rep['segments']:
+        try:
+            download_representation_segments(
+                rep, output_path, headers=headers, session_pool=session_pool, workers=connections
+            )
+            return True
+        except Exception as e:
+            logger.error(f"下载 DASH 分片失败: {e}")
+            return False
+    for url in [rep['base_url'], *rep['backup_urls']]:
+        if url and download_mp4(
+            url, output_path, headers=headers, connections=connections, session_pool=session_pool
+        ):
+            return True
+        logger.warning(f"DASH 地址下载失败，尝试备用地址: {url}")
+    return False
+
+
+def remux_to_mp4(input_path: str, output_path: str, input_format: Optional[str] = None) -> bool:
+    """
+    使用 ffmpeg 将本地文件无损转封装为 MP4
+    
+    Args:
+        input_path: 输入文件路径
+        output_path: 输出 MP4 路径
+        input_format: 强制指定输入格式（例如 "mpegts"）
         
-        os.makedirs(os.path.dirname(output_path) if os.path.dirname(output_path) else '.', exist_ok=True)
+    Returns:
+        bool: 是否转换成功
+    """
+    cmd = ['ffmpeg', '-y', '-loglevel', 'error']
+    if input_format:
+        cmd += ['-f', input_format]
+    cmd += ['-i', input_path, '-c', 'copy', output_path]
+    logger.debug(f"执行命令: {' '.join(cmd)}")
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+    except subprocess.TimeoutExpired:
+        logger.error("ffmpeg 转封装超时")
+        return False
+    except FileNotFoundError:
+        logger.error("未找到 ffmpeg，请确认已安装并在 PATH 中")
+        return False
+    if result.returncode == 0 and os.path.exists(output_path):
+        return True
+    logger.error(f"ffmpeg 转封装失败: {result.stderr.strip()[-500:]}")
+    return False
+
+
+def _download_m3u8_ffmpeg(
+    url: str,
+    output_path: str,
+    headers: Optional[Dict[str, str]] = None,
+) -> bool:
+    """
+    使用 ffmpeg 直接下载并合并 m3u8 视频（原生引擎的回退路径）
+    
+    Args:
+        url: m3u8 URL
+        output_path: 输出文件路径
+        headers: HTTP 请求头，通过 `-headers` 传递给 ffmpeg
+        
+    Returns:
+        bool: 是否下载成功
+    """
+    scheme = urlparse(url).scheme.lower()
+    toolchain = get_toolchain()
+    if toolchain.protocols and not toolchain.has_protocol(scheme):
+        logger.error(f"ffmpeg 不支持 {scheme} 协议，无法下载: {url}")
+        return False
+    try:
+        filename = os.path.basename(output_path)
         
         # 使用 ffmpeg 下载并合并
-        cmd = [
-            'ffmpeg',
-            '-y',  # 覆盖输出文件
+        cmd = ['ffmpeg', '-y']  # 覆盖输出文件
+        header_lines = ''.join(
+            f"{key}: {value}\r\n"
+            for key, value in (headers or {}).items()
+            if key.lower() != 'range'
+        )
+        if header_lines:
+            cmd += ['-headers', header_lines]
+        cmd += [
             '-i', url,
             '-c', 'copy',  # 直接复制流，不重新编码
             '-progress', 'pipe:1',  # 将进度输出到 stdout
@@ -273,20 +567,12 @@ def download_m3u8(url: str, output_path: str) -> bool:
 
 def check_ffmpeg_available() -> bool:
     """
-    检查 ffmpeg 是否可用
+    检查 ffmpeg 是否可用（每个进程只探测一次，见 toolchain.get_toolchain）
     
     Returns:
         bool: ffmpeg 是否可用
     """
-    try:
-        subprocess.run(
-            ['ffmpeg', '-version'],
-            capture_output=True,
-            timeout=5
-        )
-        return True
-    except (subprocess.TimeoutExpired, FileNotFoundError):
-        return False
+    return get_toolchain().available
 
 
 def is_video_url(url: str) -> bool:
@@ -366,6 +652,12 @@ def download_video(
     filename: Optional[str] = None,
     index: Optional[int] = None,
     headers: Optional[Dict[str, str]] = None,
+    connections: int = DEFAULT_CONNECTIONS,
+    session_pool: Optional[SessionPool] = None,
+    quality: str = DEFAULT_QUALITY,
+    codec_preference: str = DEFAULT_CODEC_PREFERENCE,
+    dedup_store: Optional[DedupStore] = None,
+    playlists: Optional[Dict[str, Dict[str, object]]] = None,
 ) -> Optional[str]:
     """
     通用视频下载函数，自动识别 mp4 或 m3u8
@@ -375,9 +667,16 @@ def download_video(
         output_dir: 输出目录
         filename: 指定文件名（可选）
         index: 视频索引（用于多个视频时）
+        headers: HTTP 请求头
+        connections: 单个文件的并发连接数（MP4 分段 / HLS、DASH 分片）
+        session_pool: HTTP 会话池（可选，默认使用进程级会话池）
+        quality: m3u8 主播放列表 / DASH 的画质选择策略
+        codec_preference: DASH 视频编码偏好
+        dedup_store: 内容去重存储（可选，只用于直接下载的单个文件）
+        playlists: 已下载的播放列表缓存（可选，m3u8 命中时不再重复请求）
         
     Returns:
-        Optional[str]: 下载成功返回文件路径，失败返回 None
+        Optional[str]: 下载成功返回文件路径（去重时可能是已有文件），失败返回 None
     """
     try:
         os.makedirs(output_dir, exist_ok=True)
@@ -391,17 +690,43 @@ def download_video(
         parsed_path = urlparse(url).path.lower()
         binary_exts = ['.mp4', '.m4s', '.webm', '.flv', '.avi', '.mov']
         
-        if '.m3u8' in url_lower:
+        if parsed_path.endswith('.mpd'):
+            if output_path.endswith('.mpd'):
+                output_path = os.path.splitext(output_path)[0] + '.mp4'
+            success = download_mpd(
+                url,
+                output_path,
+                headers=headers,
+                session_pool=session_pool,
+                connections=connections,
+                quality=quality,
+                codec_preference=codec_preference,
+            )
+        elif '.m3u8' in url_lower:
             # 确保 m3u8 输出为 .mp4 格式
             if output_path.endswith('.m3u8'):
                 output_path = os.path.splitext(output_path)[0] + '.mp4'
-            success = download_m3u8(url, output_path)
+            success = download_m3u8(
+                url,
+                output_path,
+                headers=headers,
+                session_pool=session_pool,
+                workers=connections,
+                quality=quality,
+                playlists=playlists,
+            )
+        elif dedup_store is not None and not is_intermediate(output_path):
+            return _download_deduplicated(url, output_path, headers, connections, session_pool, dedup_store)
         elif any(parsed_path.endswith(ext) for ext in binary_exts) or url_lower.startswith('http'):
             # 假设是 mp4 或其他视频格式
-            success = download_mp4(url, output_path, headers=headers)
+            success = download_mp4(
+                url, output_path, headers=headers, connections=connections, session_pool=session_pool
+            )
         else:
             logger.warning(f"无法识别视频格式，尝试作为 MP4 下载: {url}")
-            success = download_mp4(url, output_path, headers=headers)
+            success = download_mp4(
+                url, output_path, headers=headers, connections=connections, session_pool=session_pool
+            )
         
         if success and os.path.exists(output_path):
             return output_path
@@ -412,47 +737,140 @@ def download_video(
         return None
 
 
+def _download_deduplicated(
+    url: str,
+    output_path: str,
+    headers: Optional[Dict[str, str]],
+    connections: int,
+    session_pool: Optional[SessionPool],
+    dedup_store: DedupStore,
+) -> Optional[str]:
+    """
+    先按 URL、前缀哈希（+ 末尾区间）查找已有内容，未命中时边下载边计算哈希并登记
+
+    前缀探测请求同时完成 Range 探测，不额外增加请求数。
+    """
+    existing = dedup_store.find_by_url(url)
+    if existing is None:
+        remote, prefix = probe_prefix(url, headers=headers, session_pool=session_pool)
+        # 前缀哈希相同只是候选，再比较末尾区间确认
+        if prefix is not None and remote is not None and dedup_store.has_prefix(prefix):
+            tail = fetch_tail(url, int(remote['total_size']), headers=headers, session_pool=session_pool)
+            if tail is not None:
+                existing = dedup_store.find_by_prefix(url, prefix, tail)
+    if existing is not None:
+        return dedup_store.materialize(existing, output_path)
+    hasher = ContentHasher()
+    success = download_mp4(
+        url,
+        output_path,
+        headers=headers,
+        connections=connections,
+        session_pool=session_pool,
+        remote=remote,
+        hasher=hasher,
+    )
+    if not success or not os.path.exists(output_path):
+        return None
+    return dedup_store.add_file(url, output_path, hasher)
+
+
 def download_videos(
     video_urls: List[str],
     output_dir: str,
     headers_map: Optional[Dict[str, Dict[str, str]]] = None,
+    connections: int = DEFAULT_CONNECTIONS,
+    session_pool: Optional[SessionPool] = None,
+    quality: str = DEFAULT_QUALITY,
+    codec_preference: str = DEFAULT_CODEC_PREFERENCE,
+    max_downloads: int = DEFAULT_MAX_DOWNLOADS,
+    per_host: int = DEFAULT_PER_HOST,
+    on_done=None,
+    dedup_store: Optional[DedupStore] = None,
 ) -> List[str]:
     """
-    批量下载视频
+    批量下载视频（并发，遵守全局与单 host 并发上限）
     
     Args:
         video_urls: 视频URL列表
         output_dir: 输出目录
+        headers_map: URL → HTTP 请求头
+        connections: 单个文件的并发连接数（MP4 分段 / HLS、DASH 分片）
+        session_pool: HTTP 会话池（可选，未传入时为本批次创建并在结束后关闭）
+        quality: m3u8 主播放列表 / DASH 的画质选择策略
+        codec_preference: DASH 视频编码偏好
+        max_downloads: 同时下载的文件数上限
+        per_host: 同一 host 同时下载的文件数上限
+        on_done: 每个文件完成后的回调 on_done(url, file_path)，在工作线程中调用
+        dedup_store: 内容去重存储（可选）
         
     Returns:
-        List[str]: 成功下载的文件路径列表
+        List[str]: 成功下载的文件路径列表（与输入顺序一致）
     """
-    downloaded_files = []
+    owns_pool = session_pool is None
+    if owns_pool:
+        session_pool = SessionPool()
     
-    for i, url in enumerate(video_urls):
-        logger.info(f"下载视频 {i+1}/{len(video_urls)}: {url}")
-        headers = headers_map.get(url) if headers_map else None
-        file_path = download_video(
-            url,
-            output_dir,
-            index=i if len(video_urls) > 1 else None,
-            headers=headers,
+    try:
+        # 过滤码流时下载的播放列表留给各 m3u8 下载直接使用
+        playlists: Dict[str, Dict[str, object]] = {}
+        video_urls = drop_sibling_variants(video_urls, headers_map, session_pool, playlists)
+        total = len(video_urls)
+        
+        def download_one(i: int, url: str) -> Optional[str]:
+            logger.info(f"下载视频 {i+1}/{total}: {url}")
+            headers = headers_map.get(url) if headers_map else None
+            file_path = download_video(
+                url,
+                output_dir,
+                index=i if total > 1 else None,
+                headers=headers,
+                connections=connections,
+                session_pool=session_pool,
+                quality=quality,
+                codec_preference=codec_preference,
+                dedup_store=dedup_store,
+                playlists=playlists,
+            )
+            if not file_path:
+                logger.warning(f"跳过失败的视频: {url}")
+            return file_path
+        
+        def report(i: int, url: str, file_path: Optional[str]) -> None:
+            if on_done is not None:
+                on_done(url, file_path)
+        
+        results = run_batch(
+            video_urls,
+            download_one,
+            max_workers=max_downloads,
+            per_host=per_host,
+            on_done=report,
         )
-        if file_path:
-            downloaded_files.append(file_path)
-        else:
-            logger.warning(f"跳过失败的视频: {url}")
+    finally:
+        if owns_pool:
+            session_pool.close()
     
-    return downloaded_files
+    # 跳过模式下不同 URL 可能复用同一个已有文件
+    return list(dict.fromkeys(path for path in results if path))
 
 
-def auto_mux_downloads(downloaded_files: List[str], output_dir: str) -> List[str]:
+def auto_mux_downloads(
+    downloaded_files: List[str],
+    output_dir: str,
+    postprocess_jobs: int = DEFAULT_POSTPROCESS_JOBS,
+    postprocess_per_disk: Optional[int] = None,
+) -> List[str]:
     """
     自动检测并合并分离的音视频流（例如 Bilibili DASH 的 .m4s）
     
+    各组音视频的合并相互独立，并行执行。
+    
     Args:
         downloaded_files: 下载得到的原始文件路径
         output_dir: 输出目录
+        postprocess_jobs: 同时运行的合并任务数上限
+        postprocess_per_disk: 同一磁盘上同时运行的合并任务数上限（None 表示按磁盘类型决定）
         
     Returns:
         List[str]: 成功合并后的文件路径列表
@@ -467,8 +885,13 @@ def auto_mux_downloads(downloaded_files: List[str], output_dir: str) -> List[str
     video_only: List[str] = []
     audio_only: List[str] = []
     
+    # 先在进程内解析 mp4 / TS 文件头分类，无法识别的文件再并行交给 ffprobe
+    profiles = {file_path: sniff_stream_counts(file_path) for file_path in downloaded_files}
+    media_info = probe_media_many(path for path, profile in profiles.items() if profile is None)
     for file_path in downloaded_files:
-        profile = _probe_stream_profile(file_path)
+        profile = profiles[file_path]
+        if profile is None and media_info.get(file_path):
+            profile = stream_counts(media_info[file_path])
         if not profile:
             continue
         video_streams, audio_streams = profile
@@ -481,23 +904,54 @@ def auto_mux_downloads(downloaded_files: List[str], output_dir: str) -> List[str
         return []
     
     audio_map = _group_by_base(audio_only)
-    muxed_files: List[str] = []
+    reserved: Set[str] = set()
+    jobs = []
     for idx, video_path in enumerate(video_only):
         audio_path = _pop_matching_audio(audio_map, video_path)
         if not audio_path:
             logger.debug(f"未找到匹配音频，跳过: {video_path}")
             continue
-        output_path = _build_mux_output_path(video_path, audio_path, output_dir, idx)
-        if mux_streams(video_path, audio_path, output_path):
-            muxed_files.append(output_path)
-            _delete_file_safely(video_path)
-            _delete_file_safely(audio_path)
+        video_info, audio_info = media_info.get(video_path), media_info.get(audio_path)
+        if video_info and audio_info:
+            _warn_duration_mismatch(video_info, audio_info, video_path, audio_path)
+        output_path = _build_mux_output_path(video_path, audio_path, output_dir, idx, reserved)
+        reserved.add(output_path)
+        jobs.append((
+            os.path.basename(output_path),
+            output_path,
+            functools.partial(_mux_pair, video_path, audio_path, output_path, video_info, audio_info),
+        ))
     
+    results = run_postprocess_jobs(
+        jobs, max_jobs=postprocess_jobs, per_disk=postprocess_per_disk, label="合并音视频"
+    )
+    muxed_files = [output_path for (_, output_path, _), success in zip(jobs, results) if success]
     if muxed_files:
         logger.info(f"自动合并完成 {len(muxed_files)} 个文件")
     return muxed_files
 
 
+def _mux_pair(
+    video_path: str,
+    audio_path: str,
+    output_path: str,
+    video_info: Optional[Dict[str, object]],
+    audio_info: Optional[Dict[str, object]],
+) -> bool:
+    """合并一组音视频，成功后删除原始分轨（在后处理工作线程中运行）"""
+    if not mux_streams(video_path, audio_path, output_path):
+        return False
+    if video_info and audio_info:
+        logger.info(
+            f"已合并 {os.path.basename(output_path)}: "
+            f"{describe_media(video_info)} + {describe_media(audio_info)}"
+        )
+    _delete_source_safely(video_path, output_path)
+    _delete_source_safely(audio_path, output_path)
+    get_media_probe().forget([video_path, audio_path])
+    return True
+
+
 def mux_streams(video_path: str, audio_path: str, output_path: str) -> bool:
     """
     使用 ffmpeg 合并独立的音轨/视频轨
@@ -536,54 +990,37 @@ def mux_streams(video_path: str, audio_path: str, output_path: str) -> bool:
         return False
 
 
-def _probe_stream_profile(file_path: str) -> Optional[Tuple[int, int]]:
-    """
-    使用 ffprobe 检测文件内音轨/视频轨数量
-    """
-    if not os.path.exists(file_path):
-        return None
-    try:
-        cmd = [
-            'ffprobe',
-            '-v', 'error',
-            '-show_entries', 'stream=codec_type',
-            '-of', 'default=noprint_wrappers=1:nokey=1',
-            file_path
-        ]
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=10
+def _warn_duration_mismatch(
+    video_info: Dict[str, object],
+    audio_info: Dict[str, object],
+    video_path: str,
+    audio_path: str,
+) -> None:
+    """音视频时长相差超过 2 秒时提示（可能配对错误或下载不完整）"""
+    video_duration, audio_duration = video_info.get('duration'), audio_info.get('duration')
+    if video_duration and audio_duration and abs(video_duration - audio_duration) > 2:
+        logger.warning(
+            f"音视频时长不一致: {os.path.basename(video_path)} {video_duration:.1f}s, "
+            f"{os.path.basename(audio_path)} {audio_duration:.1f}s"
         )
-        if result.returncode != 0:
-            logger.debug(f"ffprobe 解析失败: {result.stderr.strip()}")
-            return None
-        lines = [line.strip() for line in result.stdout.splitlines() if line.strip()]
-        video_streams = sum(1 for line in lines if line == 'video')
-        audio_streams = sum(1 for line in lines if line == 'audio')
-        return video_streams, audio_streams
-    except (subprocess.TimeoutExpired, FileNotFoundError):
-        logger.debug("ffprobe 不可用或执行超时，跳过流信息检测")
-        return None
-    except Exception as err:
-        logger.debug(f"检测媒体信息失败: {err}")
-        return None
 
 
 def _build_mux_output_path(
     video_path: str,
     audio_path: str,
     output_dir: str,
-    index: int
+    index: int,
+    reserved: Optional[Set[str]] = None,
 ) -> str:
     video_base = _normalize_stem(Path(video_path).stem)
     audio_base = _normalize_stem(Path(audio_path).stem)
     base_name = _derive_common_prefix(video_base, audio_base) or "merged"
+    reserved = reserved or set()
     
     candidate = Path(output_dir) / f"{base_name}.mp4"
     suffix = 1
-    while candidate.exists():
+    # reserved: 同一批次中已分配但尚未生成的输出路径
+    while candidate.exists() or str(candidate) in reserved:
         candidate = Path(output_dir) / f"{base_name}_{suffix}.mp4"
         suffix += 1
     return str(candidate)
@@ -628,6 +1065,28 @@ def _pop_matching_audio(audio_map: Dict[str, List[str]], video_path: str) -> Opt
     return None
 
 
+def _delete_source_safely(path: str, output_path: str) -> bool:
+    """
+    删除后处理的原始文件，只删除输出文件所在目录内的文件
+
+    去重的 skip 模式下原始文件可能是其他目录中已有的文件，不能删除
+
+    Args:
+        path: 原始文件路径
+        output_path: 后处理输出文件路径
+
+    Returns:
+        bool: 是否执行了删除
+    """
+    source_dir = os.path.dirname(os.path.realpath(path))
+    output_dir = os.path.dirname(os.path.realpath(output_path))
+    if source_dir != output_dir:
+        logger.debug(f"原始文件不在输出目录中，保留: {path}")
+        return False
+    _delete_file_safely(path)
+    return True
+
+
 def _delete_file_safely(path: str) -> None:
     """
     安全删除文件
@@ -645,13 +1104,16 @@ def _delete_file_safely(path: str) -> None:
         logger.warning(f"删除文件失败 {os.path.basename(path)}: {err}")
 
 
-def merge_ts_files(ts_files: List[str], output_path: str) -> bool:
+def merge_ts_files(ts_files: List[str], output_path: str, remux: bool = False) -> bool:
     """
-    使用 ffmpeg 合并多个 .ts 文件
+    合并多个 .ts 文件：直接拼接为 TS，需要 MP4 时再用 ffmpeg 转封装
+    
+    片段不是标准 TS（无法直接拼接）时回退到 ffmpeg concat 解复用器。
     
     Args:
         ts_files: .ts 文件路径列表（已排序）
         output_path: 输出文件路径
+        remux: 是否转封装为 MP4（需要 ffmpeg）
         
     Returns:
         bool: 是否合并成功
@@ -659,13 +1121,47 @@ def merge_ts_files(ts_files: List[str], output_path: str) -> bool:
     if not ts_files:
         return False
     
+    logger.info(f"开始合并 {len(ts_files)} 个 .ts 文件 → {output_path}")
+    concat_path = f"{os.path.splitext(output_path)[0]}.concat.ts" if remux else output_path
+    try:
+        concat_ts_files(ts_files, concat_path)
+    except TsMergeError as err:
+        logger.warning(f"片段无法直接拼接（{err}），改用 ffmpeg 合并")
+        return _merge_ts_files_ffmpeg(ts_files, output_path)
+    except OSError as e:
+        logger.error(f"合并 .ts 文件失败: {e}")
+        return False
+    
+    if remux:
+        try:
+            if not remux_to_mp4(concat_path, output_path, input_format='mpegts'):
+                return False
+        finally:
+            _delete_file_safely(concat_path)
+    logger.info(f".ts 文件合并完成: {output_path}")
+    return True
+
+
+def _merge_ts_files_ffmpeg(ts_files: List[str], output_path: str) -> bool:
+    """
+    使用 ffmpeg concat 解复用器合并多个 .ts 文件（片段无法直接拼接时的回退路径）
+    
+    Args:
+        ts_files: .ts 文件路径列表（已排序）
+        output_path: 输出文件路径（按扩展名决定输出格式）
+        
+    Returns:
+        bool: 是否合并成功
+    """
     if not check_ffmpeg_available():
         logger.error("ffmpeg 不可用，无法合并 .ts 文件")
         return False
+    toolchain = get_toolchain()
+    if toolchain.demuxers and not toolchain.has_demuxer('concat'):
+        logger.error("ffmpeg 未编译 concat 解复用器，无法合并 .ts 文件")
+        return False
     
     try:
-        logger.info(f"开始合并 {len(ts_files)} 个 .ts 文件 → {output_path}")
-        
         # 创建临时文件列表用于 ffmpeg concat demuxer
         import tempfile
         with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
@@ -716,13 +1212,22 @@ def merge_ts_files(ts_files: List[str], output_path: str) -> bool:
         return False
 
 
-def detect_and_merge_ts_files(downloaded_files: List[str], output_dir: str) -> List[str]:
+def detect_and_merge_ts_files(
+    downloaded_files: List[str],
+    output_dir: str,
+    postprocess_jobs: int = DEFAULT_POSTPROCESS_JOBS,
+    ts_remux: bool = False,
+    postprocess_per_disk: Optional[int] = None,
+) -> List[str]:
     """
-    检测下载的 .ts 文件并合并为完整视频
+    检测下载的 .ts 文件并合并为完整视频（各分组并行合并）
     
     Args:
         downloaded_files: 下载得到的文件路径列表
         output_dir: 输出目录
+        postprocess_jobs: 同时运行的合并任务数上限
+        postprocess_per_disk: 同一磁盘上同时运行的合并任务数上限（None 表示按磁盘类型决定）
+        ts_remux: 是否把合并结果转封装为 MP4（默认直接输出拼接的 .ts）
         
     Returns:
         List[str]: 合并后的文件路径列表
@@ -747,7 +1252,8 @@ def detect_and_merge_ts_files(downloaded_files: List[str], output_dir: str) -> L
         logger.debug("未能识别 .ts 文件分组模式")
         return []
     
-    merged_files = []
+    reserved: Set[str] = set()
+    jobs = []
     for group_name, group_files in ts_groups.items():
         if len(group_files) < 2:
             continue
@@ -756,21 +1262,23 @@ def detect_and_merge_ts_files(downloaded_files: List[str], output_dir: str) -> L
         sorted_files = _sort_ts_files(group_files)
         
         # 生成输出文件名
-        output_filename = _generate_merged_filename(group_name, output_dir)
+        extension = '.mp4' if ts_remux else '.ts'
+        output_filename = _generate_merged_filename(group_name, output_dir, reserved, extension)
         output_path = os.path.join(output_dir, output_filename)
-        
-        # 合并文件
-        if merge_ts_files(sorted_files, output_path):
-            merged_files.append(output_path)
-            logger.info(f"合并成功，开始删除 {len(sorted_files)} 个原始 .ts 文件...")
-            # 删除原始 .ts 文件
-            deleted_count = 0
-            for ts_file in sorted_files:
-                if os.path.exists(ts_file):
-                    _delete_file_safely(ts_file)
-                    deleted_count += 1
-            logger.info(f"已合并 {len(sorted_files)} 个 .ts 文件为: {os.path.basename(output_path)}，已删除 {deleted_count} 个原始文件")
-        else:
+        reserved.add(output_filename)
+        jobs.append((
+            group_name,
+            output_path,
+            functools.partial(_merge_ts_group, sorted_files, output_path, ts_remux),
+        ))
+    
+    # 合并文件
+    results = run_postprocess_jobs(
+        jobs, max_jobs=postprocess_jobs, per_disk=postprocess_per_disk, label="合并 .ts"
+    )
+    merged_files = [output_path for (_, output_path, _), success in zip(jobs, results) if success]
+    for (group_name, _, _), success in zip(jobs, results):
+        if not success:
             logger.warning(f"合并失败，保留原始 .ts 文件: {group_name}")
     
     if merged_files:
@@ -779,6 +1287,20 @@ def detect_and_merge_ts_files(downloaded_files: List[str], output_dir: str) -> L
     return merged_files
 
 
+def _merge_ts_group(sorted_files: List[str], output_path: str, remux: bool) -> bool:
+    """合并一组 .ts 文件，成功后删除原始文件（在后处理工作线程中运行）"""
+    if not merge_ts_files(sorted_files, output_path, remux):
+        return False
+    logger.info(f"合并成功，开始删除 {len(sorted_files)} 个原始 .ts 文件...")
+    # 删除原始 .ts 文件
+    deleted_count = 0
+    for ts_file in sorted_files:
+        if os.path.exists(ts_file) and _delete_source_safely(ts_file, output_path):
+            deleted_count += 1
+    logger.info(f"已合并 {len(sorted_files)} 个 .ts 文件为: {os.path.basename(output_path)}，已删除 {deleted_count} 个原始文件")
+    return True
+
+
 def _group_ts_files(ts_files: List[str]) -> Dict[str, List[str]]:
     """
     将 .ts 文件按命名模式分组
@@ -884,13 +1406,20 @@ def _sort_ts_files(ts_files: List[str]) -> List[str]:
     return sorted(ts_files, key=extract_number)
 
 
-def _generate_merged_filename(group_name: str, output_dir: str) -> str:
+def _generate_merged_filename(
+    group_name: str,
+    output_dir: str,
+    reserved: Optional[Set[str]] = None,
+    extension: str = '.mp4',
+) -> str:
     """
     生成合并后的文件名
     
     Args:
         group_name: 组名（例如 "index"）
         output_dir: 输出目录
+        reserved: 同一批次中已分配但尚未生成的文件名
+        extension: 输出扩展名（.ts / .mp4）
         
     Returns:
         str: 文件名
@@ -900,13 +1429,14 @@ def _generate_merged_filename(group_name: str, output_dir: str) -> str:
     if not clean_name:
         clean_name = "merged"
     
-    output_filename = f"{clean_name}_merged.mp4"
+    output_filename = f"{clean_name}_merged{extension}"
     output_path = os.path.join(output_dir, output_filename)
     
     # 如果文件已存在，添加序号
     counter = 1
-    while os.path.exists(output_path):
-        output_filename = f"{clean_name}_merged_{counter}.mp4"
+    reserved = reserved or set()
+    while os.path.exists(output_path) or output_filename in reserved:
+        output_filename = f"{clean_name}_merged_{counter}{extension}"
         output_path = os.path.join(output_dir, output_filename)
         counter += 1
     
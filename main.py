@@ -7,10 +7,49 @@ CLI 入口文件
 """
 import argparse
 import logging
+import os
 import sys
 from pathlib import Path
-from downloader.headless_browser_mode import HeadlessBrowserDownloader
+from downloader.headless_browser_mode import (
+    DEFAULT_SETTLE_QUIET,
+    DEFAULT_SETTLE_TIMEOUT,
+    HeadlessBrowserDownloader,
+)
 from downloader.browser_script_mode import run as run_browser_script_mode
+from downloader.browser_pool import (
+    DEFAULT_BROWSER_POOL_SIZE,
+    DEFAULT_BROWSER_RECYCLE,
+    DEFAULT_CONTEXT_RECYCLE,
+)
+from downloader.request_routing import (
+    DEFAULT_BLOCKED_HOSTS,
+    DEFAULT_BLOCKED_RESOURCE_TYPES,
+    DEFAULT_MEDIA_BODY_POLICY,
+    MEDIA_BODY_POLICIES,
+    BlockPolicy,
+    load_host_list,
+    parse_resource_types,
+    parse_site_allow,
+)
+from downloader.storage_state import DEFAULT_STATE_MAX_AGE, StorageStateCache
+from downloader.resolution_cache import DEFAULT_RESOLUTION_TTL, ResolutionCache
+from downloader.dedup_store import DEDUP_MODES, DEFAULT_DEDUP_MODE, DedupStore
+from downloader.toolchain import set_toolchain_cache
+from downloader.crawler import (
+    DEFAULT_CRAWL_CONCURRENCY,
+    DEFAULT_CRAWL_DELAY,
+    DEFAULT_CRAWL_PER_HOST,
+    DEFAULT_MAX_DEPTH,
+    DEFAULT_MAX_PAGES,
+    Crawler,
+    run_crawler,
+)
+from downloader.jobs import DEFAULT_DOWNLOAD_JOBS, load_jobs, run_jobs
+from downloader.http_session import DEFAULT_POOL_SIZE, SessionPool
+from downloader.hls import DEFAULT_QUALITY, parse_quality
+from downloader.dash import DEFAULT_CODEC_PREFERENCE
+from downloader.scheduler import DEFAULT_MAX_DOWNLOADS, DEFAULT_PER_HOST
+from downloader.postprocess import DEFAULT_POSTPROCESS_JOBS
 
 DEFAULT_CHROME_PROFILE = "/Users/bojun/Library/Application Support/Google/Chrome/Profile 1"
 
@@ -27,6 +66,45 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def create_headless_downloader(
+    args,
+    session_pool: SessionPool,
+    block_policy,
+    dedup_store=None,
+) -> HeadlessBrowserDownloader:
+    """按命令行参数创建无头浏览器下载器（headless / crawler 模式共用）"""
+    return HeadlessBrowserDownloader(
+        headless=args.headless,
+        browser_type=args.browser_type,
+        browser_channel=args.browser_channel,
+        user_data_dir=args.user_data_dir,
+        download_connections=args.connections,
+        session_pool=session_pool,
+        quality=args.quality,
+        codec_preference=args.codec_preference,
+        max_downloads=args.max_downloads,
+        per_host=args.per_host,
+        settle_quiet=args.settle_quiet,
+        settle_timeout=args.settle_timeout,
+        linger=args.linger,
+        media_bodies=args.media_bodies,
+        block_policy=block_policy,
+        state_cache=(
+            StorageStateCache(args.state_dir, max_age=args.state_max_age * 3600)
+            if args.state_dir else None
+        ),
+        resolution_cache=(
+            ResolutionCache(args.resolve_cache, default_ttl=args.resolve_ttl)
+            if args.resolve_cache else None
+        ),
+        use_extractors=not args.no_extractors,
+        dedup_store=dedup_store,
+        postprocess_jobs=args.postprocess_jobs,
+        postprocess_per_disk=args.postprocess_per_disk,
+        ts_remux=args.ts_remux,
+    )
+
+
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(
@@ -37,8 +115,14 @@ def main():
   # 方案 A: 无头浏览器模式
   python main.py --mode headless --url https://www.bilibili.com/video/BVxxxxx --output-dir ./downloads
 
+  # 方案 A: 批量任务（JSONL），结果写入 jobs.results.jsonl
+  python main.py --mode headless --input jobs.jsonl --browser-pool 4 --download-jobs 2
+
   # 方案 B: 浏览器脚本模式
   python main.py --mode browser_script --output-dir ./downloads
+
+  # crawler: 从种子页面抓取两层，视频页面交给无头浏览器模式下载
+  python main.py --mode crawler --url https://example.com/videos/ --max-depth 2 --video-pattern "/watch/"
         """
     )
     
@@ -47,13 +131,33 @@ def main():
         type=str,
         choices=['headless', 'browser_script', 'crawler'],
         required=True,
-        help='下载模式: headless (无头浏览器), browser_script (浏览器脚本), crawler (预留)'
+        help='下载模式: headless (无头浏览器), browser_script (浏览器脚本), crawler (从种子 URL 抓取视频页面)'
     )
     
     parser.add_argument(
         '--url',
         type=str,
-        help='目标网页URL (仅 headless 模式需要)'
+        action='append',
+        help='目标网页URL (headless 模式需要，可重复指定多个，多个 URL 时使用浏览器池并行处理；crawler 模式为种子 URL)'
+    )
+    
+    parser.add_argument(
+        '--input',
+        type=str,
+        help='批量任务文件 (JSONL，每行包含 url 及可选的 output_dir/quality/codec_preference/headers/timeout/id，仅 headless 模式)'
+    )
+    
+    parser.add_argument(
+        '--results',
+        type=str,
+        help='批量任务结果文件 (JSONL，默认: <任务文件名>.results.jsonl)'
+    )
+    
+    parser.add_argument(
+        '--download-jobs',
+        type=int,
+        default=DEFAULT_DOWNLOAD_JOBS,
+        help=f'批量任务中同时处于下载阶段的任务数，页面捕获并发由 --browser-pool 控制 (默认: {DEFAULT_DOWNLOAD_JOBS})'
     )
     
     parser.add_argument(
@@ -104,7 +208,301 @@ def main():
         help='超时时间（毫秒）(默认: 90000)'
     )
     
+    parser.add_argument(
+        '--settle-quiet',
+        type=float,
+        default=DEFAULT_SETTLE_QUIET,
+        help=f'发现可播放媒体后，连续多少秒无新媒体响应即结束捕获 (默认: {DEFAULT_SETTLE_QUIET:g})'
+    )
+    
+    parser.add_argument(
+        '--settle-timeout',
+        type=float,
+        default=DEFAULT_SETTLE_TIMEOUT,
+        help=f'页面加载后等待媒体的最长秒数 (默认: {DEFAULT_SETTLE_TIMEOUT:g})'
+    )
+    
+    parser.add_argument(
+        '--linger',
+        type=float,
+        default=0,
+        help='捕获结束后保留浏览器的秒数，便于调试查看页面 (默认: 0，立即关闭)'
+    )
+    
+    parser.add_argument(
+        '--media-bodies',
+        choices=MEDIA_BODY_POLICIES,
+        default=DEFAULT_MEDIA_BODY_POLICY,
+        help='浏览器内媒体正文的处理方式：allow 不拦截；abort 记录请求后中止；'
+             'truncate 只取 1 字节交给播放器。拦截可避免媒体被浏览器与下载器各下载一次，清单始终放行 '
+             f'(默认: {DEFAULT_MEDIA_BODY_POLICY})'
+    )
+    
+    parser.add_argument(
+        '--block-resources',
+        type=str,
+        default=','.join(DEFAULT_BLOCKED_RESOURCE_TYPES),
+        help='捕获期间屏蔽的资源类型，逗号分隔，none 表示不按类型屏蔽 '
+             f'(默认: {",".join(DEFAULT_BLOCKED_RESOURCE_TYPES)})'
+    )
+    
+    parser.add_argument(
+        '--blocklist',
+        type=str,
+        action='append',
+        default=[],
+        help='额外的屏蔽域名列表文件（每行一个域名，兼容 hosts 格式），可重复指定；内置常见广告 / 统计域名'
+    )
+    
+    parser.add_argument(
+        '--allow',
+        type=str,
+        action='append',
+        default=[],
+        metavar='SITE=ITEMS',
+        help='站点放行规则，例如 bilibili.com=image,hdslb.com：该站点页面上不屏蔽图片与 hdslb.com，可重复指定'
+    )
+    
+    parser.add_argument(
+        '--no-block',
+        action='store_true',
+        help='关闭资源屏蔽，完整加载页面'
+    )
+    
+    parser.add_argument(
+        '--state-dir',
+        type=str,
+        default=None,
+        help='按站点缓存登录状态（Cookie / localStorage）的目录，任意浏览器类型与并行页面均可共享'
+    )
+    
+    parser.add_argument(
+        '--state-max-age',
+        type=float,
+        default=DEFAULT_STATE_MAX_AGE / 3600,
+        help=f'登录状态缓存的有效期（小时），过期后重新获取 (默认: {DEFAULT_STATE_MAX_AGE / 3600:g})'
+    )
+    
+    parser.add_argument(
+        '--resolve-cache',
+        type=str,
+        default=None,
+        help='页面解析缓存文件（SQLite），再次处理同一页面时直接使用缓存的媒体 URL，不启动浏览器'
+    )
+    
+    parser.add_argument(
+        '--resolve-ttl',
+        type=float,
+        default=DEFAULT_RESOLUTION_TTL,
+        help=f'页面解析缓存的最长有效期（秒）；媒体 URL 带 deadline= / expires= 等过期参数时取更早者 (默认: {DEFAULT_RESOLUTION_TTL})'
+    )
+    
+    parser.add_argument(
+        '--no-extractors',
+        action='store_true',
+        help='不使用站点提取器（如 Bilibili 直接解析页面 __playinfo__），始终打开浏览器捕获'
+    )
+    
+    parser.add_argument(
+        '--browser-pool',
+        type=int,
+        default=DEFAULT_BROWSER_POOL_SIZE,
+        help=f'多个 URL 时共享一个浏览器，并行处理的页面数 (默认: {DEFAULT_BROWSER_POOL_SIZE})'
+    )
+    
+    parser.add_argument(
+        '--context-recycle',
+        type=int,
+        default=DEFAULT_CONTEXT_RECYCLE,
+        help=f'浏览器池中每个上下文处理多少个页面后重建 (默认: {DEFAULT_CONTEXT_RECYCLE})'
+    )
+    
+    parser.add_argument(
+        '--browser-recycle',
+        type=int,
+        default=DEFAULT_BROWSER_RECYCLE,
+        help=f'浏览器池处理多少个页面后重启浏览器，0 表示不重启 (默认: {DEFAULT_BROWSER_RECYCLE})'
+    )
+    
+    parser.add_argument(
+        '--max-pages',
+        type=int,
+        default=DEFAULT_MAX_PAGES,
+        help=f'crawler 模式抓取的页面数上限 (默认: {DEFAULT_MAX_PAGES})'
+    )
+    
+    parser.add_argument(
+        '--max-depth',
+        type=int,
+        default=DEFAULT_MAX_DEPTH,
+        help=f'crawler 模式的抓取深度，种子页面为 0 (默认: {DEFAULT_MAX_DEPTH})'
+    )
+    
+    parser.add_argument(
+        '--crawl-concurrency',
+        type=int,
+        default=DEFAULT_CRAWL_CONCURRENCY,
+        help=f'crawler 模式同时抓取的页面数 (默认: {DEFAULT_CRAWL_CONCURRENCY})'
+    )
+    
+    parser.add_argument(
+        '--crawl-per-host',
+        type=int,
+        default=DEFAULT_CRAWL_PER_HOST,
+        help=f'crawler 模式同一 host 同时抓取的页面数 (默认: {DEFAULT_CRAWL_PER_HOST})'
+    )
+    
+    parser.add_argument(
+        '--crawl-delay',
+        type=float,
+        default=DEFAULT_CRAWL_DELAY,
+        help=f'crawler 模式同一 host 两次请求之间的最小间隔秒数 (默认: {DEFAULT_CRAWL_DELAY:g})'
+    )
+    
+    parser.add_argument(
+        '--follow',
+        type=str,
+        default=None,
+        help='crawler 模式只跟随匹配该正则的链接'
+    )
+    
+    parser.add_argument(
+        '--exclude',
+        type=str,
+        default=None,
+        help='crawler 模式不跟随匹配该正则的链接'
+    )
+    
+    parser.add_argument(
+        '--video-pattern',
+        type=str,
+        default=None,
+        help='crawler 模式中匹配该正则的页面视为视频页面（另外，已知站点的视频页与含 <video> / og:video 的页面也会被识别）'
+    )
+    
+    parser.add_argument(
+        '--any-host',
+        action='store_true',
+        help='crawler 模式跟随其他站点的链接（默认只抓取种子所在 host）'
+    )
+    
+    parser.add_argument(
+        '--ignore-robots',
+        action='store_true',
+        help='crawler 模式不遵守 robots.txt'
+    )
+    
+    parser.add_argument(
+        '--connections',
+        type=int,
+        default=4,
+        help='单个文件的并发连接数（MP4 分段 / HLS、DASH 分片），1 表示单连接 (默认: 4)'
+    )
+    
+    parser.add_argument(
+        '--max-downloads',
+        type=int,
+        default=DEFAULT_MAX_DOWNLOADS,
+        help=f'同时下载的文件数上限 (默认: {DEFAULT_MAX_DOWNLOADS})'
+    )
+    
+    parser.add_argument(
+        '--per-host',
+        type=int,
+        default=DEFAULT_PER_HOST,
+        help=f'同一 host 同时下载的文件数上限 (默认: {DEFAULT_PER_HOST})'
+    )
+    
+    parser.add_argument(
+        '--pool-size',
+        type=int,
+        default=DEFAULT_POOL_SIZE,
+        help=f'每个 host 复用的最大 HTTP 连接数 (默认: {DEFAULT_POOL_SIZE})'
+    )
+    
+    parser.add_argument(
+        '--no-keep-alive',
+        dest='keep_alive',
+        action='store_false',
+        default=True,
+        help='禁用 HTTP 连接复用（每个请求后关闭连接）'
+    )
+    
+    parser.add_argument(
+        '--quality',
+        type=str,
+        default=DEFAULT_QUALITY,
+        help='HLS 主播放列表 / DASH 的画质选择策略: best, worst, <=1080p, max-bitrate=2.5M (默认: best)'
+    )
+    
+    parser.add_argument(
+        '--codec-preference',
+        type=str,
+        default=DEFAULT_CODEC_PREFERENCE,
+        help=f'DASH 视频编码偏好，逗号分隔，越靠前越优先 (默认: {DEFAULT_CODEC_PREFERENCE})'
+    )
+    
+    parser.add_argument(
+        '--dedup-store',
+        type=str,
+        default=None,
+        help='内容去重索引文件（SQLite，可跨批次共享）；下载过的媒体（含签名参数不同的同一文件）不再重复下载'
+    )
+    
+    parser.add_argument(
+        '--dedup-mode',
+        type=str,
+        choices=DEDUP_MODES,
+        default=DEFAULT_DEDUP_MODE,
+        help=f'内容已存在时的处理方式: link 在输出目录创建硬链接, skip 直接使用已有文件 (默认: {DEFAULT_DEDUP_MODE})'
+    )
+    
+    parser.add_argument(
+        '--postprocess-jobs',
+        type=int,
+        default=DEFAULT_POSTPROCESS_JOBS,
+        help=f'同时运行的后处理任务（音视频合并、.ts 合并）数上限 (默认: {DEFAULT_POSTPROCESS_JOBS})'
+    )
+    
+    parser.add_argument(
+        '--postprocess-per-disk',
+        type=int,
+        default=None,
+        help='同一磁盘上同时运行的后处理任务数上限 (默认: 输出在机械硬盘上时为 1，否则与 --postprocess-jobs 相同)'
+    )
+    
+    parser.add_argument(
+        '--ts-remux',
+        action='store_true',
+        help='把合并的 .ts 片段转封装为 MP4（需要 ffmpeg）；默认直接拼接输出 .ts'
+    )
+    
+    parser.add_argument(
+        '--toolchain-cache',
+        type=str,
+        default=None,
+        help='ffmpeg / ffprobe 探测结果的缓存文件（JSON，可执行文件更换后自动失效），新进程不再重复探测'
+    )
+    
     args = parser.parse_args()
+    set_toolchain_cache(args.toolchain_cache)
+    try:
+        parse_quality(args.quality)
+    except ValueError as err:
+        parser.error(str(err))
+    block_policy = None
+    if not args.no_block:
+        try:
+            blocked_hosts = set(DEFAULT_BLOCKED_HOSTS)
+            for path in args.blocklist:
+                blocked_hosts |= load_host_list(path)
+            block_policy = BlockPolicy(
+                resource_types=parse_resource_types(args.block_resources),
+                blocked_hosts=blocked_hosts,
+                site_allow=parse_site_allow(args.allow),
+            )
+        except (ValueError, OSError) as err:
+            parser.error(str(err))
     if (
         args.browser_channel == 'chrome'
         and args.headless is False
@@ -125,32 +523,95 @@ def main():
     log_dir = Path('logs')
     log_dir.mkdir(exist_ok=True)
     
+    # 整个运行期间共享的 HTTP 会话池
+    session_pool = SessionPool(pool_size=args.pool_size, keep_alive=args.keep_alive)
+    dedup_store = DedupStore(args.dedup_store, mode=args.dedup_mode) if args.dedup_store else None
+    
+    if args.mode in ('headless', 'crawler') and block_policy is not None and block_policy.enabled:
+        logger.info(f"捕获期间屏蔽资源: {'，'.join(block_policy.describe())}")
+    
     try:
         if args.mode == 'headless':
             # 方案 A: 无头浏览器模式
-            if not args.url:
-                logger.error("headless 模式需要提供 --url 参数")
+            if not args.url and not args.input:
+                logger.error("headless 模式需要提供 --url 或 --input 参数")
                 parser.print_help()
                 sys.exit(1)
             
             logger.info("使用无头浏览器模式")
-            downloader = HeadlessBrowserDownloader(
-                headless=args.headless,
-                browser_type=args.browser_type,
-                browser_channel=args.browser_channel,
-                user_data_dir=args.user_data_dir
-            )
-            downloader.run(args.url, str(output_dir), timeout=args.timeout)
+            downloader = create_headless_downloader(args, session_pool, block_policy, dedup_store)
+            if args.input:
+                jobs = load_jobs(args.input)
+                results_path = args.results or f"{os.path.splitext(args.input)[0]}.results.jsonl"
+                run_jobs(
+                    jobs,
+                    downloader,
+                    results_path,
+                    str(output_dir),
+                    capture_concurrency=args.browser_pool,
+                    download_jobs=args.download_jobs,
+                    timeout=args.timeout,
+                    context_recycle=args.context_recycle,
+                    browser_recycle=args.browser_recycle,
+                )
+            elif len(args.url) == 1:
+                downloader.run(args.url[0], str(output_dir), timeout=args.timeout)
+            else:
+                downloader.run_many(
+                    args.url,
+                    str(output_dir),
+                    timeout=args.timeout,
+                    pool_size=args.browser_pool,
+                    context_recycle=args.context_recycle,
+                    browser_recycle=args.browser_recycle,
+                )
             
         elif args.mode == 'browser_script':
             # 方案 B: 浏览器脚本模式
             logger.info("使用浏览器脚本模式")
-            run_browser_script_mode(str(output_dir))
+            run_browser_script_mode(
+                str(output_dir),
+                connections=args.connections,
+                session_pool=session_pool,
+                quality=args.quality,
+                codec_preference=args.codec_preference,
+                max_downloads=args.max_downloads,
+                per_host=args.per_host,
+                dedup_store=dedup_store,
+                postprocess_jobs=args.postprocess_jobs,
+                postprocess_per_disk=args.postprocess_per_disk,
+            )
             
         elif args.mode == 'crawler':
-            # TODO: 预留功能
-            logger.warning("crawler 模式尚未实现")
-            sys.exit(1)
+            # 从种子 URL 抓取，视频页面交给无头浏览器模式
+            if not args.url:
+                logger.error("crawler 模式需要提供 --url 参数作为种子 URL")
+                parser.print_help()
+                sys.exit(1)
+            
+            logger.info("使用 crawler 模式")
+            crawler = Crawler(
+                args.url,
+                max_pages=args.max_pages,
+                max_depth=args.max_depth,
+                concurrency=args.crawl_concurrency,
+                per_host=args.crawl_per_host,
+                delay=args.crawl_delay,
+                same_host=not args.any_host,
+                follow=args.follow,
+                exclude=args.exclude,
+                video_pattern=args.video_pattern,
+                respect_robots=not args.ignore_robots,
+            )
+            run_crawler(
+                crawler,
+                create_headless_downloader(args, session_pool, block_policy, dedup_store),
+                str(output_dir),
+                pool_size=args.browser_pool,
+                context_recycle=args.context_recycle,
+                browser_recycle=args.browser_recycle,
+                timeout=args.timeout,
+            )
             
     except KeyboardInterrupt:
         logger.info("\n用户中断操作")
@@ -158,6 +619,10 @@ def main():
     except Exception as e:
         logger.error(f"执行失败: {e}", exc_info=True)
         sys.exit(1)
+    finally:
+        session_pool.close()
+        if dedup_store is not None:
+            dedup_store.close()
 
 
 if __name__ == '__main__':